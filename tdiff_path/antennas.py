@@ -171,7 +171,7 @@ def main():
             hex_dictionary[k] = hex_colors[0]
             hex_colors.remove(hex_dictionary[k])
 
-    reduce_frequency_array(all_data_phase_wrapped, min_dataset_length)
+    all_data_phase_wrapped = reduce_frequency_array(all_data_phase_wrapped)
 
     # Wrapping then unwrapping ensures there is no 360 degree offset.
     for ant, dataset in all_data_phase_wrapped.items():
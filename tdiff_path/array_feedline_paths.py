@@ -6,18 +6,22 @@
 # antenna and feedline path in a single direction.
 # Approximate S12 phase change at the antenna is found assuming S12 = S21.
 
+import os
 import sys
-import argparse
+import json
 import time
-import random
-import fnmatch
+import argparse
+import functools
 import math
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
+import pandas as pd
 
 import dataset_operations.dataset_operations as do
 import retrieve_data.retrieve_data as retrieve
+from retrieve_data.watch_directory import DirectoryWatcher
+from site_analysis.incremental_site import IncrementalSiteAnalysis
+from sweep_set.sweep_set import SweepSet
+from rendering.rendering import get_pyplot, plot_channel_lines, get_channel_colours
+from rendering.live_figure import LiveFigure, get_status
 
 
 def usage_msg():
@@ -29,8 +33,8 @@ def usage_msg():
     :return: the usage message
     """
 
-    usage_message = """ array_feedline_paths.py [-h] radar_name data_location 
-    plot_location vswr_files_str time_file_str   
+    usage_message = """ array_feedline_paths.py [-h] [--watch] [--interval INTERVAL] radar_name 
+    data_location plot_location vswr_files_str time_file_str
     
     This script is intended for use with VSWR data of some length of feedline leading 
     up to the SuperDARN antenna. A single direction phase path (S12) is estimated from 
@@ -77,6 +81,9 @@ def script_parser():
                          "and 'time_ns'. This file would be written in the " +\
                          "plot_location, under a sub-directory numpy_channel_data."
 
+    workers_help = "Number of worker processes used to read the data files " +\
+                   "concurrently. Defaults to the number of cpus."
+
     parser = argparse.ArgumentParser(usage=usage_msg())
     parser.add_argument("radar_name", help=radar_name_help)
     parser.add_argument("data_location", help=data_location_help)
@@ -84,6 +91,20 @@ def script_parser():
     parser.add_argument("vswr_files_str", help=vswr_files_str_help)
     parser.add_argument("-tdiff", "--record-tdiff", nargs='?',
                         const='delays.txt', default=None, help=time_file_str_help)
+    parser.add_argument("-w", "--workers", type=int, default=None, help=workers_help)
+    parser.add_argument("--no-cache", action='store_true',
+                        help="Parse all data files instead of using the sweep cache.")
+    parser.add_argument("--clear-cache", action='store_true',
+                        help="Remove all sweeps from the sweep cache before starting.")
+    parser.add_argument("--no-plot", action='store_true',
+                        help="Only compute and write the data files, without plotting.")
+    parser.add_argument("--watch", action='store_true',
+                        help="Keep watching data_location and update the plot as each "
+                             "data file comes in or changes, until Ctrl-C. Data files "
+                             "are not written in this mode.")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Seconds between checks of data_location with --watch. "
+                             "Default 2.0")
 
     return parser
 
@@ -101,6 +122,292 @@ def script_parser():
 # Balun mismatch for each individual antenna is estimated here.
 
 
+# x axis limits of the figure, in Hz.
+frequency_limits = (8e6, 20e6)
+
+# label, phase colour and magnitude colour of the combined arrays.
+combined_array_styles = [('M_all', 'Main Array', '#2942a8', '#bd3f3f'),
+                         ('I_all', 'Intf Array', '#8ba1fa', '#f99191')]
+
+
+def get_cable_model(radar_name):
+    """
+    Get the cable model depending on the site being analyzed.
+    :param radar_name: name of the radar, eg. 'SAS' or 'Saskatoon'.
+    :return: cable_type: the cable type, see retrieve_data.get_cable_loss_array.
+    :return: cable_length: the cable length in ft.
+    """
+    if 'Saskatoon' in radar_name or 'sas' in radar_name or 'SAS' in radar_name:
+        cable_type = 'Belden8237'  # known
+        cable_length = 600.0  # ft ??
+    elif 'Prince George' in radar_name or 'Prince_George' in radar_name or 'pgr' in radar_name or \
+            'PGR' in radar_name:
+        cable_type = 'Belden8237'  # known checked 2015 photos  - although I3 will be LMR400
+        cable_length = 600.0  # ft ??
+    elif 'Inuvik' in radar_name or 'inv' in radar_name or 'INV' in radar_name:
+        cable_type = 'EC400'  # checked 2017 photos.
+        cable_length = 600.0  # ft ??
+    elif 'Rankin Inlet' in radar_name or 'Rankin_Inlet' in radar_name or 'rkn' in radar_name or \
+            'RKN' in radar_name or 'Rankin-Inlet' in radar_name:
+        cable_type = 'C1180'  # known checked 2018
+        cable_length = 600.0  # ft TODO verify cable length
+    elif 'Clyde River' in radar_name or 'Clyde_River' in radar_name or 'cly' in radar_name or \
+            'CLY' in radar_name or 'Clyde-River' in radar_name:
+        cable_type = 'LMR400'  # known
+        cable_length = 600.0  # ft TODO verify cable length
+    else:
+        sys.exit('Not a valid radar name.')
+    return cable_type, cable_length
+
+
+def draw_reflected_phase(axes, data):
+    """
+    PLOT: Phase wrapped of all data
+    """
+    axes.set_title(data['plot_title'], size=48.0)
+    channels = list(data['reflected_phase'])
+    plot_channel_lines(axes, data['freq'], [data['reflected_phase'][ant] for ant in
+                                            channels],
+                       [data['colour_dictionary'][ant] for ant in channels], channels)
+    axes.set_ylabel('VSWR Phase All Antennas', size=25.0)
+    axes.grid()
+
+
+def draw_combined_arrays(axes, db_axes, data):
+    """
+    PLOT: combined arrays dB and phase.
+    """
+    # restore the twinned axes settings that are reset when the axes are cleared.
+    db_axes.yaxis.tick_right()
+    db_axes.yaxis.set_label_position('right')
+    db_axes.xaxis.set_visible(False)
+    db_axes.patch.set_visible(False)
+    for key, label, phase_colour, db_colour in combined_array_styles:
+        if key in data['combined_arrays']:
+            combined_array = data['combined_arrays'][key]
+            axes.plot(data['freq'], combined_array['phase_deg'], color=phase_colour,
+                      label=label)
+            db_axes.plot(data['freq'], combined_array['magnitude'], color=db_colour,
+                         label=label)
+
+    axes.set_ylabel('Incoming Feedline Array\nPhase [degrees]', color='#3352cd',
+                    size=25.0)
+    # blue
+    axes.tick_params(axis='y', labelcolor='#3352cd')
+
+    # from antenna to feedline end at building.
+    db_axes.set_ylabel('Combined\nArray [dB]', color='#de4b4b', size=25.0)  # red
+    db_axes.tick_params(axis='y', labelcolor='#de4b4b')
+    # referenced to power at a single antenna
+    axes.grid()
+
+
+def draw_array_difference(axes, data):
+    """
+    PLOT: Time difference between arrays single direction TODO this is not 1 direction
+    """
+    axes.set_ylabel('S12 Perceived Time\nDifference b/w arrays\n Based on Phase ['
+                    'ns]', size=25.0)
+    if data['array_diff_time_ns'] is not None:
+        axes.plot(data['freq'], data['array_diff_time_ns'])
+    axes.grid()
+
+
+def draw_array_offsets(axes, data, array_key='M_all'):
+    """
+    PLOT: Main Array or Intf Array Offset from their Best Fit Lines
+    """
+    linear_fit_dict = data['linear_fit_dict']
+    if array_key == 'M_all':
+        array_channels, array_name, legend_kwargs = data['main_channels'], 'Main', {
+            'fontsize': 10, 'ncol': 4}
+    else:
+        array_channels, array_name, legend_kwargs = data['intf_channels'], 'Intf', {
+            'fontsize': 12}
+    plot_channel_lines(axes, data['freq'],
+                       [linear_fit_dict[ant]['offset_of_best_fit_rads'] * 180.0 /
+                        math.pi for ant in array_channels],
+                       [data['colour_dictionary'][ant] for ant in array_channels],
+                       ['{}, delay={} ns'.format(ant, linear_fit_dict[ant][
+                           'time_delay_ns']) for ant in array_channels])
+    if array_key in linear_fit_dict:
+        axes.plot(data['freq'], linear_fit_dict[array_key][
+            'offset_of_best_fit_rads'] * 180.0 / math.pi,
+            color=data['colour_dictionary']['other'],
+            label='Combined {}, delay={} ns'.format(array_name, linear_fit_dict[
+                array_key]['time_delay_ns']))  # plot last
+    if array_channels:
+        axes.legend(loc='upper right', **legend_kwargs)
+    axes.set_ylabel('S12 {} Phase Offset\n from Own Line of Best\nFit ['
+                    'degrees]'.format(array_name), size=15.0)
+    axes.grid()
+
+
+def draw_s12_phase(axes, data):
+    """
+    PLOT: Phase wrapped of all data, single direction.
+    """
+    channels = list(data['s12_phase'])
+    plot_channel_lines(axes, data['freq'], [data['s12_phase'][ant] for ant in channels],
+                       [data['colour_dictionary'][ant] for ant in channels], channels)
+    axes.set_ylabel('S12 Phase All Antennas')
+    axes.set_xlabel('Frequency (Hz)', size=25.0)
+    axes.grid()
+
+
+def make_feedline_figure(plt):
+    """
+    Make the figure and its panels.
+    :param plt: the matplotlib.pyplot module.
+    :return: fig: the figure.
+    :return: panels: dictionary of panel name to (list of axes, draw function), see
+    rendering.live_figure.LiveFigure. Each draw function is called as
+    draw(*axes, panel_data).
+    """
+    numplots = 6
+    fig, smpplot = plt.subplots(numplots, 1, sharex='all', figsize=(18, 24),
+                                gridspec_kw={'height_ratios': [2, 2, 2, 1, 1, 1]})
+    panels = {'reflected_phase': ([smpplot[0]], draw_reflected_phase),
+              'combined_arrays': ([smpplot[1], smpplot[1].twinx()], draw_combined_arrays),
+              'array_difference': ([smpplot[2]], draw_array_difference),
+              'main_offsets': ([smpplot[3]], functools.partial(draw_array_offsets,
+                                                               array_key='M_all')),
+              'intf_offsets': ([smpplot[4]], functools.partial(draw_array_offsets,
+                                                               array_key='I_all')),
+              's12_phase': ([smpplot[5]], draw_s12_phase)}
+    return fig, panels
+
+
+def get_live_panel_data(site, plot_title, colour_dictionary):
+    """
+    Get the data drawn by the panels from an incremental site analysis.
+    :param site: an IncrementalSiteAnalysis of feedline-VSWR data.
+    :param plot_title: title of the figure.
+    :param colour_dictionary: dictionary of channel to colour.
+    :return: dictionary of the panel data, see make_feedline_figure.
+    """
+    results = site.results
+    sweeps = results['sweeps']
+    working_dataframe = results['working_dataframe']
+    linear_fit_dict = {channel: results['linear_fit_dict'][channel] for channel in
+                       results['channels']}
+    combined_arrays = {}
+    for key, _, _, _ in combined_array_styles:
+        prefix = key + '_'
+        if prefix in results['linear_fit_dict']:
+            linear_fit_dict[key] = results['linear_fit_dict'][prefix]
+            combined_arrays[key] = {'phase_deg': working_dataframe[prefix + 'phase_deg'],
+                                    'magnitude': working_dataframe[prefix + 'magnitude']}
+    return {'plot_title': plot_title, 'freq': sweeps.freq,
+            'colour_dictionary': colour_dictionary,
+            'reflected_phase': {channel: do.wrap_degrees_block(
+                results['working_channel_data'][channel]['phase_deg']) for channel in
+                results['channels']},
+            's12_phase': {channel: sweeps['phase_deg'][row] for row, channel in
+                          enumerate(results['channels'])},
+            'combined_arrays': combined_arrays,
+            'array_diff_time_ns': working_dataframe['array_diff_time_ns'] if
+            'array_diff_time_ns' in working_dataframe.columns else None,
+            'linear_fit_dict': linear_fit_dict,
+            'main_channels': results['main_channels'],
+            'intf_channels': results['intf_channels']}
+
+
+def get_affected_panels(last_update):
+    """
+    :param last_update: the last_update of an IncrementalSiteAnalysis.
+    :return: set of the names of the panels drawn from the data that changed.
+    """
+    if last_update['rebuilt']:
+        return None  # all panels.
+    panel_names = set()
+    if last_update['channels']:
+        panel_names.update(['reflected_phase', 's12_phase'])
+    for prefix, offsets_panel in [('M_all_', 'main_offsets'), ('I_all_', 'intf_offsets')]:
+        if prefix in last_update['arrays']:
+            panel_names.update(['combined_arrays', 'array_difference', offsets_panel])
+    return panel_names
+
+
+def watch_feedline_paths(radar_name, data_location, mapping_path, figure_filename,
+                         plot_title, interval):
+    """
+    Watch the data directory during a site visit, and update the figure as each channel's
+    csv file comes in or is measured again. Only the changed channels are read, the
+    combined arrays are updated incrementally, and only the panels that depend on the
+    changed data are drawn again.
+    :param radar_name: name of the radar, for the cable model.
+    :param data_location: path of the data files.
+    :param mapping_path: path of the json file mapping channels to data files.
+    :param figure_filename: path the figure is saved to after each update.
+    :param plot_title: title of the figure.
+    :param interval: seconds between checks of the data directory.
+    """
+    cable_type, cable_length = get_cable_model(radar_name)
+    plt = get_pyplot()
+    fig, panels = make_feedline_figure(plt)
+    live_figure = LiveFigure(fig, panels, figure_filename, xlim=frequency_limits)
+    description_text = fig.text(0.65, 0.10, '', fontsize=15)
+    state = {'site': None}
+
+    def load_mapping():
+        with open(mapping_path) as f:
+            mapping_dict = json.load(f)
+        channels = [channel for channel in mapping_dict if channel[0] in 'MI']
+        # the same cable model for every feedline, as when not watching.
+        feedline_metadata = pd.DataFrame({
+            'site': radar_name, 'array': [channel[0] for channel in channels],
+            'feedline_number': [channel[1:] for channel in channels],
+            'cable_length_ft': cable_length, 'cable_type': cable_type})
+        state['site'] = IncrementalSiteAnalysis(mapping_dict, data_location,
+                                                'feedline-VSWR', radar_name,
+                                                feedline_metadata, verbose=False)
+        state['colour_dictionary'] = get_channel_colours(list(
+            state['site'].channel_files))
+        description_text.set_text(state['site'].data_description)
+
+    def on_change(changed, removed):
+        changed_paths = set(os.path.abspath(path) for path in changed + removed)
+        if state['site'] is None or os.path.abspath(mapping_path) in changed_paths:
+            print('Reading the file mapping {}'.format(mapping_path))
+            load_mapping()
+            channels = list(state['site'].channel_files)
+            panel_names = None
+        else:
+            channels = [channel for channel in state['site'].channel_files if
+                        os.path.abspath(state['site'].get_channel_path(channel)) in
+                        changed_paths]
+            panel_names = set()
+        site = state['site']
+        updated_channels = []
+        for channel in channels:
+            try:
+                updated_channels += site.update([channel])
+                if site.last_update['channels'] and panel_names is not None:
+                    panel_names.update(get_affected_panels(site.last_update) or
+                                       panels.keys())
+            except (Exception, SystemExit) as e:  # a bad export should not stop watching.
+                print('Could not read {} for {}: {}'.format(
+                    site.get_channel_path(channel), channel, e))
+        if not site.channels or panel_names == set():
+            return
+        waiting = [channel for channel in site.channel_files if channel not in
+                   site.channels]
+        status = get_status(site.missing_data, waiting)
+        live_figure.update(get_live_panel_data(site, plot_title,
+                                               state['colour_dictionary']),
+                           None if panel_names is None else
+                           [name for name in panels if name in panel_names], status)
+        print('{}: {} of {} channels, updated {}'.format(
+            time.strftime('%H:%M:%S'), len(site.channels), len(site.channel_files),
+            ' '.join(updated_channels) or 'all panels'))
+
+    print('Watching {} for data files, Ctrl-C to stop.'.format(data_location))
+    watcher = DirectoryWatcher(data_location, extra_files=[mapping_path])
+    watcher.watch(on_change, interval)
+    plt.close(fig)
+
+
 def main():
 
     parser = script_parser()
@@ -129,45 +436,34 @@ def main():
 
     sys.path.append(data_location)
 
-    #
-    # Get the cable model depending on the site being analyzed.
-    if 'Saskatoon' in radar_name or 'sas' in radar_name or 'SAS' in radar_name:
-        cable_type = 'Belden8237'  # known
-        cable_length = 600.0  # ft ??
-    elif 'Prince George' in radar_name or 'Prince_George' in radar_name or 'pgr' in radar_name or \
-            'PGR' in radar_name:
-        cable_type = 'Belden8237'  # known checked 2015 photos  - although I3 will be LMR400
-        cable_length = 600.0  # ft ??
-    elif 'Inuvik' in radar_name or 'inv' in radar_name or 'INV' in radar_name:
-        cable_type = 'EC400'  # checked 2017 photos.
-        cable_length = 600.0  # ft ??
-    elif 'Rankin Inlet' in radar_name or 'Rankin_Inlet' in radar_name or 'rkn' in radar_name or \
-            'RKN' in radar_name or 'Rankin-Inlet' in radar_name:
-        cable_type = 'C1180'  # known checked 2018
-        cable_length = 600.0  # ft TODO verify cable length
-    elif 'Clyde River' in radar_name or 'Clyde_River' in radar_name or 'cly' in radar_name or \
-            'CLY' in radar_name or 'Clyde-River' in radar_name:
-        cable_type = 'LMR400'  # known
-        cable_length = 600.0  # ft TODO verify cable length
-    else:
-        sys.exit('Not a valid radar name.')
+    if args.clear_cache:
+        retrieve.sweep_cache.clear_cache()
+    if args.no_cache:
+        retrieve.sweep_cache.set_cache_enabled(False)
 
+    if args.watch:
+        watch_feedline_paths(radar_name, data_location, plot_location + vswr_files_str,
+                             plot_location + plot_filename, plot_title, args.interval)
+        return
+
+    # Get the cable model depending on the site being analyzed.
+    cable_type, cable_length = get_cable_model(radar_name)
 
     dtypes_dict = {'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
     all_data_phase_wrapped = {}
     raw_data, colour_dictionary, missing_data, data_description = \
-        retrieve.retrieve_data_from_csv(plot_location + vswr_files_str, data_location,
-                                dtypes_dict)
+        retrieve.retrieve_data_from_csv_concurrently(plot_location + vswr_files_str,
+                                                     data_location, dtypes_dict,
+                                                     max_workers=args.workers)
 
     # Check and correct frequency array if required so all datasets are the same length
     #  with same frequency values.
-    do.reduce_frequency_array(raw_data)
+    raw_data = do.reduce_frequency_array(raw_data)
 
     # Get cable loss - this contains a loss value for all frequencies in the
     # reference_frequency list, which should directly correspond to all datasets in the
     # recorded datasets dictionary (raw_data).
-    one_array_key = random.choice(list(raw_data.keys()))
-    reference_frequency = list(raw_data[one_array_key]['freq'])
+    reference_frequency = list(next(iter(raw_data.values()))['freq'])
     cable_loss_dataset = retrieve.get_cable_loss_array(reference_frequency, cable_length,
                                               cable_type)
 
@@ -175,7 +471,7 @@ def main():
         # get estimated magnitude (dB loss) of single direction signal incident on the
         # balun when it reaches the end of the feedline.
         dataset_with_transmission_data = do.vswr_to_single_receive_direction(
-            dataset, cable_loss_dataset)
+            antenna, dataset, cable_loss_dataset)
         # Wrapping the new data with new phase for single direction.
         phase_wrapped_data = do.wrap_phase(dataset_with_transmission_data)
         all_data_phase_wrapped[antenna] = phase_wrapped_data
@@ -191,44 +487,26 @@ def main():
     ######################################################################################
     # Getting the line of best fit for each antenna and the combined arrays,
     # and the offset from the line of best fit for each antenna and array.
-    linear_fit_dict = {}
-    for ant, dataset in all_data.items():
-        linear_fit_dict[ant] = do.create_linear_fit_dictionary(dataset)
-
-    # Get all main and interferometer keys
-    main_data = {}
-    intf_data = {}
-    for ant in all_data.keys():
-        if ant[0] == 'M':  # main
-            main_data[ant] = all_data[ant]
-        elif ant[0] == 'I':  # interferometer
-            intf_data[ant] = all_data[ant]
-
-    # Combine_arrays returns unwrapped dataset.
-    unwrapped_main_array = do.combine_arrays(main_data)
-    unwrapped_intf_array = do.combine_arrays(intf_data)
+    linear_fit_dict = do.create_linear_fit_dictionaries(all_data)
 
+    # Combine the main and interferometer channels, this returns unwrapped datasets.
+    all_sweeps = SweepSet.from_dict(all_data, ['magnitude', 'phase_rad'])
+    unwrapped_main_array = all_sweeps.combine(all_sweeps.main_channels)
     # Wrapping after unwrapping ensures the first values in array are within -pi to pi.
-    combined_main_array = do.wrap_phase(unwrapped_main_array)
-    combined_intf_array = do.wrap_phase(unwrapped_intf_array)
-
+    combined_arrays = {'M_all': do.wrap_phase(unwrapped_main_array)}
     linear_fit_dict['M_all'] = do.create_linear_fit_dictionary(unwrapped_main_array)
-    linear_fit_dict['I_all'] = do.create_linear_fit_dictionary(unwrapped_intf_array)
+    if all_sweeps.intf_channels:
+        unwrapped_intf_array = all_sweeps.combine(all_sweeps.intf_channels)
+        combined_arrays['I_all'] = do.wrap_phase(unwrapped_intf_array)
+        linear_fit_dict['I_all'] = do.create_linear_fit_dictionary(unwrapped_intf_array)
+    else:
+        unwrapped_intf_array = None
+        print('No interferometer data, the arrays are not compared.')
 
     ######################################################################################
     # Computing the phase difference between the arrays and
     # also getting tdiff across the frequency range.
-    array_diff_raw = []
-    for m, i in zip(unwrapped_main_array, unwrapped_intf_array):
-        freq = i['freq']
-        phase_diff = (m['phase_deg'] - i['phase_deg'])
-        array_diff_raw.append((freq, phase_diff, 0.0))
-    array_diff_raw = np.array(array_diff_raw, dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
-                                             ('time_ns', 'f4')])
-
-    array_diff = do.wrap_phase(array_diff_raw)
-
-    # Now insert the tdiff in ns after the phase has been wrapped.
+    # The tdiff in ns is found after the phase has been wrapped.
     # This is the time difference between the signal incident on the main array
     # antennas reaching the end of the feedlines and the interferometer array signal
     # reaching the end of the feedlines. This is a portion of the entire path from
@@ -236,127 +514,61 @@ def main():
     # used in SuperDARN data analysis, and is assumed to be constant across the
     # frequency spectrum, as would be expected if the path was completely linear (such
     # as a cable).
-    for dp in array_diff:
-        freq = dp['freq']
-        phase = dp['phase_deg']
-        time_ns = phase * 1e9 / (freq * 360.0)
-        dp['time_ns'] = time_ns
+    if unwrapped_intf_array is not None:
+        array_diff = do.get_array_difference(unwrapped_main_array, unwrapped_intf_array)
+    else:
+        array_diff = None
 
     ######################################################################################
     # Writing the array difference and combined arrays to file
-    if time_file_str != 'None':
+    if time_file_str not in (None, 'None') and array_diff is not None:
         array_diff.tofile(plot_location + path_type + time_file_str, sep="\n")
     if time_file_loc != 'None':
         for ant, array in all_data.items():
             array.tofile(plot_location + time_file_loc + path_type + ant + '.txt', sep="\n")
         unwrapped_main_array.tofile(plot_location + time_file_loc + path_type +
                             'main_array_combined.txt', sep="\n")
-        unwrapped_intf_array.tofile(plot_location + time_file_loc + path_type +
-                            'intf_array_combined.txt', sep="\n")
+        if unwrapped_intf_array is not None:
+            unwrapped_intf_array.tofile(plot_location + time_file_loc + path_type +
+                                        'intf_array_combined.txt', sep="\n")
+
+    if args.no_plot:
+        return
 
     ######################################################################################
     # PLOTTING
-    numplots = 6
-    plot_num = 0
-    fig, smpplot = plt.subplots(numplots, 1, sharex='all', figsize=(18, 24),
-                                gridspec_kw={'height_ratios': [2, 2, 2, 1, 1, 1]})
-    xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
-    smpplot[numplots - 1].set_xlabel('Frequency (Hz)', size=25.0)
+    plt = get_pyplot()
+    fig, panels = make_feedline_figure(plt)
+    panel_data = {'plot_title': plot_title, 'freq': reference_frequency,
+                  'colour_dictionary': colour_dictionary,
+                  'reflected_phase': {ant: dataset['phase_deg'] for ant, dataset in
+                                      raw_data.items()},
+                  's12_phase': {ant: dataset['phase_deg'] for ant, dataset in
+                                all_data_phase_wrapped.items()},
+                  'combined_arrays': combined_arrays,
+                  'array_diff_time_ns': None if array_diff is None else
+                  array_diff['time_ns'],
+                  'linear_fit_dict': linear_fit_dict,
+                  'main_channels': all_sweeps.main_channels,
+                  'intf_channels': all_sweeps.intf_channels}
     print("plotting")
-    smpplot[plot_num].set_title(plot_title, size=48.0)
-
-    # PLOT: Phase wrapped of all data
-    for ant, dataset in raw_data.items():
-        smpplot[plot_num].plot(dataset['freq'], dataset['phase_deg'], label=ant,
-                        color=colour_dictionary[ant])
-    smpplot[plot_num].set_ylabel('VSWR Phase All Antennas', size=25.0)
-    plot_num += 1
-
-    # PLOT: combined arrays dB and phase.
-    smpplot[plot_num].plot(combined_main_array['freq'], combined_main_array['phase_deg'],
-                    color='#2942a8', label='Main Array')
-
-    smpplot[plot_num].plot(combined_intf_array['freq'], combined_intf_array['phase_deg'],
-                    color='#8ba1fa', label='Intf Array')
-
-    db_smpplot = smpplot[plot_num].twinx()
-
-    db_smpplot.plot(combined_main_array['freq'], combined_main_array['magnitude'],
-                    color='#bd3f3f', label='Main Array')
-    db_smpplot.plot(combined_intf_array['freq'], combined_intf_array['magnitude'],
-                    color='#f99191', label='Intf Array')
-
-    smpplot[plot_num].set_ylabel('Incoming Feedline Array\nPhase [degrees]', color='#3352cd',
-                          size=25.0)
-    # blue
-    smpplot[plot_num].tick_params(axis='y', labelcolor='#3352cd')
-
-    # from antenna to feedline end at building.
-    db_smpplot.set_ylabel('Combined\nArray [dB]', color='#de4b4b', size=25.0)  # red
-    db_smpplot.tick_params(axis='y', labelcolor='#de4b4b')
-    # referenced to power at a single antenna
-    plot_num += 1
-
-    # PLOT: Time difference between arrays single direction TODO this is not 1 direction
-    smpplot[plot_num].set_ylabel('S12 Perceived Time\nDifference b/w arrays\n Based on Phase ['
-                          'ns]', size=25.0)
-    smpplot[plot_num].plot(array_diff['freq'], array_diff['time_ns'])
-    plot_num += 1
-
-    # PLOT: Main Array Offset from their Best Fit Lines, and Intf Array
-    for ant, dataset in all_data.items():
-        if ant[0] == 'M':  # plot with main array
-            smpplot[plot_num].plot(dataset['freq'], linear_fit_dict[ant][
-                'offset_of_best_fit_rads'] * 180.0 / math.pi,
-                            label='{}, delay={} ns'.format(ant,
-                                                           linear_fit_dict[ant]['time_delay_ns']),
-                            color=colour_dictionary[ant])
-        elif ant[0] == 'I':
-            smpplot[plot_num + 1].plot(dataset['freq'], linear_fit_dict[ant][
-                'offset_of_best_fit_rads'] * 180.0 / math.pi,
-                    label='{}, delay={} ns'.format(ant, linear_fit_dict[ant][
-                        'time_delay_ns']), color=colour_dictionary[ant])
-
-    smpplot[plot_num].plot(all_data['M0']['freq'], linear_fit_dict['M_all'][
-        'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
-            label='Combined Main, delay={} ns'.format(linear_fit_dict[
-                'M_all']['time_delay_ns']))  # plot last
-    smpplot[plot_num + 1].plot(all_data['M0']['freq'], linear_fit_dict['I_all'][
-        'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
-            label='Combined Intf, delay={} ns'.format(linear_fit_dict[
-                'I_all']['time_delay_ns']))  # plot last
-
-
-    smpplot[plot_num].legend(fontsize=10, ncol=4, loc='upper right')
-    smpplot[plot_num + 1].legend(fontsize=12, loc='upper right')
-    smpplot[plot_num].set_ylabel('S12 Main Phase Offset\n from Own Line of Best\nFit ['
-                                 'degrees]', size=15.0)
-    smpplot[plot_num + 1].set_ylabel('S12 Intf Phase Offset\n from Own Line of Best\nFit [degrees]', size=15.0)
-    plot_num += 2
-
-    # PLOT: Phase wrapped of all data
-    for ant, dataset in all_data_phase_wrapped.items():
-        smpplot[plot_num].plot(dataset['freq'], dataset['phase_deg'], label=ant,
-                        color=colour_dictionary[ant])
-    smpplot[plot_num].set_ylabel('S12 Phase All Antennas')
+    for axes_list, draw_function in panels.values():
+        draw_function(*(axes_list + [panel_data]))
+    panels['reflected_phase'][0][0].set_xlim(*frequency_limits)
 
     if missing_data:  # not empty
         missing_data_statement = "***MISSING DATA FROM ANTENNA(S) "
         for element in missing_data:
             missing_data_statement = missing_data_statement + element + " "
         print(missing_data_statement)
-        plt.figtext(0.65, 0.05, missing_data_statement, fontsize=15)
+        fig.text(0.65, 0.05, missing_data_statement, fontsize=15)
 
     if data_description:
         print(data_description)
-        plt.figtext(0.65, 0.10, data_description, fontsize=15)
-
-    for plot in range(0, numplots):
-        smpplot[plot].grid()
+        fig.text(0.65, 0.10, data_description, fontsize=15)
 
     fig.savefig(plot_location + plot_filename)
     plt.close(fig)
 
-
-if __name__ == main():
+if __name__ == '__main__':
     main()
@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+
+# batch_process.py
+# Analyse many site visit datasets in one run and write a summary table of the delays
+# and array time differences (tdiff) for each. The datasets are listed in a manifest csv
+# with the same columns as presentation/site_file_metadata.csv:
+#     site,date,data_type,mapping_filename,data_location,interim_data
+# Relative mapping filenames are found relative to the manifest's directory.
+#
+# All datasets are processed in one process pool, so the interpreter and library start up
+# once per worker instead of once per dataset, and the workers share the sweep cache on
+# disk and keep their cable loss caches between datasets. With --plot-directory, each
+# worker also renders the figure of the datasets it analysed with the Agg backend, so
+# figures of several sites are drawn at once.
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+import retrieve_data.sweep_cache as sweep_cache
+import retrieve_data.retrieve_data as retrieve
+import site_analysis.site_analysis as site_analysis
+import metadata_catalog.metadata_catalog as metadata_catalog
+import rendering.rendering as rendering
+import rendering.site_plots as site_plots
+
+
+def usage_msg():
+    """
+    Return the usage message for this script.
+
+    This is used if a -h flag or invalid arguments are provided.
+
+    :return: the usage message
+    """
+
+    usage_message = """ batch_process.py [-h] [-o OUTPUT] [-w WORKERS] [--site SITE]
+    [--data-type DATA_TYPE] [--after DATE] [--before DATE] [--feedline-metadata FILE]
+    [--no-cache]
+    [--plot-directory PLOT_DIRECTORY] [--archive ARCHIVE] manifest
+
+    Run the site analysis for every dataset in a manifest csv (like
+    site_file_metadata.csv) and write a csv summary table of the linear fit delays of
+    every channel and combined array, and the time difference between the arrays.
+    Optionally also save a figure of each dataset.
+    """
+
+    return usage_message
+
+
+def script_parser():
+    """
+    Creates the parser to retrieve the arguments.
+
+    :return: parser, the argument parser for this script.
+    """
+
+    parser = argparse.ArgumentParser(usage=usage_msg())
+    parser.add_argument("manifest", help="Path to the manifest csv of datasets, with "
+                                         "columns site, date, data_type, "
+                                         "mapping_filename and data_location.")
+    parser.add_argument("-o", "--output", default='site_summary.csv',
+                        help="Path of the summary csv to write. Default site_summary.csv")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of worker processes. Default is the number of CPUs.")
+    parser.add_argument("--site", action='append',
+                        help="Only process this site. Can be given more than once.")
+    parser.add_argument("--data-type", action='append', dest='data_type',
+                        help="Only process this data type. Can be given more than once.")
+    parser.add_argument("--after", type=int, default=None,
+                        help="Only process datasets after this date (YYYYMMDD) or year "
+                             "(YYYY).")
+    parser.add_argument("--before", type=int, default=None,
+                        help="Only process datasets before this date (YYYYMMDD) or year "
+                             "(YYYY).")
+    parser.add_argument("--feedline-metadata", dest='feedline_metadata', default=None,
+                        help="Path to the feedline metadata csv used for cable losses. "
+                             "Default is site_feedline_metadata.csv beside the manifest.")
+    parser.add_argument("--no-cache", action='store_true',
+                        help="Parse all csv files again instead of using the sweep cache.")
+    parser.add_argument("--plot-directory", dest='plot_directory', default=None,
+                        help="Save a figure of each dataset in this directory.")
+    parser.add_argument("--archive", default=None,
+                        help="Read sweeps from this sweep archive where they are archived, "
+                             "see retrieve_data/sweep_archive.py.")
+    return parser
+
+
+def initialize_worker(use_cache, archive_directory=None):
+    """
+    Set up a worker process: use the sweep cache or not, read from the sweep archive if
+    given, and render figures with the Agg backend.
+    :param use_cache: use the sweep cache.
+    :param archive_directory: path to a sweep archive, or None.
+    """
+    sweep_cache.set_cache_enabled(use_cache)
+    if archive_directory is not None:
+        retrieve.set_sweep_archive(archive_directory)
+    rendering.use_headless_backend()
+
+
+def get_figure_filename(metadata, plot_directory):
+    """
+    :param metadata: dictionary of one row of the manifest.
+    :param plot_directory: directory to save figures in.
+    :return: path of the figure of this dataset.
+    """
+    figure_name = '{} {} {}.png'.format(metadata['site'], metadata['date'],
+                                       metadata['data_type'])
+    return os.path.join(plot_directory, figure_name.replace(os.sep, '-'))
+
+
+def process_dataset(metadata, manifest_directory, feedline_metadata, plot_directory=None):
+    """
+    Analyse one dataset in the manifest.
+    :param metadata: dictionary of one row of the manifest.
+    :param manifest_directory: directory of the manifest file.
+    :param feedline_metadata: dataframe of the feedline metadata, or None.
+    :param plot_directory: if given, save a figure of the dataset in this directory.
+    :return: dictionary of the row of the summary table for this dataset.
+    """
+    summary = {'site': metadata['site'], 'date': metadata['date'],
+               'data_type': metadata['data_type'],
+               'mapping_filename': metadata['mapping_filename']}
+    start_time = time.perf_counter()
+    try:
+        with open(metadata_catalog.resolve_path(str(metadata['mapping_filename']),
+                                                manifest_directory)) as f:
+            mapping_dict = json.load(f)
+        results = site_analysis.analyse_site(mapping_dict, str(metadata['data_location']),
+                                             str(metadata['data_type']),
+                                             str(metadata['site']), feedline_metadata,
+                                             verbose=False)
+        summary.update(site_analysis.summarize_site(results))
+        if plot_directory is not None:
+            summary['figure'] = site_plots.render_site_figure(
+                results, '{} {} {}'.format(metadata['site'], metadata['date'],
+                                           metadata['data_type']),
+                get_figure_filename(metadata, plot_directory))
+        summary['error'] = ''
+    except Exception as e:  # record the failure and continue with the other datasets.
+        summary['error'] = '{}: {}'.format(type(e).__name__, e)
+    summary['processing_time_s'] = round(time.perf_counter() - start_time, 3)
+    return summary
+
+
+def main():
+    parser = script_parser()
+    args = parser.parse_args()
+
+    catalog = metadata_catalog.MetadataCatalog.from_csv(args.manifest,
+                                                        args.feedline_metadata)
+    datasets = catalog.query(site=args.site, data_type=args.data_type, after=args.after,
+                             before=args.before)
+    if not datasets:
+        sys.exit('No datasets in the manifest to process.')
+    feedline_metadata = catalog.feedline_metadata
+
+    if args.plot_directory is not None:
+        os.makedirs(args.plot_directory, exist_ok=True)
+
+    start_time = time.perf_counter()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=initialize_worker,
+                             initargs=(not args.no_cache, args.archive)) as executor:
+        futures = [executor.submit(process_dataset, dataset.metadata,
+                                   catalog.base_directory, feedline_metadata,
+                                   args.plot_directory) for dataset in datasets]
+        for future in futures:  # in manifest order.
+            summary = future.result()
+            print('{} {} {}: {}'.format(summary['site'], summary['date'],
+                                        summary['data_type'], summary['error'] or
+                                        'tdiff {:.3f} ns'.format(
+                                            summary.get('tdiff_ns_median', float('nan')))))
+            summaries.append(summary)
+
+    summary_table = pd.DataFrame(summaries)
+    first_columns = ['site', 'date', 'data_type', 'main_delay_ns', 'intf_delay_ns',
+                     'fit_tdiff_ns', 'tdiff_ns_mean', 'tdiff_ns_median', 'tdiff_ns_std']
+    first_columns = [column for column in first_columns if column in
+                     summary_table.columns]
+    summary_table = summary_table[first_columns + [column for column in
+                                                   summary_table.columns if column not
+                                                   in first_columns]]
+    summary_table.to_csv(args.output, index=False)
+    print('Processed {} datasets in {:.1f} s, summary written to {}'.format(
+        len(summaries), time.perf_counter() - start_time, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,129 +1,220 @@
 import numpy as np
 import math
 import sys
-from scipy import stats
-import random
 import pandas as pd
+from numpy.lib import recfunctions as rfn
 
 
-def unwrap_phase(data):
+# If there is a jump from one datapoint to the next of more than 250 degrees,
+# we will assume it is a wrap (there was a 360 degree jump between the datapoints). It
+# may be this low due to a large slope in the line (if the path is long)
+UNWRAP_THRESHOLD_DEG = 250.0
+
+# Columns that can hold phase, and the factor to convert each to degrees.
+PHASE_COLUMNS_TO_DEGREES = {'phase': 1.0, 'phase_deg': 1.0, 'phase_rad': 180.0 / math.pi}
+
+
+def get_column_names(data):
     """
-    Take a numpy array with phase, phase_deg, and/or phase_rad datatypes and unwrap.
-    :param data: a numpy array
-    :return: a new array with unwrapped phase, phase_deg, and/or phase_rad dtypes
+    Get the column names of a dataframe or the dtype names of a structured numpy array.
+    :param data: a pandas dataframe, a structured numpy array, or a plain numpy array.
+    :return: list of column names, or None if data is a plain (unstructured) array.
     """
-    try:
-        assert 'phase' in data.columns or 'phase_deg' in data.columns or \
-               'phase_rad' in data.columns
-    except:
+    if isinstance(data, pd.DataFrame):
+        return list(data.columns)
+    if isinstance(data, np.ndarray) and data.dtype.names is not None:
+        return list(data.dtype.names)
+    return None
+
+
+def get_phase_columns(data):
+    """
+    Get the phase columns (any of phase, phase_deg, phase_rad) found in the data.
+    :param data: a pandas dataframe or a structured numpy array.
+    :return: list of phase column names in the data.
+    """
+    column_names = get_column_names(data)
+    phase_columns = [column for column in PHASE_COLUMNS_TO_DEGREES if column in
+                     column_names]
+    if not phase_columns:
         raise Exception('Cannot Find Phase Column to Wrap in DataFrame')
+    return phase_columns
 
-    # If there is a jump from one datapoint to the next of more than 250 degrees,
-    # we will assume it is a wrap (there was a 360 degree jump between the datapoints). It
-    # may be this low due to a large slope in the line (if the path is long)
 
-    new_data = data.copy(deep=True)
-    if 'phase_deg' in data.columns:
-        if np.amax(data['phase_deg']) < 180.0 and np.amin(data['phase_deg']) > -180.0:
-            for num, entry in enumerate(data['phase_deg']):
-                if num == 0:
-                    continue
-                if entry > 250.0 + data['phase_deg'][num - 1]:
-                    for i in range(num, len(data)):
-                        new_data['phase_deg'][i] -= 360.0
-                elif entry < -250.0 + data['phase_deg'][num - 1]:
-                    for i in range(num, len(data)):
-                        new_data['phase_deg'][i] += 360.0
-    if 'phase' in data.columns:
-        if np.amax(data['phase']) < 180.0 and np.amin(data['phase']) > -180.0:
-            for num, entry in enumerate(data['phase']):
-                if num == 0:
-                    continue
-                if entry > (250.0 + data['phase'][num - 1]):
-                    for i in range(num, len(new_data)):
-                        new_data['phase'][i] -= 360.0
-                elif entry < (-250.0 + data['phase'][num - 1]):
-                    for i in range(num, len(new_data)):
-                        new_data['phase'][i] += 360.0
-    if 'phase_rad' in data.columns:
-        if np.amax(data['phase_rad']) < math.pi and np.amin(data['phase_rad']) > -math.pi:
-            for num, entry in enumerate(data['phase_rad']):
-                if num == 0:
-                    continue
-                if entry > (250.0 * math.pi / 180.0) + data['phase_rad'][num - 1]:
-                    for i in range(num, len(data)):
-                        new_data['phase_rad'][i] -= 2 * math.pi
-                elif entry < -(250.0 * math.pi / 180.0) + data['phase_rad'][num - 1]:
-                    for i in range(num, len(data)):
-                        new_data['phase_rad'][i] += 2 * math.pi
+def unwrap_degrees_block(phase_block):
+    """
+    Unwrap a block of phase data in degrees along the last axis. Each row of a 2-D block
+    (for example channel x frequency) is unwrapped independently.
+
+    A row is only unwrapped if all of its values are within -180 to 180 degrees (ie. it
+    is currently wrapped). Every jump between neighbouring datapoints of more than
+    UNWRAP_THRESHOLD_DEG degrees is taken to be a wrap, and a 360 degree correction is
+    applied to that datapoint and all datapoints after it.
+
+    :param phase_block: 1-D or 2-D numpy array of phase in degrees.
+    :return: a new float array of the same shape with the phase unwrapped.
+    """
+    phase_block = np.asarray(phase_block, dtype=float)
+    if phase_block.shape[-1] < 2:
+        return phase_block.copy()
+
+    jumps = np.diff(phase_block, axis=-1)
+    wraps = (jumps < -UNWRAP_THRESHOLD_DEG).astype(int) - \
+        (jumps > UNWRAP_THRESHOLD_DEG).astype(int)
+    correction = np.zeros_like(phase_block)
+    correction[..., 1:] = np.cumsum(wraps, axis=-1) * 360.0
+
+    is_wrapped = (np.amax(phase_block, axis=-1) < 180.0) & \
+        (np.amin(phase_block, axis=-1) > -180.0)
+    return np.where(np.expand_dims(is_wrapped, -1), phase_block + correction,
+                    phase_block)
+
+
+def unwrap_phase(data, units='deg'):
+    """
+    Take a dataframe or numpy array with phase, phase_deg, and/or phase_rad columns and
+    unwrap. All phase columns are unwrapped together in a single pass.
+    :param data: a pandas dataframe, a structured numpy array, or a plain 1-D or 2-D
+    (channel x frequency) numpy array of phase values.
+    :param units: 'deg' or 'rad', only used when data is a plain numpy array.
+    :return: a new array with unwrapped phase, phase_deg, and/or phase_rad dtypes
+    """
+    column_names = get_column_names(data)
+    if column_names is None:
+        to_degrees = 180.0 / math.pi if units == 'rad' else 1.0
+        return unwrap_degrees_block(np.asarray(data) * to_degrees) / to_degrees
+
+    phase_columns = get_phase_columns(data)
+    phase_block = np.vstack([np.asarray(data[column], dtype=float) *
+                             PHASE_COLUMNS_TO_DEGREES[column] for column in
+                             phase_columns])
+    unwrapped_block = unwrap_degrees_block(phase_block)
+
+    if isinstance(data, pd.DataFrame):
+        new_data = data.copy(deep=True)
+    else:
+        new_data = data.copy()
+    for column, unwrapped_phase in zip(phase_columns, unwrapped_block):
+        new_data[column] = unwrapped_phase / PHASE_COLUMNS_TO_DEGREES[column]
 
     return new_data
 
 
-def wrap_phase(data):
+def wrap_degrees_block(phase_block):
     """
-    Take a numpy array with dtype of phase, phase_deg, or phase_rad and wrap the phase.
-    :param data: a numpy array
-    :return: a new array with wrapped phase, phase_deg, and/or phase_rad dtypes
+    Confine phase data in degrees within -180 to 180 degrees using modular arithmetic.
+    Values already within -180 to 180 degrees are left as they are.
+    :param phase_block: numpy array of any shape of phase in degrees.
+    :return: a new float array of the same shape with the phase wrapped.
     """
+    phase_block = np.asarray(phase_block, dtype=float)
+    out_of_range = (phase_block > 180.0) | (phase_block < -180.0)
+    return np.where(out_of_range, phase_block - 360.0 * np.floor_divide(phase_block +
+                    180.0, 360.0), phase_block)
 
-    try:
-        assert 'phase' in data.columns or 'phase_deg' in data.columns or \
-               'phase_rad' in data.columns
-    except:
-        raise Exception('Cannot Find Phase Column to Wrap in DataFrame')
 
-    # Confine the phase within 180 degrees to -180 degrees to wrap it.
-
-    new_data = data.copy(deep=True)
-    if 'phase' in data.columns:
-        if np.amax(data['phase']) > 180.0 or np.amin(data['phase']) < -180.0:
-            phase_data = np.array(new_data['phase'])
-            for num, entry in enumerate(phase_data):
-                if entry > 180.0:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] - 360.0
-                elif entry < -180.0:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] + 360.0
-            new_data['phase'] = phase_data
-    if 'phase_deg' in data.columns:
-        if np.amax(data['phase_deg']) > 180.0 or np.amin(data['phase_deg']) < -180.0:
-            phase_data = np.array(new_data['phase_deg'])
-            for num, entry in enumerate(phase_data):
-                if entry > 180.0:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] - 360.0
-                elif entry < -180.0:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] + 360.0
-            new_data['phase_deg'] = phase_data
-    if 'phase_rad' in data.columns:
-        if np.amax(data['phase_rad']) > math.pi or np.amin(data['phase_rad']) < -math.pi:
-            phase_data = np.array(new_data['phase_rad'])
-            for num, entry in enumerate(phase_data):
-                if entry > math.pi:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] - 2 * math.pi
-                elif entry < -math.pi:
-                    for i in range(num, len(phase_data)):
-                        phase_data[i] = phase_data[i] + 2 * math.pi
-            new_data['phase_rad'] = phase_data
+def wrap_phase(data, units='deg', inplace=False):
+    """
+    Take a dataframe or numpy array with phase, phase_deg, or phase_rad columns and wrap
+    the phase.
+    :param data: a pandas dataframe, a structured numpy array, or a plain numpy array of
+    phase values.
+    :param units: 'deg' or 'rad', only used when data is a plain numpy array.
+    :param inplace: if True, write the wrapped phase into data instead of a copy.
+    :return: a new array with wrapped phase, phase_deg, and/or phase_rad dtypes, or data
+    itself if inplace.
+    """
+    column_names = get_column_names(data)
+    if column_names is None:
+        to_degrees = 180.0 / math.pi if units == 'rad' else 1.0
+        wrapped_data = wrap_degrees_block(np.asarray(data) * to_degrees) / to_degrees
+        if inplace:
+            data[...] = wrapped_data
+            return data
+        return wrapped_data
+
+    phase_columns = get_phase_columns(data)
+    return wrap_phase_columns(data, phase_columns, inplace=inplace)
+
+
+def get_wide_phase_columns(dataframe):
+    """
+    Get all columns of a wide dataframe that hold wrappable phase, ie. columns ending
+    in phase, phase_deg, or phase_rad (such as 'M0phase_deg' or 'M_all_phase_rad').
+    Unwrapped columns (ending in _unwrap) are not included.
+    :param dataframe: a pandas dataframe or structured numpy array.
+    :return: list of column names.
+    """
+    return [column for column in get_column_names(dataframe) if
+            column.endswith(tuple(PHASE_COLUMNS_TO_DEGREES))]
+
+
+def wrap_phase_columns(data, columns=None, inplace=False):
+    """
+    Wrap many phase columns of a dataframe or structured array in one call. This is
+    useful for a wide dataframe holding every channel, such as the working_dataframe
+    in presentation/load_data.py.
+    :param data: a pandas dataframe or structured numpy array.
+    :param columns: the columns to wrap. Columns ending in 'rad' are treated as radians
+    and all others as degrees. If None, all columns found by get_wide_phase_columns.
+    :param inplace: if True, write the wrapped phase into data instead of a copy.
+    :return: data with the given columns wrapped (a copy unless inplace).
+    """
+    if columns is None:
+        columns = get_wide_phase_columns(data)
+    to_degrees = np.array([180.0 / math.pi if column.endswith('rad') else 1.0 for column
+                           in columns])
+
+    phase_block = np.vstack([np.asarray(data[column], dtype=float) for column in
+                             columns]) * to_degrees[:, np.newaxis]
+    wrapped_block = wrap_degrees_block(phase_block) / to_degrees[:, np.newaxis]
+
+    if inplace:
+        new_data = data
+    elif isinstance(data, pd.DataFrame):
+        new_data = data.copy(deep=True)
+    else:
+        new_data = data.copy()
+    for column, wrapped_phase in zip(columns, wrapped_block):
+        new_data[column] = wrapped_phase
 
     return new_data
 
 
-def wrap_phase_dictionary(dict_with_freq_and_phase):
+def wrap_phase_dictionary(dict_with_freq_and_phase, inplace=False):
     """
     Take a dictionary with values that are numpy arrays with dtypes of freq and any of phase,
-    phase_deg, or phase_rad and wrap all values in the dictionary. 
+    phase_deg, or phase_rad and wrap all values in the dictionary. The phase of all
+    datasets is wrapped together in a single operation.
     :param dict_with_freq_and_phase: 
+    :param inplace: if True, wrap the phase of the datasets in the dictionary in place.
     :return: dictionary with all values of numpy arrays having phase wrapped.
     """
     new_dict = {}
     for ant, dataset in dict_with_freq_and_phase.items():
-        wrapped_dataset = wrap_phase(dataset)
-        new_dict[ant] = wrapped_dataset
+        if inplace:
+            new_dict[ant] = dataset
+        elif isinstance(dataset, pd.DataFrame):
+            new_dict[ant] = dataset.copy(deep=True)
+        else:
+            new_dict[ant] = dataset.copy()
+
+    phase_columns = {ant: get_phase_columns(dataset) for ant, dataset in
+                     new_dict.items()}
+    phase_arrays = [np.asarray(new_dict[ant][column], dtype=float) *
+                    PHASE_COLUMNS_TO_DEGREES[column] for ant, columns in
+                    phase_columns.items() for column in columns]
+    if not phase_arrays:
+        return new_dict
+
+    # Wrap every dataset's phase as one concatenated array, then split it back up.
+    split_indices = np.cumsum([len(phase_array) for phase_array in phase_arrays])[:-1]
+    wrapped_arrays = iter(np.split(wrap_degrees_block(np.concatenate(phase_arrays)),
+                                   split_indices))
+    for ant, columns in phase_columns.items():
+        for column in columns:
+            new_dict[ant][column] = next(wrapped_arrays) / \
+                PHASE_COLUMNS_TO_DEGREES[column]
 
     return new_dict
 
@@ -137,72 +228,218 @@ def reduce_frequency_array(dict_of_dataframes_with_freq_column, freqs=None):
     return an error.
 
     This is useful because sometimes site-recorded datasets were recorded with a
-    different number of points (200, 400, 800) over the same frequency spectrum. To be
+    different number of points (401, 801, 1601) over the same frequency spectrum. To be
     able to compare these datasets and combine datasets into a single array, this function
     will make all datasets equal to the minimum length given by removing the points in
-    between.
+    between. Longer datasets are decimated by slicing every n-th point, so numpy arrays
+    are returned as views of the original arrays rather than copies, and the frequency
+    axis of each dataset is checked in a single array comparison.
 
-    Pass in 'freqs', a Series, if you want to also check that the
+    Pass in 'freqs', a Series or array, if you want to also check that the
     frequencies are the same as some reference frequency array.
 
     :param dict_of_dataframes_with_freq_column: dictionary where each value is a
-    dataframe that represents a path over the frequency spectrum, having a column
-    name of 'freq'. Other dtypes common are for phase (phase_rad, phase_deg) and
+    dataframe or structured numpy array that represents a path over the frequency
+    spectrum, having a column name of 'freq'. Other dtypes common are for phase (phase_rad, phase_deg) and
     magnitude, but they are not necessary; the other columns can be anything and the
     values will be populated to preserve the data recorded across frequency.
     :param freqs: a reference frequency array, if None then will use the frequency of the
         first shortest dataset found in the dictionary.
-    :return: dict_of_arrays_with_freq_dtype, where all arrays are of same length.
+    :return: dict_of_dataframes_with_freq_column, updated in place so that all
+    datasets are of same length. An empty dictionary is returned unchanged.
     """
 
+    if not dict_of_dataframes_with_freq_column:
+        return dict_of_dataframes_with_freq_column
+
     # get the minimum dataset length of datasets in the dictionary in case the data was
     # recorded using a different number of points.
     min_dataset_length = get_min_dataset_length(dict_of_dataframes_with_freq_column)
-    short_dataset_keys = []  # list of keys with the minimum dataset length
-    long_datasets = {}
-    for ant, dataset in dict_of_dataframes_with_freq_column.items():
-        if len(dataset) == min_dataset_length:
-            short_dataset_keys.append(ant)
-        else:
-            long_datasets[ant] = len(dataset)
 
     if freqs is None:
-        reference_frequency = dict_of_dataframes_with_freq_column[short_dataset_keys[0]]['freq']
+        reference_frequency = next(
+            np.asarray(dataset['freq']) for dataset in
+            dict_of_dataframes_with_freq_column.values() if
+            len(dataset) == min_dataset_length)
     else:
-        reference_frequency = freqs
-
-    # Check if all the short datasets have the same values for frequency.
-    for ant in short_dataset_keys:
-        for index, entry in dict_of_dataframes_with_freq_column[ant].iterrows():
-            # print(entry['freq'] - reference_frequency[value])
-            if not np.array_equal(entry['freq'], reference_frequency[index]):
-                sys.exit()
-
-    for ant, length in long_datasets.items():
-        lines_to_delete = []
-        if (length - 1) % (min_dataset_length - 1) == 0:
-            integer = length/min_dataset_length
-            for value, entry in dict_of_dataframes_with_freq_column[ant].iterrows():
-                #print(value, entry)
-                if value == 0 and entry['freq'] == reference_frequency[0]:
-                    continue
-                elif value % integer != 0:
-                    lines_to_delete.append(value)
-                elif entry['freq'] != reference_frequency[value/integer]:
-                    print(entry['freq'], reference_frequency[value/integer])
-                    raise Exception('Datasets are in multiple lengths but frequency axis '
-                              'values are not the same when divided, length {} broken down to length '
-                              '{}'.format(length, min_dataset_length))
-            dict_of_dataframes_with_freq_column[ant].drop(dict_of_dataframes_with_freq_column[ant
-                                                          ].index[lines_to_delete], inplace=True)
+        reference_frequency = np.asarray(freqs)
+
+    for ant, dataset in dict_of_dataframes_with_freq_column.items():
+        length = len(dataset)
+        if length == min_dataset_length:
+            step = 1
+        elif min_dataset_length > 1 and (length - 1) % (min_dataset_length - 1) == 0:
+            # eg. 801 points to 401 points keeps every second point, 1601 to 401 keeps
+            # every fourth point, including the first and last points.
+            step = (length - 1) // (min_dataset_length - 1)
         else:
             raise Exception('Please ensure datasets are the same length and frequency axes '
-                     'are the same, length {} is greater than minimum dataset length '
-                     '{}'.format(length, min_dataset_length))
+                            'are the same, length {} is greater than minimum dataset length '
+                            '{}'.format(length, min_dataset_length))
+
+        if step == 1:
+            reduced_dataset = dataset
+        elif isinstance(dataset, pd.DataFrame):
+            reduced_dataset = dataset.iloc[::step]
+        else:
+            reduced_dataset = dataset[::step]  # a view of the original array.
+
+        if not np.array_equal(np.asarray(reduced_dataset['freq']), reference_frequency):
+            if step == 1:
+                raise Exception('Datasets are the same length but frequency axis values '
+                                'are not the same for {}'.format(ant))
+            raise Exception('Datasets are in multiple lengths but frequency axis '
+                            'values are not the same when divided, length {} broken down '
+                            'to length {}'.format(length, min_dataset_length))
+
+        dict_of_dataframes_with_freq_column[ant] = reduced_dataset
 
     return dict_of_dataframes_with_freq_column
 
 
+def get_resample_grid(dict_of_arrays_with_freq_dtype, target='finest'):
+    """
+    Get the frequency grid that all datasets can be resampled onto. This is the target
+    grid limited to the band that all datasets cover, from the highest start frequency
+    in any of the datasets to the lowest end frequency in any of the datasets.
+
+    :param dict_of_arrays_with_freq_dtype: dictionary where each value is a numpy
+    array or dataframe with a 'freq' column, sorted by frequency.
+    :param target: 'finest' to use the frequencies of the dataset with the most points
+    in the common band, 'coarsest' to use the dataset with the fewest points, or an
+    array of frequencies.
+    :return: numpy array of the frequencies to resample onto.
+    """
+    freq_arrays = [np.asarray(dataset['freq']) for dataset in
+                   dict_of_arrays_with_freq_dtype.values()]
+    latest_starting_freq = max(freq[0] for freq in freq_arrays)
+    earliest_ending_freq = min(freq[-1] for freq in freq_arrays)
+    if latest_starting_freq > earliest_ending_freq:
+        raise Exception('Datasets do not have any frequencies in common, cannot resample.')
+
+    def limit_to_common_band(freq):
+        return freq[np.searchsorted(freq, latest_starting_freq, side='left'):
+                    np.searchsorted(freq, earliest_ending_freq, side='right')]
+
+    if isinstance(target, str):
+        grids = [limit_to_common_band(freq) for freq in freq_arrays]
+        if target == 'finest':
+            return max(grids, key=len)
+        elif target == 'coarsest':
+            return min(grids, key=len)
+        raise Exception('Unknown resample target {}, use finest, coarsest or an array of '
+                        'frequencies.'.format(target))
+    return limit_to_common_band(np.asarray(target))
+
+
+def interpolate_block(source_freq, block, target_freq, method='linear'):
+    """
+    Interpolate every row of a block of data from one frequency grid to another in one
+    operation.
+    :param source_freq: the frequencies of the block columns, increasing.
+    :param block: 2D array where each row is a dataset sampled at source_freq.
+    :param target_freq: the frequencies to interpolate onto, within the source_freq range.
+    :param method: 'linear', 'cubic' or 'nearest'.
+    :return: 2D array of shape (rows, len(target_freq)).
+    """
+    source_freq = np.asarray(source_freq, dtype=float)
+    target_freq = np.asarray(target_freq, dtype=float)
+    if method == 'cubic':
+        from scipy.interpolate import CubicSpline
+        return CubicSpline(source_freq, block, axis=1)(target_freq)
+
+    # index of the source point at or below each target point.
+    lower = np.clip(np.searchsorted(source_freq, target_freq, side='right') - 1, 0,
+                    len(source_freq) - 2)
+    fraction = (target_freq - source_freq[lower]) / (source_freq[lower + 1] -
+                                                     source_freq[lower])
+    if method == 'linear':
+        return block[:, lower] * (1.0 - fraction) + block[:, lower + 1] * fraction
+    elif method == 'nearest':
+        return block[:, np.where(fraction > 0.5, lower + 1, lower)]
+    raise Exception('Unknown interpolation method {}, use linear, cubic or '
+                    'nearest.'.format(method))
+
+
+def resample_frequency_array(dict_of_arrays_with_freq_dtype, target='finest',
+                             method='linear'):
+    """
+    Resample all datasets in the dictionary onto a common frequency grid so that they
+    are all the same length and have the same elements for the 'freq' dtype.
+
+    All datasets recorded on the same frequency grid are interpolated together as one
+    block, with all of their columns at once. Phase columns (phase, phase_deg,
+    phase_rad) are interpolated as phasors so that interpolating between points on
+    either side of a wrap does not give a value in the middle of the circle. The
+    resampled phase is kept on the same branch as the original data, so unwrapped
+    phase stays unwrapped.
+
+    :param dict_of_arrays_with_freq_dtype: dictionary where each value is a
+    numpy array or dataframe that represents a path over the frequency spectrum, having
+    a dtype name of 'freq'. Other dtypes common are for phase (phase_rad, phase_deg) and
+    magnitude, but they are not necessary; the other dtypes can be anything and the
+    values will be populated to preserve the data recorded across frequency.
+    :param target: 'finest', 'coarsest' or an array of frequencies, see
+    get_resample_grid.
+    :param method: 'linear', 'cubic' or 'nearest' interpolation.
+    :return: new dictionary of datasets, all on the same frequency grid.
+    """
+    target_freq = get_resample_grid(dict_of_arrays_with_freq_dtype, target)
+
+    # group the datasets by source frequency grid so each grid is interpolated once.
+    groups = {}
+    for path, dataset in dict_of_arrays_with_freq_dtype.items():
+        source_freq = np.asarray(dataset['freq'])
+        groups.setdefault(source_freq.tobytes(), (source_freq, []))[1].append(path)
+
+    new_dict_of_arrays = {}
+    for source_freq, paths in groups.values():
+        rows = []
+        row_index = {}
+        for path in paths:
+            dataset = dict_of_arrays_with_freq_dtype[path]
+            for column in get_column_names(dataset):
+                if column == 'freq':
+                    continue
+                values = np.asarray(dataset[column], dtype=float)
+                row_index[(path, column)] = len(rows)
+                rows.append(values)
+                if column in PHASE_COLUMNS_TO_DEGREES:
+                    phase_rad = np.radians(values * PHASE_COLUMNS_TO_DEGREES[column])
+                    rows.extend([np.cos(phase_rad), np.sin(phase_rad)])
+
+        resampled = interpolate_block(source_freq, np.array(rows).reshape(
+            len(rows), len(source_freq)), target_freq, method)
+
+        for path in paths:
+            dataset = dict_of_arrays_with_freq_dtype[path]
+            columns = {'freq': target_freq}
+            for column in get_column_names(dataset):
+                if column == 'freq':
+                    continue
+                row = row_index[(path, column)]
+                values = resampled[row]
+                if column in PHASE_COLUMNS_TO_DEGREES:
+                    # keep the phasor angle on the branch of the interpolated phase.
+                    to_degrees = PHASE_COLUMNS_TO_DEGREES[column]
+                    phasor_deg = np.degrees(np.arctan2(resampled[row + 2],
+                                                       resampled[row + 1]))
+                    values = values + wrap_degrees_block(
+                        phasor_deg - values * to_degrees) / to_degrees
+                columns[column] = values
+
+            if isinstance(dataset, pd.DataFrame):
+                new_dict_of_arrays[path] = pd.DataFrame(columns,
+                                                        columns=dataset.columns).astype(
+                    dataset.dtypes.to_dict())
+            else:
+                new_dict_of_arrays[path] = np.zeros(len(target_freq), dtype=dataset.dtype)
+                for column, values in columns.items():
+                    new_dict_of_arrays[path][column] = values
+
+    return {path: new_dict_of_arrays[path] for path in dict_of_arrays_with_freq_dtype}
+
+
 def interp_frequency_array(dict_of_arrays_with_freq_dtype):
     """
     Make all arrays in the dictionary the same length, and make all arrays in the
@@ -220,136 +457,315 @@ def interp_frequency_array(dict_of_arrays_with_freq_dtype):
     values will be populated to preserve the data recorded across frequency.
     :return: dict_of_arrays_with_freq_dtype, where all arrays are the same length.
     """
+    return resample_frequency_array(dict_of_arrays_with_freq_dtype, target='finest',
+                                    method='linear')
 
-    # find latest starting frequency and earliest end frequency of the arrays in the dict.
-    latest_starting_freq = 0
-    earliest_ending_freq = 10000000000
-    max_data_points = 0
-    for path, array in dict_of_arrays_with_freq_dtype.items():
-        if array['freq'][0] > latest_starting_freq:
-            latest_starting_freq = array['freq'][0]
-        if array['freq'][-1] < earliest_ending_freq:
-            earliest_ending_freq = array['freq'][-1]
-        if array.shape[0] > max_data_points:
-            max_data_points = array.shape[0]
-            max_array = path
-
-    # Delete frequencies lower than the latest starting frequency in what will be the
-    # reference frequency array.
-    while dict_of_arrays_with_freq_dtype[max_array]['freq'][0] < latest_starting_freq:
-        dict_of_arrays_with_freq_dtype[max_array] = \
-            np.delete(dict_of_arrays_with_freq_dtype[max_array], (0), axis=0)
-
-    # Delete frequencies higher than the earliest ending frequency in the reference
-    # frequency array.
-    while dict_of_arrays_with_freq_dtype[max_array]['freq'][-1] > earliest_ending_freq:
-        dict_of_arrays_with_freq_dtype[max_array] = \
-            np.delete(dict_of_arrays_with_freq_dtype[max_array], (-1), axis=0)
-
-    len_of_new_arrays = dict_of_arrays_with_freq_dtype[max_array].shape[0]
-    reference_frequency_array = dict_of_arrays_with_freq_dtype[max_array]['freq']
 
-    new_dict_of_arrays = {}
+def get_windowed_slopes(x, y_block, window=7):
+    """
+    Get the least squares slope of y against x in a sliding window around every point,
+    for every row of y_block at once. The window is centred on each point and is cut off
+    at the ends of the data, so the first and last points use a one-sided window.
 
-    for path, array in dict_of_arrays_with_freq_dtype.items():
-        new_dict_of_arrays[path] = np.zeros(len_of_new_arrays, dtype=array.dtype)
-        new_dict_of_arrays[path]['freq'] = reference_frequency_array
-        for dtype in array.dtype.names:
-            new_dict_of_arrays[path][dtype] = np.interp(reference_frequency_array,
-                                                        array['freq'], array[dtype])
+    The sums needed for each window's fit are taken from cumulative sums, so the cost
+    does not depend on the window length.
 
-    return new_dict_of_arrays
+    :param x: 1D array of x values.
+    :param y_block: 1D or 2D array with y values along the last axis.
+    :param window: odd number of points in the window.
+    :return: array of slopes the same shape as y_block.
+    """
+    if window < 3 or window % 2 == 0:
+        raise Exception('Window must be an odd number of points of at least 3, not '
+                        '{}'.format(window))
+    x = np.asarray(x, dtype=float)
+    y_block = np.asarray(y_block, dtype=float)
+    half_window = window // 2
+
+    # scale and shift x and y to keep the differences of cumulative sums accurate.
+    x_scale = (x[-1] - x[0]) or 1.0
+    x = (x - x[0]) / x_scale
+    y_block = y_block - y_block[..., :1]
+
+    def window_sums(values):
+        cumulative = np.concatenate((np.zeros(values.shape[:-1] + (1,)),
+                                     np.cumsum(values, axis=-1)), axis=-1)
+        return cumulative[..., stop] - cumulative[..., start]
+
+    indices = np.arange(len(x))
+    start = np.clip(indices - half_window, 0, None)
+    stop = np.clip(indices + half_window + 1, None, len(x))
+    count = stop - start
+
+    sum_x = window_sums(x)
+    sum_xx = window_sums(x * x)
+    sum_y = window_sums(y_block)
+    sum_xy = window_sums(x * y_block)
+
+    slopes = (count * sum_xy - sum_x * sum_y) / (count * sum_xx - sum_x * sum_x)
+    return slopes / x_scale
+
+
+def get_group_delay_in_nano(phase_data, freq_hz, window=7, method='linear',
+                            polyorder=2):
+    """
+    Get the group delay across frequency by differentiating phase over a sliding window
+    of points, for a single channel or for every channel in a 2D block at once.
+    :param phase_data: rads, 1D array or 2D array of channel x frequency. Phase should be
+    unwrapped.
+    :param freq_hz: Hz
+    :param window: odd number of points used for the slope at each point.
+    :param method: 'linear' for the least squares slope of the window around each
+    point, or 'savgol' for Savitzky-Golay differentiation, which needs evenly spaced
+    frequencies.
+    :param polyorder: order of the polynomial fit to each window with 'savgol'.
+    :return: array of time(ns) based on differentiation of phase near datapoint.
+    """
+    phase_data = np.asarray(phase_data, dtype=float)
+    freq_hz = np.asarray(freq_hz, dtype=float)
+    if len(freq_hz) != phase_data.shape[-1]:
+        sys.exit('Problem with slope array lengths differ {} {}'.format(
+            len(freq_hz), phase_data.shape[-1]))
+
+    freq_data = freq_hz * 2 * math.pi
+
+    if method == 'linear':
+        slopes = get_windowed_slopes(freq_data, phase_data, window)
+    elif method == 'savgol':
+        freq_steps = np.diff(freq_data)
+        if not np.allclose(freq_steps, freq_steps[0]):
+            raise Exception('Savitzky-Golay group delay needs evenly spaced frequencies.')
+        from scipy.signal import savgol_filter
+        slopes = savgol_filter(phase_data, window, polyorder, deriv=1,
+                               delta=freq_steps[0], axis=-1)
+    else:
+        raise Exception('Unknown group delay method {}, use linear or '
+                        'savgol.'.format(method))
+
+    return slopes * -1e9
 
 
 def get_slope_of_phase_in_nano(phase_data, freq_hz):
     """
     This was an attempt to get time data across frequency by differentiating phase as it
     is somewhat non-linear. Did not provide good results so not in use but could be
-    revisited in the future.
+    revisited in the future. See get_group_delay_in_nano for other window lengths and
+    methods.
     :param phase_data: rads
     :param freq_hz: Hz
     :return: array of time(ns) based on differentiation of phase near datapoint.
     """
+    return get_group_delay_in_nano(phase_data, freq_hz, window=7)
 
-    # dy = np.diff(dataset['phase_rad']) * -1e9 / dx
-    # np.insert(dy, [0], delay_freq_list, axis=1)
 
-    if len(freq_hz) != len(phase_data):
-        sys.exit('Problem with slope array lengths differ {} {}'.format(len(freq_hz), len(phase_data)))
+def get_phasors(magnitude_block, phase_rad_block, weights=None):
+    """
+    Convert the magnitude (dB) and phase (rads) of many channels to complex voltages, so
+    they can be summed as phasors. Summing these and converting the sum with
+    get_phasor_sum_magnitude_phase gives the same as combine_phasors, and lets a sum be
+    updated by subtracting one channel's old phasor and adding its new one.
+    :param magnitude_block: 1-D or 2-D numpy array (channel x frequency) of magnitude in dB.
+    :param phase_rad_block: 1-D or 2-D numpy array (channel x frequency) of phase in rads.
+    :param weights: optional real or complex weight for each channel, to model
+    beamforming. If None, all channels are weighted equally with 1.
+    :return: 2-D numpy array (channel x frequency) of complex voltages.
+    """
+    magnitude_block = np.atleast_2d(np.asarray(magnitude_block, dtype=float))
+    phase_rad_block = np.atleast_2d(np.asarray(phase_rad_block, dtype=float))
 
-    freq_data = [i * 2 * math.pi for i in freq_hz]
+    # we want voltage amplitude so use /20. Phase is negative because we are using
+    # proof using cos(x-A).
+    voltages = 10 ** (magnitude_block / 20) * np.exp(-1j * phase_rad_block)
+    if weights is not None:
+        voltages = voltages * np.asarray(weights)[:, np.newaxis]
+    return voltages
 
-    # for smoother plot
-    dy = []
-    for index, entry in enumerate(phase_data):
-        if index < 3:
-            tslope, intercept, rvalue, pvalue, stderr = stats.linregress(
-                freq_data[:(index + 4)],
-                phase_data[:(index + 4)])
-        elif index >= len(phase_data) - 4:
-            tslope, intercept, rvalue, pvalue, stderr = stats.linregress(
-                freq_data[(index - 3):],
-                phase_data[(index - 3):])
-        else:
-            tslope, intercept, rvalue, pvalue, stderr = stats.linregress(
-                freq_data[(index - 3):(index + 4)],
-                phase_data[(index - 3):(index + 4)])
-        dy.append(tslope * -1e9)
 
-    dy = np.array(dy)
+def get_phasor_sum_magnitude_phase(combined_voltage):
+    """
+    :param combined_voltage: numpy array of summed complex voltages, see get_phasors.
+    :return: combined_magnitude: numpy array of the combined magnitude in dB.
+    :return: combined_phase_rad: numpy array of the combined phase in rads, unwrapped.
+    """
+    # we based it on amplitude of 1 at each antenna.
+    combined_magnitude = 20 * np.log10(np.abs(combined_voltage))
+    # this is negative so make it positive cos(x-theta)
+    combined_phase_rad = unwrap_phase(-np.angle(combined_voltage), units='rad')
+    return combined_magnitude, combined_phase_rad
 
-    return dy
+
+def combine_phasors(magnitude_block, phase_rad_block, weights=None):
+    """
+    Sum the signals of many channels as phasors. Each channel's magnitude (dB) and
+    phase (rads) is converted to a complex voltage, then all channels are summed at once.
+    :param magnitude_block: 2-D numpy array (channel x frequency) of magnitude in dB.
+    :param phase_rad_block: 2-D numpy array (channel x frequency) of phase in rads.
+    :param weights: optional real or complex weight for each channel, to model
+    beamforming. If None, all channels are weighted equally with 1.
+    :return: combined_magnitude: numpy array of the combined magnitude in dB.
+    :return: combined_phase_rad: numpy array of the combined phase in rads, unwrapped.
+    """
+    combined_voltage = np.sum(get_phasors(magnitude_block, phase_rad_block, weights),
+                              axis=0)
+    return get_phasor_sum_magnitude_phase(combined_voltage)
 
 
-def combine_arrays(list_of_dataframes):
+def combine_arrays(list_of_dataframes, weights=None):
     """
     Combine arrays with the same 'freq' dtype array by adding all arrays in the dictionary
     elementwise into one numpy array. Input dictionary value arrays need a phase_rad dtype
     and a magnitude dtype at this time.
 
     :param list_of_dataframes: list of dataframes, all having columns 'phase_rad' and
-    'magnitude'. These columns must all reference the same frequency array.
+    'magnitude'. These columns must all reference the same frequency array. A dictionary
+    of dataframes or of structured numpy arrays can also be given.
+    :param weights: optional real or complex weight for each dataframe in the same order,
+    to model beamforming. See combine_phasors.
     :return: combined_array, with unwrapped phase values. This is the result of summing
     together all the numpy arrays in the array_dict. This will have a length equal to
     to the length of the arrays in the array_dict and will have three dtypes: 'freq',
     'magnitude', 'phase_rad', and 'phase_deg'.
     """
+    if isinstance(list_of_dataframes, dict):
+        list_of_dataframes = list(list_of_dataframes.values())
+
+    magnitude_block = np.vstack([np.asarray(dataset['magnitude'], dtype=float) for dataset
+                                 in list_of_dataframes])
+    phase_rad_block = np.vstack([np.asarray(dataset['phase_rad'], dtype=float) for dataset
+                                 in list_of_dataframes])
+    combined_magnitude, combined_phase_rad = combine_phasors(magnitude_block,
+                                                             phase_rad_block, weights)
+
+    if isinstance(list_of_dataframes[0], pd.DataFrame):
+        combined_data = list_of_dataframes[0].copy(deep=True)
+    else:
+        combined_data = np.zeros(len(combined_magnitude), dtype=[
+            ('freq', 'i4'), ('magnitude', 'f4'), ('phase_deg', 'f4'), ('phase_rad', 'f4')])
+        combined_data['freq'] = list_of_dataframes[0]['freq']
+    combined_data['magnitude'] = combined_magnitude
+    combined_data['phase_rad'] = combined_phase_rad
+    combined_data['phase_deg'] = combined_phase_rad * 180.0 / math.pi
 
-    combined_data = list_of_dataframes[0].copy(deep=True)
-
-    for num, channel_dataframe in enumerate(list_of_dataframes):
-        # print k
-        if num == 0:
-            continue  # skip, do not add
-        for rowc, rowa in zip(combined_data.iterrows(), channel_dataframe.iterrows()):
-            c = rowc[1]
-            a = rowa[1]
-            # convert to rads - negative because we are using proof using cos(x-A)
-            phase_rads1 = -c['phase_rad'] % (2.0 * math.pi)
-            phase_rads2 = -a['phase_rad'] % (2.0 * math.pi)
-
-            # we want voltage amplitude so use /20
-            amplitude_1 = 10 ** (c['magnitude'] / 20)
-            amplitude_2 = 10 ** (a['magnitude'] / 20)
-
-            combined_amp_squared = (
-                amplitude_1 ** 2 + amplitude_2 ** 2 + 2 * amplitude_1 * amplitude_2 * math.cos(
-                    phase_rads1 - phase_rads2))
-            combined_amp = math.sqrt(combined_amp_squared)
-            # we based it on amplitude of 1 at each antenna.
-            c['magnitude'] = 20 * math.log(combined_amp, 10)
-            combined_phase = math.atan2(
-                amplitude_1 * math.sin(phase_rads1) + amplitude_2 * math.sin(phase_rads2),
-                amplitude_1 * math.cos(phase_rads1) + amplitude_2 * math.cos(phase_rads2))
-
-            # this is negative so make it positive cos(x-theta)
-            c['phase_rad'] = -combined_phase
-            c['phase_deg'] = -combined_phase * 360.0 / (2.0 * math.pi)
-
-    combined_data = unwrap_phase(combined_data)
     return combined_data
 
 
+def get_tdiff(freq, main_phase_deg, intf_phase_deg, wrap=True):
+    """
+    Get the phase difference between the main and interferometer arrays and the time
+    difference (tdiff) it represents at each frequency, in one operation.
+
+    The tdiff in ns is the time difference between the signal through the main array
+    path and the signal through the interferometer array path, found from the phase
+    difference at each frequency as phase * 1e9 / (freq * 360).
+
+    :param freq: array of frequencies in Hz.
+    :param main_phase_deg: array of main array phase in degrees, unwrapped. This can
+    also be a 2D array with frequency along the last axis, eg. to get the tdiff of
+    many sets of data at once.
+    :param intf_phase_deg: array of interferometer array phase in degrees, unwrapped,
+    the same shape as main_phase_deg.
+    :param wrap: if True, wrap the phase difference within -180 to 180 degrees before
+    finding the time difference.
+    :return: phase_diff_deg: array of main minus interferometer phase in degrees.
+    :return: time_ns: array of time difference in ns.
+    """
+    phase_diff_deg = np.asarray(main_phase_deg, dtype=float) - np.asarray(
+        intf_phase_deg, dtype=float)
+    if wrap:
+        phase_diff_deg = wrap_degrees_block(phase_diff_deg)
+    time_ns = phase_diff_deg * 1e9 / (np.asarray(freq, dtype=float) * 360.0)
+    return phase_diff_deg, time_ns
+
+
+def get_array_difference(main_array, intf_array, wrap=True):
+    """
+    Get the phase and time difference between the combined main and interferometer
+    arrays, see get_tdiff.
+    :param main_array: numpy array or dataframe with 'freq' and 'phase_deg', eg. from
+    combine_arrays.
+    :param intf_array: numpy array or dataframe with 'phase_deg' at the same
+    frequencies as main_array.
+    :param wrap: if True, wrap the phase difference within -180 to 180 degrees.
+    :return: array_diff: numpy array with 'freq', 'phase_deg' and 'time_ns' dtypes.
+    """
+    phase_diff_deg, time_ns = get_tdiff(main_array['freq'], main_array['phase_deg'],
+                                        intf_array['phase_deg'], wrap)
+    array_diff = np.zeros(len(phase_diff_deg), dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
+                                                      ('time_ns', 'f4')])
+    array_diff['freq'] = main_array['freq']
+    array_diff['phase_deg'] = phase_diff_deg
+    array_diff['time_ns'] = time_ns
+    return array_diff
+
+
+def get_single_receive_direction_magnitude(vswr, cable_loss):
+    """
+    Get the single direction receive magnitude from a VSWR measurement through a cable,
+    for a whole sweep at once.
+
+    The measured return loss includes the cable loss in both directions. Using the
+    power incident at the balun (after one direction of cable loss) as the base, the
+    power reflected and transmitted at the balun is found. Assuming a symmetrical
+    mismatch at the balun (S12 = S21), the received power from the antenna is the
+    transmission at the balun less the cable loss.
+
+    :param vswr: numpy array of VSWR.
+    :param cable_loss: numpy array of cable loss in dB at the same frequencies.
+    :return: receive_power: numpy array of single direction receive magnitude in dB,
+    NaN where it cannot be calculated.
+    :return: return_loss_dB: numpy array of return loss in dB.
+    :return: can_convert: boolean numpy array, False where there is no power transmitted
+    at the balun so receive_power cannot be calculated.
+    """
+    return_loss_dB = 20 * np.log10((vswr + 1) / (vswr - 1))
+
+    watts_incident_at_balun = 10 ** (-1 * cable_loss / 10)
+    # get single-direction data by making the power base equal to the watts
+    # incident at the balun.
+    dB_reflected_at_balun = -1 * return_loss_dB + cable_loss
+    watts_reflected_at_balun = 10 ** (dB_reflected_at_balun / 10)
+    watts_transmitted_at_balun = watts_incident_at_balun - watts_reflected_at_balun
+    can_convert = watts_transmitted_at_balun > 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        transmission_db_at_balun = 10 * np.log10(np.where(
+            can_convert, watts_transmitted_at_balun, np.nan) / watts_incident_at_balun)
+
+    # Incoming power from antenna will have mismatch point and then cable losses.
+    receive_power = np.round(transmission_db_at_balun - cable_loss, 5)
+    return receive_power, return_loss_dB, can_convert
+
+
+def get_single_receive_direction_magnitudes(channel_names, freq, vswr_block,
+                                            cable_loss_block):
+    """
+    Get the single direction receive magnitude of many channels at once. A channel
+    where the receive magnitude cannot be calculated at every frequency is given as a
+    return loss in dB instead, see get_single_receive_direction_magnitude.
+    :param channel_names: list of channel names, one per row of vswr_block.
+    :param freq: the frequencies of the columns of vswr_block.
+    :param vswr_block: 2D array of VSWR, channel x frequency.
+    :param cable_loss_block: 2D array of cable loss in dB of each channel's feedline,
+    channel x frequency.
+    :return: 2D array of magnitude in dB, channel x frequency.
+    """
+    receive_power, return_loss_dB, can_convert = get_single_receive_direction_magnitude(
+        vswr_block, cable_loss_block)
+
+    channels_converted = np.all(can_convert, axis=1)
+    for row in np.flatnonzero(~channels_converted):
+        failed_freqs = np.asarray(freq)[~can_convert[row]]
+        print("Channel {} VSWR is not being converted to a single direction.".format(
+            channel_names[row]))
+        print("    There is no power incident at the balun at {} of {} frequencies, which "
+              "would suggest your cable loss model is too lossy.".format(
+                len(failed_freqs), vswr_block.shape[1]))
+        print("    Failed frequencies (Hz): {}".format(failed_freqs.tolist()))
+        print("    Going to convert the VSWR to a return loss in dB only.")
+
+    return np.where(channels_converted[:, np.newaxis], receive_power, return_loss_dB)
+
+
 def vswr_to_single_receive_direction(channel_name, data, cable_loss_array):
     """
     Take in a numpy array with vswr dtype and return a numpy array with both vswr and
@@ -371,60 +787,20 @@ def vswr_to_single_receive_direction(channel_name, data, cable_loss_array):
     if not np.array_equal(data['freq'], cable_loss_array['freq']):
         sys.exit('Frequencies do not match in datasets - exiting')
 
-    #dtypes = [(x, str(y[0])) for x, y in sorted(data.dtype.fields.items(), key=lambda
-    #    k: k[1])] # get list of dtypes sorted by column
-
-    cannot_convert = False
-    for num, entry in data.iterrows():
-        try:
-            VSWR = entry['vswr']
-            cable_loss = cable_loss_array['loss'][num]
-        except:
-            raise Exception('No vswr column in this dataframe.')
-
-        return_loss_dB = 20 * math.log(((VSWR + 1) / (VSWR - 1)), 10)
-
-        watts_incident_at_balun = 10 ** (-1 * cable_loss / 10)
-        # get single-direction data by making the power base equal to the watts
-        # incident at the balun.
-
-        dB_reflected_at_balun = -1 * return_loss_dB + cable_loss
-
-        watts_reflected_at_balun = 10 ** (dB_reflected_at_balun / 10)
-
-        watts_transmitted_at_balun = watts_incident_at_balun - watts_reflected_at_balun
-        if watts_transmitted_at_balun <= 0:
-            cannot_convert = True
-            break
-
-        reflection_db_at_balun = 10 * math.log((watts_reflected_at_balun /
-                                                watts_incident_at_balun), 10)
-        transmission_db_at_balun = 10 * math.log(watts_transmitted_at_balun /
-                                                 watts_incident_at_balun, 10)
-
-        # ASSUMING we have a symmetrical mismatch point at the balun and transmission
-        # S12 = S21, so transmission_db_at_balun out = the received dB at balun on
-        # receive path.
-        # Incoming power from antenna will have mismatch point and then cable losses.
-        receive_power = transmission_db_at_balun - cable_loss
-        receive_power = round(receive_power, 5)
-        data.loc[num,'magnitude'] = receive_power
-
-    if cannot_convert:
-        print("Channel {} VSWR is not being converted to a single direction.".format(channel_name))
-        print("    There is no power incident at the balun at some frequencies, which would "
-              "suggest your cable loss model is too lossy.")
-        print("    Going to convert the VSWR to a return loss in dB only.")
-        for num, entry in data.iterrows():
-            try:
-                VSWR = entry['vswr']
-                cable_loss = cable_loss_array['loss'][num]
-            except:
-                raise Exception('No vswr column in this dataframe.')
+    try:
+        vswr = np.asarray(data['vswr'], dtype=float)
+    except (KeyError, ValueError):
+        raise Exception('No vswr column in this dataframe.')
 
-            return_loss_dB = 20 * math.log(((VSWR + 1) / (VSWR - 1)), 10)
+    magnitude = get_single_receive_direction_magnitudes(
+        [channel_name], data['freq'], vswr[np.newaxis],
+        np.asarray(cable_loss_array['loss'], dtype=float)[np.newaxis])[0]
 
-            data.loc[num, 'magnitude'] = return_loss_dB
+    if isinstance(data, pd.DataFrame) or 'magnitude' in get_column_names(data):
+        data = data.copy()
+        data['magnitude'] = magnitude
+    else:  # structured numpy array without a magnitude dtype.
+        data = rfn.append_fields(data, 'magnitude', magnitude, dtypes='f4', usemask=False)
 
     # We now have single direction magnitude, but also need single direction phase.
     # Wrapping then unwrapping ensures there is no 360 degree offset from one dataset
@@ -454,12 +830,8 @@ def reflection_to_transmission_phase(incoming_data):
     data = unwrap_phase(incoming_data)  # needs to be a phase-unwrapped dataset.
 
     new_data = data
-    if 'phase' in data.columns:
-        new_data['phase'] = np.true_divide(new_data['phase'], 2.0)
-    if 'phase_deg' in data.columns:
-        new_data['phase_deg'] = np.true_divide(new_data['phase_deg'], 2.0)
-    if 'phase_rad' in data.columns:
-        new_data['phase_rad'] = np.true_divide(new_data['phase_rad'], 2.0)
+    for column in get_phase_columns(data):
+        new_data[column] = np.true_divide(new_data[column], 2.0)
     return new_data
 
 
@@ -482,6 +854,100 @@ def get_min_dataset_length(data_dict):
     return min_dataset_length
 
 
+def get_linear_fits(freq, phase_block):
+    """
+    Get the line of best fit of phase over frequency for many channels at once, with a
+    single least-squares solve over a channel x frequency block. All channels must share
+    the same frequency array. The results match scipy.stats.linregress for each channel.
+    :param freq: numpy array of frequencies in Hz.
+    :param phase_block: 1-D or 2-D numpy array (channel x frequency) of phase.
+    :return: linear_fits: a dictionary of numpy arrays with one value per channel for
+    the keys 'slope', 'intercept', 'rvalue', 'pvalue', 'stderr' and 'time_delay_ns' (the
+    time delay value for the slope, if phase is in rads), and channel x frequency arrays
+    for 'best_fit_line' and 'offset_of_best_fit' (the difference between data and line
+    of best fit).
+    """
+    freq = np.asarray(freq, dtype=float)
+    phase_block = np.atleast_2d(np.asarray(phase_block, dtype=float))
+    num_points = len(freq)
+
+    # Centre the frequencies so the solve is well conditioned.
+    freq_mean = np.mean(freq)
+    design_matrix = np.column_stack([freq - freq_mean, np.ones(num_points)])
+    (slope, centred_intercept), _, _, _ = np.linalg.lstsq(design_matrix, phase_block.T,
+                                                          rcond=None)
+    intercept = centred_intercept - slope * freq_mean
+
+    best_fit_line = slope[:, np.newaxis] * freq + intercept[:, np.newaxis]
+    offset_of_best_fit = phase_block - best_fit_line
+
+    from scipy import stats
+    freq_var = np.sum((freq - freq_mean) ** 2)
+    phase_var = np.sum((phase_block - np.mean(phase_block, axis=1, keepdims=True)) ** 2,
+                       axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rvalue = np.clip(slope * np.sqrt(freq_var / phase_var), -1.0, 1.0)
+        dof = num_points - 2
+        tstat = rvalue * np.sqrt(dof / ((1.0 - rvalue) * (1.0 + rvalue)))
+        pvalue = 2 * stats.t.sf(np.abs(tstat), dof)
+        stderr = np.sqrt((1 - rvalue ** 2) * phase_var / freq_var / dof)
+
+    linear_fits = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
+                   'pvalue': pvalue, 'stderr': stderr,
+                   'time_delay_ns': np.round(slope / (2 * math.pi), 11) * -1e9,
+                   'best_fit_line': best_fit_line,
+                   'offset_of_best_fit': offset_of_best_fit}
+    return linear_fits
+
+
+def split_linear_fits(channel_names, linear_fits):
+    """
+    Split the results of get_linear_fits into a dictionary for each channel.
+    :param channel_names: list of the channel names, in the order of the channels in
+    the phase_block given to get_linear_fits.
+    :param linear_fits: dictionary of arrays from get_linear_fits.
+    :return: dictionary of channel name to a dictionary with the same keys as
+    linear_fits, holding that channel's values.
+    """
+    return {channel: {key: value[num] for key, value in linear_fits.items()} for
+            num, channel in enumerate(channel_names)}
+
+
+def create_linear_fit_dictionaries(dict_of_arrays):
+    """
+    Get the line of best fit and offset from it for every dataset in a dictionary at
+    once. This returns the same as calling create_linear_fit_dictionary on each dataset.
+    :param dict_of_arrays: dictionary of numpy arrays or dataframes with 'freq' and
+    'phase_rad' dtypes, all having the same frequencies.
+    :return: dictionary of dataset name to linear fit dictionary, see
+    create_linear_fit_dictionary.
+    """
+    channel_names = list(dict_of_arrays.keys())
+    freq = dict_of_arrays[channel_names[0]]['freq']
+    phase_block = unwrap_phase(np.vstack([np.asarray(dict_of_arrays[channel]['phase_rad'],
+                                                     dtype=float) for channel in
+                                          channel_names]), units='rad')
+
+    # In this fit, slope represents the change in phase over frequency. This can be
+    # used to calculate the speed of the wave through the medium or the time for the
+    # wave to move through the medium. The intercept is theoretical here and used to
+    # get the line so that we can determine how good the assumption is that this path is
+    # linear.
+    linear_fits = get_linear_fits(freq, phase_block)
+
+    # Wrap the best fit lines and offsets.
+    best_fit_lines = wrap_phase(linear_fits.pop('best_fit_line'), units='rad')
+    offsets_of_best_fit = wrap_phase(linear_fits.pop('offset_of_best_fit'), units='rad')
+
+    linear_fit_dictionaries = split_linear_fits(channel_names, linear_fits)
+    for num, channel in enumerate(channel_names):
+        linear_fit_dictionaries[channel]['offset_of_best_fit_rads'] = pd.Series(
+            offsets_of_best_fit[num], name='phase_rad')
+        linear_fit_dictionaries[channel]['best_fit_line_rads'] = pd.DataFrame(
+            best_fit_lines[num], columns=['phase_rad'])
+    return linear_fit_dictionaries
+
+
 def create_linear_fit_dictionary(array):
     """
     Get the line of best fit for a given numpy array with phase data over a frequency
@@ -495,36 +961,4 @@ def create_linear_fit_dictionary(array):
     delay value for the given slope of the line of best fit), and 'best_fit_line_rads'
     (the numpy array of the line of best fit data).
     """
-    data_array = unwrap_phase(array)
-
-    # In this fit, slope represents the change in phase over frequency. This can be
-    # used to calculate the speed of the wave through the medium or the time for the
-    # wave to move through the medium. The intercept is theoretical here and used to
-    # get the line so that we can determine how good the assumption is that this path is
-    # linear.
-
-    slope, intercept, rvalue, pvalue, stderr = stats.linregress(data_array['freq'],
-                                                                data_array['phase_rad'])
-    offset_of_best_fit = []
-    best_fit_line = []
-    for index, entry in data_array.iterrows():
-        # This is the value of the line at this point.
-        best_fit_value = slope * entry['freq'] + intercept
-        best_fit_line.append(best_fit_value)
-        # This is the offset of the actual data from that line.
-        offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-
-    # Convert both lists to numpy arrays and wrap the phase data.
-    best_fit_line = pd.DataFrame(np.array(best_fit_line), columns=['phase_rad'])
-    best_fit_line = wrap_phase(best_fit_line)
-    offset_of_best_fit = pd.DataFrame(np.array(offset_of_best_fit), columns=['phase_rad'])
-    offset_of_best_fit = wrap_phase(offset_of_best_fit)
-
-    data_array_linear_fit_dict = {'slope': slope, 'intercept': intercept, 'rvalue':
-                                  rvalue, 'pvalue': pvalue, 'stderr': stderr,
-                                  'offset_of_best_fit_rads':
-                                  offset_of_best_fit['phase_rad'], 'time_delay_ns':
-                                  round(slope / (2 * math.pi), 11) * -1e9,
-                                  'best_fit_line_rads': best_fit_line}
-
-    return data_array_linear_fit_dict
+    return create_linear_fit_dictionaries({'data': array})['data']
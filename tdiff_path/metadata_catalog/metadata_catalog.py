@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+
+# metadata_catalog.py
+# A catalog of the site visit datasets listed in a metadata csv like
+# presentation/site_file_metadata.csv:
+#     site,date,data_type,mapping_filename,data_location,interim_data
+# The catalog keeps hash indexes on site, date, data_type and mapping filename and a
+# sorted date index, so datasets can be picked by query instead of by row number, eg.
+#     catalog.query(site='RKN', data_type='feedline-VSWR', after=2017)
+# Queries return DatasetHandles, which only read the file mapping and channel data when
+# they are used.
+
+import os
+import json
+import bisect
+import pandas as pd
+
+import site_analysis.site_analysis as site_analysis
+
+indexed_fields = ['site', 'date', 'data_type', 'mapping_filename']
+
+
+def get_date_bound(date, end_of_year):
+    """
+    :param date: a date as YYYYMMDD, or a year as YYYY.
+    :param end_of_year: if date is a year, use its last day instead of its first.
+    :return: the date as an int YYYYMMDD.
+    """
+    date = int(date)
+    if date < 10000:  # a year.
+        return date * 10000 + (1231 if end_of_year else 101)
+    return date
+
+
+def resolve_path(path, base_directory):
+    """
+    :param path: a path, absolute or relative to base_directory.
+    :param base_directory: directory that relative paths are relative to.
+    :return: the path to use.
+    """
+    if os.path.isabs(path):
+        return path
+    return os.path.join(base_directory, path)
+
+
+class DatasetHandle(object):
+    """
+    One dataset in a MetadataCatalog: the metadata of one site visit for one data type.
+    The file mapping, channel data and analysis are loaded on first use and kept.
+    """
+
+    def __init__(self, catalog, position, metadata):
+        """
+        :param catalog: the MetadataCatalog this dataset is in.
+        :param position: the row of this dataset in the metadata csv.
+        :param metadata: dictionary of the row of the metadata csv.
+        """
+        self.catalog = catalog
+        self.position = position
+        self.metadata = metadata
+        self._mapping = None
+        self._channel_data = {}
+        self._results = None
+
+    def __repr__(self):
+        return 'DatasetHandle({}: {} {} {})'.format(self.position, self.site, self.date,
+                                                    self.data_type)
+
+    @property
+    def site(self):
+        return self.metadata['site']
+
+    @property
+    def date(self):
+        return self.metadata['date']
+
+    @property
+    def data_type(self):
+        return self.metadata['data_type']
+
+    @property
+    def mapping_filename(self):
+        return self.metadata['mapping_filename']
+
+    @property
+    def data_location(self):
+        return self.metadata['data_location']
+
+    @property
+    def interim_data(self):
+        return self.metadata['interim_data']
+
+    @property
+    def plot_title(self):
+        return '{} {} {}'.format(self.site, self.date, self.data_type)
+
+    @property
+    def mapping(self):
+        """
+        :return: the file mapping dictionary of channel name to csv filename, read from
+        the mapping json file on first use.
+        """
+        if self._mapping is None:
+            with open(self.catalog.resolve_path(self.mapping_filename), 'r') as f:
+                self._mapping = json.load(f)
+        return self._mapping
+
+    @property
+    def channel_files(self):
+        """
+        :return: dictionary of channel name to csv path for the channels with data, as
+        found by site_analysis.parse_mapping.
+        """
+        channel_files = site_analysis.parse_mapping(self.mapping, verbose=False)[0]
+        return {channel: self.data_location + channel_file for channel, channel_file in
+                channel_files.items()}
+
+    @property
+    def channels(self):
+        return list(self.channel_files.keys())
+
+    def read_channel(self, channel):
+        """
+        Read the data of one channel, without reading any other channel.
+        :param channel: a channel name, eg. 'M0'.
+        :return: dataframe of the columns for the data type, renamed as in
+        site_analysis.data_type_columns.
+        """
+        if channel not in self._channel_data:
+            try:
+                channel_file = self.channel_files[channel]
+            except KeyError:
+                raise Exception('There is no data for channel {} in {}.'.format(
+                    channel, self.mapping_filename))
+            self._channel_data[channel] = site_analysis.read_channel_file(channel_file,
+                                                                          self.data_type)
+        return self._channel_data[channel]
+
+    def analyse(self, verbose=True):
+        """
+        Run site_analysis.analyse_site on this dataset, the first time only.
+        :param verbose: print information and the time taken by each stage.
+        :return: dictionary of results from analyse_site.
+        """
+        if self._results is None:
+            feedline_metadata = self.catalog.feedline_metadata if \
+                self.data_type == 'feedline-VSWR' else None
+            self._results = site_analysis.analyse_site(
+                self.mapping, self.data_location, self.data_type, self.site,
+                feedline_metadata, verbose=verbose)
+        return self._results
+
+    def unload(self):
+        """
+        Forget the loaded channel data and analysis, to free memory.
+        """
+        self._channel_data = {}
+        self._results = None
+
+
+class MetadataCatalog(object):
+    """
+    Indexed catalog of site visit datasets, see the top of this file.
+    """
+
+    def __init__(self, metadata, base_directory='', feedline_metadata_file=None):
+        """
+        :param metadata: dataframe with columns site, date, data_type, mapping_filename,
+        data_location and optionally interim_data.
+        :param base_directory: directory that relative mapping filenames are relative to.
+        :param feedline_metadata_file: path to site_feedline_metadata.csv, needed to
+        analyse feedline-VSWR data. Read on first use.
+        """
+        self.base_directory = base_directory
+        self.feedline_metadata_file = feedline_metadata_file
+        self._feedline_metadata = None
+        self.datasets = []
+        self.indexes = {field: {} for field in indexed_fields}
+        for position, row in enumerate(metadata.to_dict('records')):
+            dataset_metadata = {
+                'site': str(row['site']), 'date': int(row['date']),
+                'data_type': str(row['data_type']),
+                'mapping_filename': str(row['mapping_filename']),
+                'data_location': str(row['data_location']),
+                'interim_data': bool(row.get('interim_data', False))}
+            self.datasets.append(DatasetHandle(self, position, dataset_metadata))
+            for field in indexed_fields:
+                self.indexes[field].setdefault(dataset_metadata[field], []).append(position)
+        # (date, position) pairs in date order, for date range queries.
+        self._date_order = sorted((dataset.date, dataset.position) for dataset in
+                                  self.datasets)
+
+    @classmethod
+    def from_csv(cls, metadata_file, feedline_metadata_file=None):
+        """
+        Make a catalog from a metadata csv. Relative mapping filenames are relative to
+        the csv's directory.
+        :param metadata_file: path to the metadata csv, eg. site_file_metadata.csv.
+        :param feedline_metadata_file: path to the feedline metadata csv, by default
+        site_feedline_metadata.csv beside the metadata csv if it exists.
+        :return: a MetadataCatalog.
+        """
+        base_directory = os.path.dirname(os.path.abspath(metadata_file))
+        if feedline_metadata_file is None:
+            feedline_metadata_file = os.path.join(base_directory,
+                                                  'site_feedline_metadata.csv')
+            if not os.path.exists(feedline_metadata_file):
+                feedline_metadata_file = None
+        return cls(pd.read_csv(metadata_file), base_directory, feedline_metadata_file)
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def __getitem__(self, position):
+        """
+        :param position: row of the dataset in the metadata csv.
+        :return: the DatasetHandle.
+        """
+        return self.datasets[position]
+
+    def __iter__(self):
+        return iter(self.datasets)
+
+    @property
+    def feedline_metadata(self):
+        """
+        :return: dataframe of the feedline metadata, or None if there is no file.
+        """
+        if self._feedline_metadata is None and self.feedline_metadata_file is not None:
+            self._feedline_metadata = pd.read_csv(self.feedline_metadata_file)
+        return self._feedline_metadata
+
+    def resolve_path(self, path):
+        """
+        :param path: a path, absolute or relative to the catalog's base directory.
+        :return: the path to use.
+        """
+        return resolve_path(path, self.base_directory)
+
+    def values(self, field):
+        """
+        :param field: one of site, date, data_type or mapping_filename.
+        :return: sorted list of the distinct values of the field.
+        """
+        return sorted(self.indexes[field].keys())
+
+    def query(self, site=None, date=None, data_type=None, mapping_filename=None,
+              after=None, before=None, interim_data=None):
+        """
+        Find datasets. Each of site, date, data_type and mapping_filename can be a value
+        or a list of values, and None matches anything.
+        :param after: only datasets after this date (YYYYMMDD), or after the end of this
+        year (YYYY).
+        :param before: only datasets before this date (YYYYMMDD), or before the start of
+        this year (YYYY).
+        :param interim_data: if given, only datasets with this interim_data flag.
+        :return: list of DatasetHandles, in the order of the metadata csv.
+        """
+        query = {'site': site, 'date': date, 'data_type': data_type,
+                 'mapping_filename': mapping_filename}
+        candidate_sets = []
+        for field, values in query.items():
+            if values is None:
+                continue
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            if field == 'date':
+                values = [int(value) for value in values]
+            positions = set()
+            for value in values:
+                positions.update(self.indexes[field].get(value, []))
+            candidate_sets.append(positions)
+
+        if after is not None or before is not None:
+            start = 0 if after is None else bisect.bisect_right(
+                self._date_order, (get_date_bound(after, True), len(self.datasets)))
+            end = len(self._date_order) if before is None else bisect.bisect_left(
+                self._date_order, (get_date_bound(before, False), -1))
+            candidate_sets.append(set(position for _, position in
+                                      self._date_order[start:end]))
+
+        if candidate_sets:
+            candidate_sets.sort(key=len)  # intersect starting with the smallest.
+            positions = candidate_sets[0].intersection(*candidate_sets[1:])
+        else:
+            positions = range(len(self.datasets))
+
+        datasets = [self.datasets[position] for position in sorted(positions)]
+        if interim_data is not None:
+            datasets = [dataset for dataset in datasets if dataset.interim_data ==
+                        interim_data]
+        return datasets
+
+    def get(self, **query):
+        """
+        Find exactly one dataset, see query.
+        :return: the DatasetHandle.
+        """
+        datasets = self.query(**query)
+        if len(datasets) != 1:
+            raise Exception('{} datasets match {}, expected 1.'.format(len(datasets),
+                                                                       query))
+        return datasets[0]
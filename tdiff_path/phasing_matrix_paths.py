@@ -4,18 +4,18 @@
 # To find the phase paths through the phasing matrix.
 
 import sys
-import time
-import fnmatch
-import random
 import math
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import json
-import csv
 
 from dataset_operations.dataset_operations import reduce_frequency_array, \
-    combine_arrays, unwrap_phase
+    combine_arrays, unwrap_phase, get_linear_fits, split_linear_fits, get_array_difference
+from retrieve_data.retrieve_data import read_sweeps_concurrently
+from rendering.rendering import get_pyplot, plot_channel_lines
+
+# Pass --no-plot to only compute and write the time files.
+no_plot = '--no-plot' in sys.argv
+if no_plot:
+    sys.argv.remove('--no-plot')
 
 # General variables to change depending on data being used
 radar_name = sys.argv[1]
@@ -42,6 +42,9 @@ hex_colors = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900',
               '#7a7a52', '#004d00', '#33ff33', '#26734d', '#003366', '#33cccc', '#00004d',
               '#5500ff', '#a366ff', '#ff00ff', '#e6005c', '#ffaa80', '#999999']
 hex_dictionary = {'other': '#000000'}
+
+# The columns to read from the first sweep of each csv file.
+header_names = {'freq': '*Freq*', 'magnitude': '*Magnit*', 'phase_deg': '*Phase*'}
 array_colors = {'main': '#ff1a1a', 'intf': '#993300', 'main_test': '#33cccc', 'intf_test': '#e6005c'}
 
 
@@ -56,6 +59,7 @@ def main():
     estimate_data = []
     main_data = {}
     intf_data = {}
+    channel_files = {}
     for k, v in path_files.items():
         if k == '_comment':
             data_description = v
@@ -70,76 +74,32 @@ def main():
         if v == 'estimate_intf':
             estimate_data.append(k)  # TODO estimate with a given slope
             continue
-        with open(data_location + v, 'r') as csvfile:
-            for line in csvfile:
-                if fnmatch.fnmatch(line, 'Freq. [Hz*'):  # skip to header
-                    break
-            else:  # no break
-                sys.exit('No Data in file {}'.format(v))
-            row = line.split(',')
-            try:
-                freq_header = '*Freq*'
-                freq_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], freq_header)]
-                magnitude_header = '*Magnit*'
-                magnitude_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], magnitude_header)]
-                freq_column = freq_columns[0]
-                magnitude_column = magnitude_columns[0]
-                phase_header = '*Phase*'
-                phase_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], phase_header)]
-                phase_column = phase_columns[0]
-            except:
-                sys.exit('Cannot find data {}.'.format(v))
-            i = 0
-            while (abs(magnitude_column - freq_column) > 2) or (abs(phase_column - freq_column) > 2):
-                i += 1
-                try:
-                    freq_column = freq_columns[i]
-                    if magnitude_column > phase_column:
-                        phase_column = phase_columns[i]
-                    if phase_column > magnitude_column:
-                        magnitude_column = magnitude_columns[i]
-                except:
-                    sys.exit('Data Phase and Magnitude are given from different sweeps.')
-            next(csvfile)  # skip over header
-            csv_reader = csv.reader(csvfile)
-
-            data = []
-            for row in csv_reader:
-                try:
-                    freq = float(row[freq_column])
-                    mag = float(row[magnitude_column])
-                    phase = float(row[phase_column])
-                except:
-                    continue
-                phase_rad = float(phase) * math.pi / 180.0
-                data.append((freq, mag, float(phase), phase_rad))
-            data = np.array(data, dtype=[('freq', 'i4'), ('magnitude', 'f4'),
-                                         ('phase_deg', 'f4'), ('phase_rad', 'f4')])
-
-            data = unwrap_phase(data)
-
-            if k[0] == 'M':  # in main files.
-                if k == 'M_combined':
-                    combined_array_test['main_combined'] = data
-                else:
-                    main_data[k] = data
-                    hex_dictionary[k] = hex_colors[0]
-                    hex_colors.remove(hex_dictionary[k])
-            elif k[0] == 'I':  # in intf files
-                if k == 'I_combined':
-                    combined_array_test['intf_combined'] = data
-                else:
-                    intf_data[k] = data
-                    hex_dictionary[k] = hex_colors[0]
-                    hex_colors.remove(hex_dictionary[k])
-            elif k == 'atten_file':
-                attenuator_flag = True
-                atten_data = {'atten' : data}
+        # All keys should start with M or I to indicate which array they are from.
+        if k[0] != 'M' and k[0] != 'I' and k != 'atten_file':
+            sys.exit('There is an invalid key {}'.format(k))
+        channel_files[k] = v
+
+    for k, data in read_sweeps_concurrently(channel_files, data_location,
+                                            header_names).items():
+        data = unwrap_phase(data)
+
+        if k[0] == 'M':  # in main files.
+            if k == 'M_combined':
+                combined_array_test['main_combined'] = data
             else:
-                sys.exit('There is an invalid key {}'.format(k))
+                main_data[k] = data
+                hex_dictionary[k] = hex_colors[0]
+                hex_colors.remove(hex_dictionary[k])
+        elif k[0] == 'I':  # in intf files
+            if k == 'I_combined':
+                combined_array_test['intf_combined'] = data
+            else:
+                intf_data[k] = data
+                hex_dictionary[k] = hex_colors[0]
+                hex_colors.remove(hex_dictionary[k])
+        else:  # atten_file
+            attenuator_flag = True
+            atten_data = {'atten' : data}
 
     main_data = reduce_frequency_array(main_data)
     if combined_array_test:
@@ -168,78 +128,61 @@ def main():
     if main_data:
         combined_main_array = combine_arrays(main_data)
 
-        linear_fit_dict = {}
-        # combined main array slope
-        main_slope, main_intercept, rvalue, pvalue, stderr = stats.linregress(combined_main_array['freq'],
-                                                                    combined_main_array['phase_rad'])
-        offset_of_best_fit = []
-        for entry in combined_main_array:
-            best_fit_value = main_slope * entry['freq'] + main_intercept
-            offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-        linear_fit_dict['M_all'] = {'slope': main_slope, 'intercept': main_intercept, 'rvalue': rvalue,
-                                    'pvalue': pvalue, 'stderr': stderr,
-                                    'offset_of_best_fit': np.array(offset_of_best_fit),
-                                    'time_delay_ns': round(main_slope / (2 * math.pi), 11) * -10 ** 9}
-
         intf_data = reduce_frequency_array(intf_data)
 
         all_data = main_data.copy()
         all_data.update(intf_data)
 
-        # for each antenna, get the linear fit and plot the offset from linear fit.
-
-        for ant, dataset in all_data.items():
-            slope, intercept, rvalue, pvalue, stderr = stats.linregress(dataset['freq'],
-                                                                        dataset['phase_rad'])
-            linear_fit_dict[ant] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                    'pvalue': pvalue, 'stderr': stderr}
-            offset_of_best_fit = []
-            for entry in dataset:
-                best_fit_value = slope * entry['freq'] + intercept
-                offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-            linear_fit_dict[ant]['offset_of_best_fit'] = np.array(offset_of_best_fit)
-            linear_fit_dict[ant]['time_delay_ns'] = round(slope / (2 * math.pi), 11) * -10 ** 9
-
         combined_intf_array = combine_arrays(intf_data)
 
-        # combined intf array slope
-        slope, intercept, rvalue, pvalue, stderr = stats.linregress(combined_intf_array['freq'],
-                                                                    combined_intf_array['phase_rad'])
-        offset_of_best_fit = []
-        for entry in combined_intf_array:
-            best_fit_value = slope * entry['freq'] + intercept
-            offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-        linear_fit_dict['I_all'] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                    'pvalue': pvalue, 'stderr': stderr,
-                                    'offset_of_best_fit': np.array(offset_of_best_fit),
-                                    'time_delay_ns': round(slope / (2 * math.pi), 11) * -10 ** 9}
-
-        array_diff = []
-        for m, i in zip(combined_main_array, combined_intf_array):
-            freq = i['freq']
-            phase = m['phase_deg'] - i['phase_deg']
-            time_ns = phase * 10**9 / (freq * 360.0)
-            array_diff.append((freq, phase, time_ns))
-        array_diff = np.array(array_diff, dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
-                                                 ('time_ns', 'f4')])
-        array_diff_dict = {'calculated': array_diff}
-
-        array_diff_dict['calculated'] = unwrap_phase(array_diff_dict['calculated'])
+        # for each antenna and the combined arrays, get the linear fit and plot the
+        # offset from linear fit.
+        fit_data = dict(all_data, M_all=combined_main_array, I_all=combined_intf_array)
+        linear_fit_dict = split_linear_fits(list(fit_data.keys()), get_linear_fits(
+            combined_main_array['freq'], [dataset['phase_rad'] for dataset in
+                                          fit_data.values()]))
+
+        array_diff_dict = {'calculated': unwrap_phase(get_array_difference(
+            combined_main_array, combined_intf_array, wrap=False))}
 
         if combined_test_data_flag:
-            array_diff = []
-            for m, i in zip(combined_array_test['main_combined'], combined_array_test['intf_combined']):
-                freq = i['freq']
-                phase = m['phase_deg'] - i['phase_deg']
-                time_ns = phase * 10**9 / (freq * 360.0)
-                array_diff.append((freq, phase, time_ns))
-            array_diff = np.array(array_diff, dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
-                                                     ('time_ns', 'f4')])
-            array_diff_dict['tested'] = array_diff
-
-            array_diff_dict['tested'] = unwrap_phase(array_diff_dict['tested'])
-        # PLOTTING
+            array_diff_dict['tested'] = unwrap_phase(get_array_difference(
+                combined_array_test['main_combined'], combined_array_test['intf_combined'],
+                wrap=False))
+
+        if time_file_loc != 'None':
+            for ant, array in all_data.items():
+                array.tofile(plot_location + time_file_loc + path_type + ant + '.txt', sep="\n")
+            combined_main_array.tofile(plot_location + time_file_loc + path_type + 'main_array_combined.txt',
+                                       sep="\n")
+            combined_intf_array.tofile(plot_location + time_file_loc + path_type + 'intf_array_combined.txt',
+                                       sep="\n")
+    elif combined_test_data_flag:  # only combined data given
+        array_diff_dict = {'tested': unwrap_phase(get_array_difference(
+            combined_array_test['main_combined'], combined_array_test['intf_combined'],
+            wrap=False))}
+    else:
+        sys.exit("Nothing to plot.")
+
+    if combined_test_data_flag:
+        if time_file_str != 'None':
+            array_diff_dict['tested'].tofile(plot_location + path_type + time_file_str, sep="\n")
+        if not main_data:
+            combined_array_test['main_combined'].tofile(
+                plot_location + time_file_loc + path_type + 'main_array_combined.txt', sep="\n")
+            combined_array_test['intf_combined'].tofile(
+                plot_location + time_file_loc + path_type + 'intf_array_combined.txt', sep="\n")
+    else:
+        if time_file_str != 'None':
+            array_diff_dict['calculated'].tofile(plot_location + path_type + time_file_str, sep="\n")
+
+    if no_plot:
+        return
 
+    # PLOTTING
+    plt = get_pyplot()
+
+    if main_data:
         numplots = 6
         fig, smpplot = plt.subplots(numplots, sharex=True, figsize=(18, 24))
         xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
@@ -284,17 +227,13 @@ def main():
         smpplot[2].legend(fontsize=12)
         smpplot[2].set_ylabel('Phasing Matrix Path\nDifference Between\nArrays [degrees]')
 
-        for ant, dataset in all_data.items():
-            if ant[0] == 'M':  # plot with main array
-                smpplot[3].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi,
-                                label='{}, delay={} ns'.format(ant,
-                                                               linear_fit_dict[ant]['time_delay_ns']),
-                                color=hex_dictionary[ant])
-            elif ant[0] == 'I':
-                smpplot[4].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi,
-                                label='{}, delay={} ns'.format(ant,
-                                                               linear_fit_dict[ant]['time_delay_ns']),
-                                color=hex_dictionary[ant])
+        for array_plot, array_data in [(smpplot[3], main_data), (smpplot[4], intf_data)]:
+            plot_channel_lines(array_plot, all_data['M0']['freq'],
+                               [linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi
+                                for ant in array_data],
+                               [hex_dictionary[ant] for ant in array_data],
+                               ['{}, delay={} ns'.format(ant, linear_fit_dict[ant][
+                                   'time_delay_ns']) for ant in array_data])
 
         smpplot[3].plot(all_data['M0']['freq'], linear_fit_dict['M_all']['offset_of_best_fit'] * 180.0 / math.pi,
                         color=hex_dictionary['other'], label='Combined Main, delay={} ns'.format(linear_fit_dict['M_all']['time_delay_ns']))  # plot last
@@ -320,23 +259,21 @@ def main():
             for element in missing_data:
                 missing_data_statement = missing_data_statement + element + " "
             print(missing_data_statement)
-            plt.figtext(0.65, 0.06, missing_data_statement, fontsize=15)
+            fig.text(0.65, 0.06, missing_data_statement, fontsize=15)
 
         if data_description:
             print(data_description)
-            plt.figtext(0.65, 0.04, data_description, fontsize=8)
+            fig.text(0.65, 0.04, data_description, fontsize=8)
 
         fig.savefig(plot_location + plot_filename)
         plt.close(fig)
 
         fig2, newplot = plt.subplots(2, figsize=(18, 18))
-        for ant, dataset in all_data.items():
-                newplot[0].plot(dataset['freq'], dataset['phase_deg'],
-                                label='{}'.format(ant),
-                                color=hex_dictionary[ant])
-                newplot[1].plot(dataset['freq'], dataset['magnitude'],
-                                label='{}'.format(ant),
-                                color=hex_dictionary[ant])
+        all_colours = [hex_dictionary[ant] for ant in all_data]
+        for x, column in enumerate(['phase_deg', 'magnitude']):
+            plot_channel_lines(newplot[x], all_data['M0']['freq'],
+                               [dataset[column] for dataset in all_data.values()],
+                               all_colours, list(all_data))
         newplot[0].set_ylabel('Phase of Individual Paths [deg]')
         newplot[1].set_ylabel('Magnitude of Individual Paths [dB]')
         newplot[1].set_xlabel('Frequency [Hz]')
@@ -347,15 +284,7 @@ def main():
         fig2.savefig(plot_location + plot_filename_2)
         plt.close(fig2)
 
-        if time_file_loc != 'None':
-            for ant, array in all_data.items():
-                array.tofile(plot_location + time_file_loc + path_type + ant + '.txt', sep="\n")
-            combined_main_array.tofile(plot_location + time_file_loc + path_type + 'main_array_combined.txt',
-                                       sep="\n")
-            combined_intf_array.tofile(plot_location + time_file_loc + path_type + 'intf_array_combined.txt',
-                                       sep="\n")
-
-    elif combined_test_data_flag:  # only combined data given
+    else:  # only combined data given
         numplots = 4
         fig, smpplot = plt.subplots(numplots, sharex=True, figsize=(18, 24))
         xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
@@ -379,20 +308,6 @@ def main():
         smpplot[0].legend(fontsize=12)
         smpplot[1].legend(fontsize=12)
 
-        array_diff = []
-        array_diff_dict = {}
-        for m, i in zip(combined_array_test['main_combined'],
-                        combined_array_test['intf_combined']):
-            freq = i['freq']
-            phase = m['phase_deg'] - i['phase_deg']
-            time_ns = phase * 10 ** 9 / (freq * 360.0)
-            array_diff.append((freq, phase, time_ns))
-        array_diff = np.array(array_diff, dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
-                                                 ('time_ns', 'f4')])
-        array_diff_dict['tested'] = array_diff
-
-        array_diff_dict['tested'] = unwrap_phase(array_diff_dict['tested'])
-
         smpplot[2].plot(array_diff_dict['tested']['freq'], array_diff_dict['tested']['phase_deg'],
                         label='Tested Arrays Difference', color=array_colors['main_test'])
 
@@ -410,30 +325,15 @@ def main():
             for element in missing_data:
                 missing_data_statement = missing_data_statement + element + " "
             print(missing_data_statement)
-            plt.figtext(0.4, 0.03, missing_data_statement, fontsize=15)
+            fig.text(0.4, 0.03, missing_data_statement, fontsize=15)
 
         if data_description:
             print(data_description)
-            plt.figtext(0.4, 0.015, data_description, fontsize=8)
+            fig.text(0.4, 0.015, data_description, fontsize=8)
 
         fig.savefig(plot_location + plot_filename)
         plt.close(fig)
 
-    else:
-        sys.exit("Nothing to plot.")
-
-    if combined_test_data_flag:
-        if time_file_str != 'None':
-            array_diff_dict['tested'].tofile(plot_location + path_type + time_file_str, sep="\n")
-        if not main_data:
-            combined_array_test['main_combined'].tofile(
-                plot_location + time_file_loc + path_type + 'main_array_combined.txt', sep="\n")
-            combined_array_test['intf_combined'].tofile(
-                plot_location + time_file_loc + path_type + 'intf_array_combined.txt', sep="\n")
-    else:
-        if time_file_str != 'None':
-            array_diff_dict['calculated'].tofile(plot_location + path_type + time_file_str, sep="\n")
-
 
-if __name__ == main():
+if __name__ == '__main__':
     main()
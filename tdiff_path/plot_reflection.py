@@ -5,17 +5,12 @@
 # This script for if your data is in dB, not SWR format.
 
 import sys
-import time
-import math
-import random
-import fnmatch
-import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import json
-import csv
 
-from dataset_operations.dataset_operations import reduce_frequency_array
+from dataset_operations.dataset_operations import reduce_frequency_array, \
+    get_linear_fits, split_linear_fits
+from retrieve_data.retrieve_data import read_sweeps_concurrently
+from rendering.rendering import get_pyplot, plot_channel_lines
 
 # General variables to change depending on data being used
 radar_name = sys.argv[1]  # eg. Inuvik
@@ -45,12 +40,15 @@ hex_colors = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900',
               '#5500ff', '#a366ff', '#ff00ff', '#e6005c', '#ffaa80', '#999999']
 hex_dictionary = {'other': '#000000'}
 
+# The columns to read from the first sweep of each csv file.
+header_names = {'freq': 'Freq*', 'dB': 'Magni*', 'phase': 'Phase*'}
+
 
 def main():
     data_description = []
     missing_data = []
     all_data = {}
-    min_dataset_length = 100000  # won't be this high
+    channel_files = {}
     for ant, v in all_files.items():
         if ant == '_comment':
             data_description = v
@@ -58,56 +56,15 @@ def main():
         if v == 'dne':
             missing_data.append(ant)
             continue
-        with open(data_location + v, 'r') as csvfile:
-            for line in csvfile:
-                if fnmatch.fnmatch(line, 'Freq. [Hz*'):  # skip to header
-                    break
-            else:  # no break
-                sys.exit('No Data in file {}'.format(v))
-            row = line.split(',')
-            try:
-                freq_header = 'Freq*'
-                freq_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], freq_header)]
-                mag_header = 'Magni*'
-                mag_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], mag_header)]
-                freq_column = freq_columns[0]
-                mag_column = mag_columns[0]
-                phase_header = 'Phase*'
-                phase_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], phase_header)]
-                phase_column = phase_columns[0]
-                if (abs(mag_column - freq_column) > 2) or (
-                            abs(phase_column - freq_column) > 2):
-                    print(freq_column, mag_column, phase_column)
-                    sys.exit('Data Phase and VSWR are given from different sweeps - please'
-                                 'check data file so first sweep has SWR and Phase info.')
-            except:
-                sys.exit('Cannot find VSWR data.')
-
-            next(csvfile)  # skip over header
-            csv_reader = csv.reader(csvfile)
-            data = []
-
-            for row in csv_reader:
-                try:
-                    freq = float(row[freq_column])
-                    magnitude = float(row[mag_column])
-                    phase = float(row[phase_column])
-                    data.append((freq, magnitude, phase))
-                except:
-                    continue
-            data = np.array(data, dtype=[('freq', 'i4'), ('dB', 'f4'), ('phase', 'f4')])
-
-            if len(data) < min_dataset_length:
-                min_dataset_length = len(data)
-
-            all_data[ant] = data
-            hex_dictionary[ant] = hex_colors[0]
-            hex_colors.remove(hex_dictionary[ant])
-
-    all_data = reduce_frequency_array(all_data, min_dataset_length)
+        channel_files[ant] = v
+
+    for ant, data in read_sweeps_concurrently(channel_files, data_location,
+                                              header_names).items():
+        all_data[ant] = data
+        hex_dictionary[ant] = hex_colors[0]
+        hex_colors.remove(hex_dictionary[ant])
+
+    all_data = reduce_frequency_array(all_data)
 
     max_phase = list(all_data['M0']['phase'])
     min_phase = list(all_data['M0']['phase'])
@@ -129,17 +86,8 @@ def main():
     phase_ave = [phase_ave[i]/16 for i in range(len(phase_ave))]
 
     # for each antenna, get the linear fit and plot the offset from linear fit.
-    linear_fit_dict = {}
-    for ant, dataset in all_data.items():
-        slope, intercept, rvalue, pvalue, stderr = stats.linregress(dataset['freq'],
-                                                                    dataset['phase'])
-        linear_fit_dict[ant] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                'pvalue': pvalue, 'stderr': stderr}
-        offset_of_best_fit = []
-        for entry in dataset:
-            best_fit_value = slope * entry['freq'] + intercept
-            offset_of_best_fit.append(entry['phase'] - best_fit_value)
-        linear_fit_dict[ant]['offset_of_best_fit'] = offset_of_best_fit
+    linear_fit_dict = split_linear_fits(list(all_data.keys()), get_linear_fits(
+        all_data['M0']['freq'], [dataset['phase'] for dataset in all_data.values()]))
 
 
     # find top antennas with highest phase offsets and plot those antennas SWR
@@ -156,16 +104,21 @@ def main():
         worst_swrs.append(max(furthest_phase_offset, key=lambda key: furthest_phase_offset[key]))
         del furthest_phase_offset[worst_swrs[-1]]
 
+    plt = get_pyplot()
     numplots = 5
     fig, smpplot = plt.subplots(numplots, sharex=True, figsize=(16,22))
     xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
     smpplot[0].set_title(vswrs_plot_title, size=30, linespacing=1.3)
-    for ant, dataset in all_data.items():
-        smpplot[0].plot(dataset['freq'], dataset['phase'], label=ant, color=hex_dictionary[ant])
-        smpplot[1].plot(dataset['freq'], dataset['dB'], label=ant, color=hex_dictionary[ant])
-        smpplot[4].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'],
-                        label='{}, stderr={}'.format(ant,round(linear_fit_dict[ant]['stderr'], 9)),
-                        color=hex_dictionary[ant])
+    freq = all_data['M0']['freq']
+    colours = [hex_dictionary[ant] for ant in all_data]
+    plot_channel_lines(smpplot[0], freq, [dataset['phase'] for dataset in all_data.values()],
+                       colours, list(all_data))
+    plot_channel_lines(smpplot[1], freq, [dataset['dB'] for dataset in all_data.values()],
+                       colours, list(all_data))
+    plot_channel_lines(smpplot[4], freq, [linear_fit_dict[ant]['offset_of_best_fit'] for ant
+                                          in all_data], colours,
+                       ['{}, stderr={}'.format(ant, round(linear_fit_dict[ant]['stderr'], 9))
+                        for ant in all_data])
     smpplot[2].plot(all_data['M0']['freq'], diff_phase, label='Max-Min Difference',
                     color=hex_dictionary['other'])
     smpplot[3].plot(all_data['M0']['freq'], dB_array_ave, label='Average SWR',
@@ -194,15 +147,15 @@ def main():
         for element in missing_data:
             missing_data_statement = missing_data_statement + element + " "
         print(missing_data_statement)
-        plt.figtext(0.65, 0.05, missing_data_statement, fontsize=15)
+        fig.text(0.65, 0.05, missing_data_statement, fontsize=15)
 
     if data_description:
         print(data_description)
-        plt.figtext(0.65, 0.10, data_description, fontsize=15)
+        fig.text(0.65, 0.10, data_description, fontsize=15)
 
     fig.savefig(plot_location + plot_filename)
     plt.close(fig)
 
 
-if __name__ == main():
+if __name__ == '__main__':
     main()
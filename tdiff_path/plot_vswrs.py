@@ -3,234 +3,383 @@
 # plot_vswrs.py
 # To plot all VSWR data on the same plot to visualize
 # differences between the antennas.
+# With --watch, the data directory is watched during a site visit and the plot is updated
+# as each antenna's file comes in.
 
+import os
 import sys
-import fnmatch
+import time
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import json
-import csv
 
 sys.path.append('/home/shared/code/radar-test-plots/tdiff_path')
 
 from dataset_operations.dataset_operations import reduce_frequency_array, wrap_phase, \
-    unwrap_phase
+    unwrap_phase, wrap_degrees_block, get_linear_fits
+from retrieve_data.retrieve_data import read_sweep_from_csv, read_sweeps_concurrently
+from retrieve_data.sweep_cache import get_file_hash
+from retrieve_data.watch_directory import DirectoryWatcher
+from rendering.rendering import get_pyplot, plot_channel_lines, get_channel_colours
+from rendering.live_figure import LiveFigure, get_status
 
-# General variables to change depending on data being used
-radar_name = sys.argv[1]  # eg. Inuvik
-data_location = sys.argv[2]  # eg. '/home/shared/Sync/Sites/Inuvik/Trips/2017/Datasets/'
-plot_location = sys.argv[3]  # eg. '/home/shared/Sync/Sites/Inuvik/Trips/2017/Data_Analysis/VSWRs/'
-vswr_files_str = sys.argv[4]  # eg. 'vswr-files.json' - must be located in plot_location.
-#vswr_intf_files_str = sys.argv[5]  # eg. 'vswr-intf-files.json' - must be location in plot_location.
-plot_filename = radar_name + ' vswrs.png'
+# number of antennas with the worst phase offsets to plot the VSWR of.
+number_of_worst_swrs = 5
 
-print(radar_name, data_location, plot_location, vswr_files_str, plot_filename)
+# The columns to read from the first sweep of each csv file.
+header_names = {'freq': 'Freq*', 'VSWR': 'VSWR*', 'phase': 'Phase*'}
 
-# number_of_data_points = 801
-vswrs_plot_title = radar_name + ' Feedline to Antenna Standing Wave Ratios'
 
-sys.path.append(data_location)
+def usage_msg():
+    """
+    Return the usage message for this script.
 
-# TODO get date from csv files
-with open(plot_location + vswr_files_str) as f:
-    vswr_files = json.load(f)
+    This is used if a -h flag or invalid arguments are provided.
 
-    all_files = vswr_files
-    print("All files: {}".format(vswr_files))
-#
-#
-# A list of 21 colors that will be assigned to antennas to keep plot colors consistent.
-hex_colors = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900', '#99cc00',
-              '#7a7a52', '#004d00', '#33ff33', '#26734d', '#003366', '#33cccc', '#00004d',
-              '#5500ff', '#a366ff', '#ff00ff', '#e6005c', '#ffaa80', '#999999']
-hex_dictionary = {'other': '#000000'}
+    :return: the usage message
+    """
 
+    usage_message = """ plot_vswrs.py [-h] [--watch] [--interval INTERVAL] radar_name
+    data_location plot_location vswr_files_str
 
-def main():
-    data_description = []
-    missing_data = []
-    all_data = {}
+    Plot the VSWR and phase of all antennas on the same plot to visualize differences
+    between the antennas.
+    """
 
-    for ant, v in all_files.items():
-        if ant == '_comment':
-            data_description = v
-            continue
-        if v == 'dne':
-            missing_data.append(ant)
-            continue
-        with open(data_location + v, 'r') as csvfile:
-            for line in csvfile:
-                # skip to header
-                if fnmatch.fnmatch(line, 'Freq [Hz*') or fnmatch.fnmatch(line, 'Frequency [Hz*'):
-                    break
-            else:  # no break
-                sys.exit('No data in file {}\n'.format(v))
-            row = line.split(',')
-            try:
-                freq_header = 'Freq*'
-                freq_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], freq_header)]
-                vswr_header = 'VSWR*'
-                vswr_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], vswr_header)]
-                freq_column = freq_columns[0]
-                vswr_column = vswr_columns[0]
-                phase_header = 'Phase*'
-                phase_columns = [i for i in range(len(row)) if
-                                 fnmatch.fnmatch(row[i], phase_header)]
-                phase_column = phase_columns[0]
-                if (abs(vswr_column - freq_column) > 2) or (
-                            abs(phase_column - freq_column) > 2):
-                    print(freq_column, vswr_column, phase_column)
-                    sys.exit('Data Phase and VSWR are given from different sweeps - please'
-                             'check data file so first sweep has SWR and Phase info.')
-            except:
-                sys.exit('Cannot find VSWR data.')
-
-            next(csvfile)  # skip over header
-            csv_reader = csv.reader(csvfile)
-            data = []
-
-            for row in csv_reader:
-                try:
-                    freq = float(row[freq_column])
-                    vswr = float(row[vswr_column])
-                    phase = float(row[phase_column])
-                    data.append((freq, vswr, phase))
-                except:
-                    continue
-            data = np.array(data, dtype=[('freq', 'i4'), ('VSWR', 'f4'), ('phase', 'f4')])
-
-            all_data[ant] = data
-            hex_dictionary[ant] = hex_colors[0]
-            hex_colors.remove(hex_dictionary[ant])
-
-    all_data = reduce_frequency_array(all_data)
-
-    all_data_phase_wrapped = {}
-    for ant, dataset in all_data.items():
-        all_data_phase_wrapped[ant] = wrap_phase(dataset)
+    return usage_message
 
-    for ant, dataset in all_data_phase_wrapped.items():
-        all_data[ant] = unwrap_phase(dataset)  # wrapping then unwrapping allows us to
-        # get rid of any 360 degree offset in the measurements.
 
+def script_parser():
+    """
+    Creates the parser to retrieve the arguments.
 
-    max_phase = list(all_data['M0']['phase'])
-    min_phase = list(all_data['M0']['phase'])
-    phase_ave = list(all_data['M0']['phase'])
-    swr_ave = list(all_data['M0']['VSWR'])
-    for ant, dataset in all_data.items():
-        for index, entry in enumerate(dataset):
-            if entry['phase'] < min_phase[index]:
-                min_phase[index] = entry['phase']
-            if entry['phase'] > max_phase[index]:
-                max_phase[index] = entry['phase']
-        if ant == 'M0':
-            pass
-        else:
-            swr_ave = [swr_ave[i] + dataset['VSWR'][i] for i in range(len(dataset))]
-            phase_ave = [phase_ave[i] + dataset['phase'][i] for i in range(len(dataset))]
-    diff_phase = [(max_phase[i] - min_phase[i]) for i in range(len(min_phase))]
-    swr_ave = [swr_ave[i]/20 for i in range(len(swr_ave))]
-    phase_ave = [phase_ave[i]/20 for i in range(len(phase_ave))]
-
-    # for each antenna, get the linear fit and plot the offset from linear fit.
-    linear_fit_dict = {}
-    for ant, dataset in all_data.items():
-        slope, intercept, rvalue, pvalue, stderr = stats.linregress(dataset['freq'],
-                                                                    dataset['phase'])
-        linear_fit_dict[ant] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                'pvalue': pvalue, 'stderr': stderr}
-        offset_of_best_fit = []
-        best_fit_line = []
-        for entry in dataset:
-            best_fit_value = slope * entry['freq'] + intercept
-            offset_of_best_fit.append(entry['phase'] - best_fit_value)
-            best_fit_line.append(best_fit_value)
-        best_fit_line = np.array(best_fit_line, dtype=[('phase', 'f4')])
-        offset_of_best_fit = np.array(offset_of_best_fit, dtype=[('phase', 'f4')])
-        offset_of_best_fit = wrap_phase(offset_of_best_fit)
-        linear_fit_dict[ant]['offset_of_best_fit'] = offset_of_best_fit['phase']
-        linear_fit_dict[ant]['best_fit_line'] = best_fit_line
-        linear_fit_dict[ant]['best_fit_line'] = wrap_phase(linear_fit_dict[ant][
-                                                               'best_fit_line'])
+    :return: parser, the argument parser for this script.
+    """
+
+    parser = argparse.ArgumentParser(usage=usage_msg())
+    parser.add_argument("radar_name", help="Name of the radar, eg. Inuvik")
+    parser.add_argument("data_location", help="Path of the data files, eg. "
+                                              "'/home/shared/Sync/Sites/Inuvik/Trips/2017/"
+                                              "Datasets/'")
+    parser.add_argument("plot_location", help="Path to place the plot in, eg. "
+                                              "'/home/shared/Sync/Sites/Inuvik/Trips/2017/"
+                                              "Data_Analysis/VSWRs/'")
+    parser.add_argument("vswr_files_str", help="Json file mapping antennas to data files, "
+                                               "eg. 'vswr-files.json' - must be located "
+                                               "in plot_location.")
+    parser.add_argument("--watch", action='store_true',
+                        help="Keep watching data_location and update the plot as each "
+                             "data file comes in or changes, until Ctrl-C.")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="Seconds between checks of data_location with --watch. "
+                             "Default 2.0")
+    return parser
+
+
+def get_channel_products(dataset):
+    """
+    Get what is plotted for one antenna, which does not depend on the other antennas.
+    :param dataset: numpy array with dtypes 'freq', 'VSWR' and 'phase'.
+    :return: dictionary of the wrapped data (phase_wrapped), the unwrapped data
+    (unwrapped), and the linear fit of the unwrapped phase with its offset_of_best_fit
+    in degrees, wrapped.
+    """
+    phase_wrapped = wrap_phase(dataset)
+    # wrapping then unwrapping allows us to get rid of any 360 degree offset in the
+    # measurements.
+    unwrapped = unwrap_phase(phase_wrapped)
+    linear_fit = {key: value[0] for key, value in get_linear_fits(
+        unwrapped['freq'], unwrapped['phase']).items()}
+    linear_fit['offset_of_best_fit'] = wrap_degrees_block(linear_fit['offset_of_best_fit'])
+    return {'phase_wrapped': phase_wrapped, 'unwrapped': unwrapped,
+            'linear_fit': linear_fit}
+
+
+def get_plot_data(channel_products):
+    """
+    Get what is plotted from all antennas: the average VSWR and phase, and the antennas
+    with the worst phase offsets from the average.
+    :param channel_products: dictionary of antenna to get_channel_products dictionary,
+    all at the same frequencies.
+    :return: dictionary of the plot data.
+    """
+    antennas = list(channel_products.keys())
+    phase_block = np.vstack([channel_products[ant]['unwrapped']['phase'] for ant in
+                             antennas]).astype(float)
+    swr_block = np.vstack([channel_products[ant]['unwrapped']['VSWR'] for ant in
+                           antennas]).astype(float)
+    phase_ave = np.mean(phase_block, axis=0)
+    swr_ave = np.mean(swr_block, axis=0)
 
     # find top antennas with highest phase offsets and plot those antennas SWR
-    furthest_phase_offset = {}
-    for ant, dataset in all_data.items():
-        max_phase_offset = 0
-        for index, entry in enumerate(dataset):
-            phase_offset = abs(entry['phase'] - phase_ave[index])
-            if phase_offset > max_phase_offset:
-                max_phase_offset = phase_offset
-        furthest_phase_offset[ant] = max_phase_offset
-    worst_swrs = []
-    while len(worst_swrs) < 5:
-        worst_swrs.append(max(furthest_phase_offset, key=lambda key: furthest_phase_offset[key]))
-        del furthest_phase_offset[worst_swrs[-1]]
-
-    worst_swrs_phase_offset = {}
-    for antenna in worst_swrs:
-        phase_offset_list = all_data[antenna]['phase'] - phase_ave
-        worst_swrs_phase_offset[antenna] = np.array(phase_offset_list, dtype=[('phase',
-                                                                               'f4')])
-        worst_swrs_phase_offset[antenna] = wrap_phase(worst_swrs_phase_offset[antenna])
+    furthest_phase_offset = np.max(np.abs(phase_block - phase_ave), axis=1)
+    worst_rows = np.argsort(-furthest_phase_offset, kind='stable')[:number_of_worst_swrs]
+    worst_swrs = [antennas[row] for row in worst_rows]
+    worst_swrs_phase_offset = {ant: wrap_degrees_block(phase_block[row] - phase_ave) for
+                               ant, row in zip(worst_swrs, worst_rows)}
+
+    return {'antennas': antennas,
+            'freq': channel_products[antennas[0]]['unwrapped']['freq'],
+            'channel_products': channel_products, 'swr_ave': swr_ave,
+            'worst_swrs': worst_swrs, 'worst_swrs_phase_offset': worst_swrs_phase_offset}
+
+
+def draw_phase(axes, data):
+    axes.set_title(data['plot_title'], size=30, linespacing=1.3)
+    plot_channel_lines(axes, data['freq'], [data['channel_products'][ant][
+        'phase_wrapped']['phase'] for ant in data['antennas']],
+                       [data['colour_dictionary'][ant] for ant in data['antennas']],
+                       data['antennas'])
+    axes.set_ylabel('Phase [degrees]', size='xx-large')
+    axes.grid()
+
+
+def draw_vswr(axes, data):
+    plot_channel_lines(axes, data['freq'], [data['channel_products'][ant]['unwrapped'][
+        'VSWR'] for ant in data['antennas']],
+                       [data['colour_dictionary'][ant] for ant in data['antennas']],
+                       data['antennas'])
+    axes.set_ylabel('VSWR', size='xx-large')
+    axes.grid()
+
 
+def draw_worst_phase_offsets(axes, data):
+    for antenna in data['worst_swrs']:
+        axes.plot(data['freq'], data['worst_swrs_phase_offset'][antenna], label=antenna,
+                  color=data['colour_dictionary'][antenna])
+    axes.set_ylabel('Worst Phase Offsets\n from Average', size='xx-large')
+    axes.grid()
+    axes.legend(fontsize=10)
+
+
+def draw_worst_vswrs(axes, data):
+    axes.plot(data['freq'], data['swr_ave'], label='Average SWR',
+              color=data['colour_dictionary']['other'])
+    for antenna in data['worst_swrs']:
+        axes.plot(data['freq'], data['channel_products'][antenna]['unwrapped']['VSWR'],
+                  label=antenna, color=data['colour_dictionary'][antenna])
+    axes.set_ylabel('Worst VSWRs by Phase', size='xx-large')
+    axes.grid()
+    axes.legend(fontsize=10)
+
+
+def draw_fit_offsets(axes, data):
+    plot_channel_lines(axes, data['freq'], [data['channel_products'][ant]['linear_fit'][
+        'offset_of_best_fit'] for ant in data['antennas']],
+                       [data['colour_dictionary'][ant] for ant in data['antennas']],
+                       ['{}, stderr={}'.format(ant, round(data['channel_products'][ant][
+                           'linear_fit']['stderr'], 9)) for ant in data['antennas']])
+    axes.set_xlabel('Frequency (Hz)', size='xx-large')
+    axes.grid()
+    axes.legend(fontsize=7, loc='upper right', ncol=3)
+    axes.set_ylabel('Phase Offsets from\nLine of Best Fit', size='xx-large')
+
+
+def make_vswr_figure(plt):
+    """
+    Make the figure and its panels.
+    :param plt: the matplotlib.pyplot module.
+    :return: fig: the figure.
+    :return: panels: dictionary of panel name to (list of axes, draw function), see
+    rendering.live_figure.LiveFigure.
+    """
     numplots = 6
     fig, smpplot = plt.subplots(numplots, sharex=True, figsize=(16, 22), dpi=80)
-    xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
-    smpplot[0].set_title(vswrs_plot_title, size=30, linespacing=1.3)
-    for ant, dataset in all_data_phase_wrapped.items():
-        smpplot[0].plot(dataset['freq'], dataset['phase'], label=ant,
-                    color=hex_dictionary[ant])
+    smpplot[5].grid()  # not used.
+    panels = {'phase': ([smpplot[0]], draw_phase),
+              'vswr': ([smpplot[1]], draw_vswr),
+              'worst_phase_offsets': ([smpplot[2]], draw_worst_phase_offsets),
+              'worst_vswrs': ([smpplot[3]], draw_worst_vswrs),
+              'fit_offsets': ([smpplot[4]], draw_fit_offsets)}
+    return fig, panels
+
+
+def read_vswr_files(vswr_files, data_location, channel_data, file_hashes, antennas=None):
+    """
+    Read the data files of the antennas whose files are new or changed.
+    :param vswr_files: dictionary of antenna to data filename, from the json file.
+    :param data_location: path of the data files.
+    :param channel_data: dictionary of antenna to data read, updated in place and kept in
+    the order of the json file.
+    :param file_hashes: dictionary of antenna to hash of the file read, updated in place.
+    :param antennas: the antennas to check, all by default.
+    :return: list of the antennas whose data changed.
+    """
+    changed = []
+    for ant in (vswr_files.keys() if antennas is None else antennas):
+        v = vswr_files[ant]
+        if ant == '_comment' or v == 'dne':
+            continue
+        csv_path = data_location + v
+        if not os.path.exists(csv_path):
+            if channel_data.pop(ant, None) is not None:
+                file_hashes.pop(ant)
+                changed.append(ant)
+            continue
+        file_hash = get_file_hash(csv_path)
+        if file_hashes.get(ant) == file_hash:
+            continue
+        file_hashes[ant] = file_hash
+        channel_data[ant] = read_sweep_from_csv(csv_path, header_names)
+        changed.append(ant)
+    ordered = {ant: channel_data[ant] for ant in vswr_files if ant in channel_data}
+    channel_data.clear()
+    channel_data.update(ordered)
+    return changed
+
+
+def update_channel_products(channel_data, channel_products, changed):
+    """
+    Get the products of the antennas that changed, or of all antennas if the
+    frequencies they are reduced to changed.
+    :param channel_data: dictionary of antenna to data read.
+    :param channel_products: dictionary of antenna to get_channel_products dictionary,
+    updated in place.
+    :param changed: list of the antennas whose data changed.
+    """
+    all_data = reduce_frequency_array(dict(channel_data))
+    products = {}
     for ant, dataset in all_data.items():
-        smpplot[1].plot(dataset['freq'], dataset['VSWR'], label=ant, color=hex_dictionary[ant])
-        smpplot[4].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'],
-                        label='{}, stderr={}'.format(ant,round(linear_fit_dict[ant]['stderr'], 9)),
-                        color=hex_dictionary[ant])
-    # smpplot[2].plot(all_data['M0']['freq'], diff_phase, label='Max-Min Difference',
-    #                 color=hex_dictionary['other'])
-    smpplot[3].plot(all_data['M0']['freq'], swr_ave, label='Average SWR',
-                    color=hex_dictionary['other'])
-    for antenna in worst_swrs:
-        smpplot[3].plot(all_data[antenna]['freq'], all_data[antenna]['VSWR'], label=antenna,
-                        color=hex_dictionary[antenna])
-        smpplot[2].plot(all_data[antenna]['freq'], worst_swrs_phase_offset[antenna],
-                        label=antenna, color=hex_dictionary[antenna])
-    smpplot[4].set_xlabel('Frequency (Hz)', size='xx-large')
-    smpplot[0].set_ylabel('Phase [degrees]', size='xx-large')
-    smpplot[1].set_ylabel('VSWR', size='xx-large')
-    smpplot[2].set_ylabel('Worst Phase Offsets\n from Average', size='xx-large')
-    smpplot[3].set_ylabel('Worst VSWRs by Phase', size='xx-large')
-    for i in range(0, numplots):
-        smpplot[i].grid()
-    smpplot[2].legend(fontsize=10)
-    smpplot[3].legend(fontsize=10)
-    smpplot[4].legend(fontsize=7, loc='upper right', ncol=3)
-    smpplot[4].set_ylabel('Phase Offsets from\nLine of Best Fit', size='xx-large')
-    #plt.legend(bbox_to_anchor=(0., 1.02, 1., .102), loc=3,
-    #           ncol=2, mode="expand", borderaxespad=0.)
+        if ant in changed or ant not in channel_products or len(channel_products[ant][
+                'unwrapped']) != len(dataset):
+            products[ant] = get_channel_products(dataset)
+        else:
+            products[ant] = channel_products[ant]
+    channel_products.clear()
+    channel_products.update(products)
+
+
+def watch_vswrs(data_location, mapping_path, figure_filename, plot_title, interval):
+    """
+    Watch the data directory during a site visit, and update the plot as each antenna's
+    csv file comes in or is measured again. Only the new or changed files are read and
+    fit.
+    :param data_location: path of the data files.
+    :param mapping_path: path of the json file mapping antennas to data files.
+    :param figure_filename: path the figure is saved to after each update.
+    :param plot_title: title of the figure.
+    :param interval: seconds between checks of the data directory.
+    """
+    plt = get_pyplot()
+    fig, panels = make_vswr_figure(plt)
+    live_figure = LiveFigure(fig, panels, figure_filename, xlim=(8e6, 20e6))
+    description_text = fig.text(0.65, 0.10, '', fontsize=15)
+    state = {'vswr_files': None, 'channel_data': {}, 'file_hashes': {},
+             'channel_products': {}}
+
+    def on_change(changed, removed):
+        changed_paths = set(os.path.abspath(path) for path in changed + removed)
+        antennas = None  # all antennas.
+        if state['vswr_files'] is None or os.path.abspath(mapping_path) in changed_paths:
+            print('Reading the file mapping {}'.format(mapping_path))
+            with open(mapping_path) as f:
+                state['vswr_files'] = json.load(f)
+            state['channel_data'].clear()
+            state['file_hashes'].clear()
+            state['channel_products'].clear()
+            state['colour_dictionary'] = get_channel_colours([
+                ant for ant, v in state['vswr_files'].items() if ant != '_comment' and
+                v != 'dne'])
+            description_text.set_text(state['vswr_files'].get('_comment', ''))
+        else:
+            antennas = [ant for ant, v in state['vswr_files'].items() if ant != '_comment'
+                        and os.path.abspath(data_location + v) in changed_paths]
+        vswr_files = state['vswr_files']
+        changed_antennas = []
+        for ant in (vswr_files.keys() if antennas is None else antennas):
+            try:
+                changed_antennas += read_vswr_files(vswr_files, data_location,
+                                                    state['channel_data'],
+                                                    state['file_hashes'], [ant])
+            except (Exception, SystemExit) as e:  # a bad export should not stop watching.
+                print('Could not read {} for {}: {}'.format(vswr_files[ant], ant, e))
+        if not changed_antennas or not state['channel_data']:
+            return
+        update_channel_products(state['channel_data'], state['channel_products'],
+                                changed_antennas)
+
+        plot_data = get_plot_data(state['channel_products'])
+        plot_data.update({'plot_title': plot_title,
+                          'colour_dictionary': state['colour_dictionary']})
+        waiting = [ant for ant, v in vswr_files.items() if ant != '_comment' and v !=
+                   'dne' and ant not in state['channel_data']]
+        missing_data = [ant for ant, v in vswr_files.items() if v == 'dne']
+        status = get_status(missing_data, waiting)
+        # every panel shows the changed antennas or the average over all antennas.
+        live_figure.update(plot_data, status=status)
+        print('{}: {} antennas, updated {}'.format(time.strftime('%H:%M:%S'),
+                                                  len(state['channel_data']),
+                                                  ' '.join(changed_antennas)))
+
+    print('Watching {} for data files, Ctrl-C to stop.'.format(data_location))
+    watcher = DirectoryWatcher(data_location, extra_files=[mapping_path])
+    watcher.watch(on_change, interval)
+    plt.close(fig)
+
+
+def main():
+    parser = script_parser()
+    args = parser.parse_args()
+
+    # General variables to change depending on data being used
+    radar_name = args.radar_name
+    data_location = args.data_location
+    plot_location = args.plot_location
+    vswr_files_str = args.vswr_files_str
+    plot_filename = radar_name + ' vswrs.png'
+
+    print(radar_name, data_location, plot_location, vswr_files_str, plot_filename)
+
+    vswrs_plot_title = radar_name + ' Feedline to Antenna Standing Wave Ratios'
+
+    sys.path.append(data_location)
+
+    if args.watch:
+        watch_vswrs(data_location, plot_location + vswr_files_str,
+                    plot_location + plot_filename, vswrs_plot_title, args.interval)
+        return
+
+    # TODO get date from csv files
+    with open(plot_location + vswr_files_str) as f:
+        vswr_files = json.load(f)
+    print("All files: {}".format(vswr_files))
+
+    data_description = vswr_files.get('_comment', [])
+    missing_data = [ant for ant, v in vswr_files.items() if v == 'dne']
+    channel_files = {ant: v for ant, v in vswr_files.items() if ant != '_comment' and
+                     v != 'dne'}
+    channel_data = read_sweeps_concurrently(channel_files, data_location, header_names)
+    channel_products = {}
+    update_channel_products(channel_data, channel_products, list(channel_data.keys()))
+
+    plot_data = get_plot_data(channel_products)
+    plot_data.update({'plot_title': vswrs_plot_title,
+                      'colour_dictionary': get_channel_colours(list(channel_data.keys()))})
+
+    plt = get_pyplot()
+    fig, panels = make_vswr_figure(plt)
+    for axes_list, draw_function in panels.values():
+        draw_function(*(axes_list + [plot_data]))
+    panels['phase'][0][0].set_xlim(8e6, 20e6)
     print("plotting")
     if missing_data:  # not empty
         missing_data_statement = "***MISSING DATA FROM ANTENNA(S) "
         for element in missing_data:
             missing_data_statement = missing_data_statement + element + " "
         print(missing_data_statement)
-        plt.figtext(0.65, 0.05, missing_data_statement, fontsize=15)
+        fig.text(0.65, 0.05, missing_data_statement, fontsize=15)
     else:
         print("No missing data")
 
     if data_description:
         print("Data description: {}".format(data_description))
 
-        plt.figtext(0.65, 0.10, data_description, fontsize=15)
+        fig.text(0.65, 0.10, data_description, fontsize=15)
 
     fig.savefig(plot_location + plot_filename)
     plt.close(fig)
     print("Figure saved at: {}".format(plot_location + plot_filename))
 
 
-if __name__ == main():
+if __name__ == '__main__':
     main()
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+
+# live_figure.py
+# A figure that is kept open and saved again as its data changes, eg. while files of a
+# site visit come in one antenna at a time. The figure is split into named panels, each
+# drawn by its own function, and an update only clears and draws the panels whose data
+# changed before saving the figure.
+
+
+def get_status(missing_data, waiting):
+    """
+    :param missing_data: the channels with no data ('dne' in the file mapping).
+    :param waiting: the channels whose data files have not come in yet.
+    :return: the status text of a figure while its data comes in, with the missing data
+    statement of the one-shot plots.
+    """
+    status_lines = []
+    if missing_data:
+        status_lines.append('***MISSING DATA FROM ANTENNA(S) ' + ''.join(
+            channel + ' ' for channel in missing_data))
+    if waiting:
+        status_lines.append('Waiting for: ' + ' '.join(waiting))
+    return '\n'.join(status_lines)
+
+
+class LiveFigure(object):
+    """
+    A figure of named panels that are drawn again only when their data changes.
+    """
+
+    def __init__(self, fig, panels, figure_filename, xlim=None):
+        """
+        :param fig: the matplotlib figure.
+        :param panels: dictionary of panel name to (list of axes, draw function). The
+        draw function is called as draw(*axes, data) on cleared axes, and draws the whole
+        panel including its labels, legend and grid.
+        :param figure_filename: path the figure is saved to after each update.
+        :param xlim: optional (xmin, xmax) of the shared x axis, kept after panels are
+        cleared.
+        """
+        self.fig = fig
+        self.panels = panels
+        self.figure_filename = figure_filename
+        self.xlim = xlim
+        self.status_text = fig.text(0.65, 0.05, '', fontsize=15)
+
+    def update(self, data, panel_names=None, status=None):
+        """
+        Draw some panels again and save the figure.
+        :param data: the data passed to the panels' draw functions.
+        :param panel_names: the panels to draw, all panels by default.
+        :param status: optional text to show at the bottom of the figure, eg. the
+        channels still missing.
+        """
+        panel_names = list(self.panels) if panel_names is None else panel_names
+        for name in panel_names:
+            axes_list, draw_function = self.panels[name]
+            for axes in axes_list:
+                axes.cla()
+            draw_function(*(axes_list + [data]))
+        if self.xlim is not None:
+            next(iter(self.panels.values()))[0][0].set_xlim(*self.xlim)
+        if status is not None:
+            self.status_text.set_text(status)
+        self.fig.savefig(self.figure_filename)
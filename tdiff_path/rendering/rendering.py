@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+
+# rendering.py
+# Helpers to render figures without a display. Figures are drawn with the non-interactive
+# Agg backend, the per-channel overlays are drawn as one LineCollection per panel instead
+# of one line per channel, and figures for several sites can be rendered at once in
+# worker processes.
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# A list of 20 colors that will be assigned to channels to keep plot colors consistent.
+channel_colours = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900',
+                   '#99cc00', '#7a7a52', '#004d00', '#33ff33', '#26734d', '#003366',
+                   '#33cccc', '#00004d', '#5500ff', '#a366ff', '#ff00ff', '#e6005c',
+                   '#ffaa80', '#999999']
+
+
+def use_headless_backend():
+    """
+    Use the non-interactive Agg backend, so figures can be rendered to file without a
+    display. Must be called before anything is drawn.
+    """
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+def get_pyplot(headless=True):
+    """
+    Import pyplot, only once plotting is needed.
+    :param headless: use the Agg backend, for scripts that only save figures to file.
+    :return: the matplotlib.pyplot module.
+    """
+    if headless:
+        use_headless_backend()
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def get_channel_colours(channels):
+    """
+    Assign a colour to each channel in order, with 'other' in black for the combined
+    arrays. Unlike retrieve_data.assign_colours this keeps no state between calls, so
+    every figure rendered by a process gets the same colours.
+    :param channels: list of channel names.
+    :return: colour_dictionary: dictionary of channel to colour.
+    """
+    if len(channels) > len(channel_colours):
+        raise Exception('There are only {} channel colours for {} channels.'.format(
+            len(channel_colours), len(channels)))
+    colour_dictionary = {'other': '#000000'}
+    colour_dictionary.update(zip(channels, channel_colours))
+    return colour_dictionary
+
+
+def plot_channel_lines(axes, freq, block, colours, labels=None, **kwargs):
+    """
+    Draw a line for every channel on an axes as a single LineCollection, which is much
+    faster to draw than a plot call per channel.
+    :param axes: the matplotlib axes to draw on.
+    :param freq: 1D array of frequencies, shared by all channels.
+    :param block: 2D array of channel x frequency values, or a list of 1D arrays.
+    :param colours: list of colours, one per channel.
+    :param labels: optional list of legend labels, one per channel. Legend entries are
+    added as empty lines so the legend shows every channel.
+    :param kwargs: other LineCollection properties, eg. linewidths.
+    :return: the LineCollection, or None if there are no channels.
+    """
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
+    if len(block) == 0:  # no channels to draw yet.
+        return None
+    block = np.atleast_2d(np.asarray(block, dtype=float))
+    segments = np.empty(block.shape + (2,))
+    segments[..., 0] = np.asarray(freq, dtype=float)
+    segments[..., 1] = block
+    lines = LineCollection(segments, colors=colours, **kwargs)
+    axes.add_collection(lines)
+    axes.autoscale_view()
+    if labels is not None:
+        for colour, label in zip(colours, labels):
+            axes.add_line(Line2D([], [], color=colour, label=label))
+    return lines
+
+
+def render_figure(render_function, job):
+    """
+    Render one figure in a worker process.
+    :param render_function: a module level function that draws and saves one figure.
+    :param job: dictionary of keyword arguments for render_function, with the path the
+    figure is saved to as figure_filename.
+    :return: the figure_filename of the job. The figure itself is not sent back.
+    """
+    render_function(**job)
+    return job.get('figure_filename')
+
+
+def render_figures(render_function, jobs, max_workers=None):
+    """
+    Render many figures at once in worker processes using the Agg backend.
+    :param render_function: a module level function that draws and saves one figure,
+    such as site_plots.plot_data with a figure_filename.
+    :param jobs: list of dictionaries of keyword arguments for each call of
+    render_function.
+    :param max_workers: number of worker processes, the number of CPUs by default.
+    :return: list of the figure_filename of each job, in order.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=use_headless_backend) as executor:
+        futures = [executor.submit(render_figure, render_function, job) for job in jobs]
+        return [future.result() for future in futures]
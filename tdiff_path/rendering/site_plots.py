@@ -0,0 +1,358 @@
+#!/usr/bin/python3
+
+# site_plots.py
+# Figures of a site visit dataset from the working dataframe built by
+# site_analysis.analyse_site, as shown in the presentation notebooks.
+
+import math
+
+from rendering.rendering import plot_channel_lines, get_channel_colours
+
+
+def get_channel_block(working_dataframe, channels, column_suffix):
+    """
+    :param working_dataframe: dataframe with a column for each channel and field.
+    :param channels: list of channel names.
+    :param column_suffix: the field, eg. 'phase_deg'.
+    :return: 2D array of channel x frequency of the field.
+    """
+    return working_dataframe[[channel + column_suffix for channel in channels]].to_numpy(
+        dtype=float).T
+
+
+def plot_fit_offsets(axes, freq, channels, colour_dictionary, linear_fit_dict):
+    """
+    Plot the offset of each channel from its own line of best fit.
+    :param axes: the axes to plot on.
+    :param freq: the frequencies.
+    :param channels: list of channel names.
+    :param colour_dictionary: dictionary of channel to colour.
+    :param linear_fit_dict: linear fit dictionary of each channel.
+    """
+    if not channels:
+        return
+    plot_channel_lines(axes, freq, [linear_fit_dict[channel]['offset_of_best_fit_rads'] *
+                                    180.0 / math.pi for channel in channels],
+                       [colour_dictionary[channel] for channel in channels],
+                       ['{}, delay={} ns'.format(channel, round(
+                           linear_fit_dict[channel]['time_delay_ns'], 1)) for channel in
+                        channels])
+
+
+def save_figure(fig, figure_filename):
+    """
+    Save a figure to file and close it to free its memory.
+    :param fig: the figure.
+    :param figure_filename: path to save to, or None to leave the figure open.
+    """
+    if figure_filename is None:
+        return
+    import matplotlib.pyplot as plt
+    fig.savefig(figure_filename)
+    plt.close(fig)
+
+
+def plot_data(working_dataframe, channels, plot_title, colour_dictionary,
+              linear_fit_dict, missing_data, data_description, figure_filename=None,
+              verbose=True, return_figure=False):
+    """
+    Plot the phase of all channels, each channel's offset from its line of best fit, the
+    combined arrays, and the time difference between arrays.
+    :param working_dataframe: dataframe from site_analysis.analyse_site.
+    :param channels: list of channel names.
+    :param plot_title: title of the figure.
+    :param colour_dictionary: dictionary of channel to colour, and 'other'.
+    :param linear_fit_dict: linear fit dictionary of each channel and combined array.
+    :param missing_data: list of channels with no data.
+    :param data_description: description of the data.
+    :param figure_filename: if given, save the figure to this path and close it.
+    :param verbose: print the missing data and data description.
+    :param return_figure: return the figure. It is not returned by default so that a
+    notebook cell ending with this call does not show the figure twice.
+    :return: the figure if return_figure, otherwise None.
+    """
+    import matplotlib.pyplot as plt
+
+    # PLOTTING
+    numplots = 5
+    plot_num = 0
+    fig, smpplot = plt.subplots(numplots, 1, sharex='all', figsize=(12, 12),
+                                gridspec_kw={'height_ratios': [1, 2, 2, 1, 1]})
+    xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
+    smpplot[numplots - 1].set_xlabel('Frequency (Hz)', size=20.0)
+    if verbose:
+        print("plotting")
+    smpplot[plot_num].set_title(plot_title, size=24.0)
+    freq = working_dataframe.loc[:, 'freq']
+
+    # PLOT: Phase wrapped of all data
+    plot_channel_lines(smpplot[plot_num], freq,
+                       get_channel_block(working_dataframe, channels, 'phase_deg'),
+                       [colour_dictionary[channel] for channel in channels], channels)
+    smpplot[plot_num].set_ylabel('Phase\nAll Channels', size=10.0)
+    plot_num += 1
+
+    combined_main_prefix = None
+    combined_intf_prefix = None
+    array_diff_column = None
+    if 'M_all_phase_deg_unwrap' in working_dataframe.columns:
+        combined_main_prefix = 'M_all_'
+    elif 'M_combinedphase_deg_unwrap' in working_dataframe.columns:
+        combined_main_prefix = 'M_combined'
+
+    if 'I_all_phase_deg_unwrap' in working_dataframe.columns:
+        combined_intf_prefix = 'I_all_'
+    elif 'I_combinedphase_deg_unwrap' in working_dataframe.columns:
+        combined_intf_prefix = 'I_combined'
+
+    if 'M_all_phase_deg_unwrap' in working_dataframe.columns and 'I_all_phase_deg_unwrap' in \
+            working_dataframe.columns:
+        array_diff_column = 'array_diff_time_ns'
+    elif 'M_combinedphase_deg_unwrap' and 'I_combinedphase_deg_unwrap' in working_dataframe.columns:
+        array_diff_column = 'tested_array_diff_time_ns'
+
+    # PLOT: Main Array Offset from their Best Fit Lines, and Intf Array
+    plot_fit_offsets(smpplot[plot_num], freq, [channel for channel in channels if
+                                               channel[0] == 'M'], colour_dictionary,
+                     linear_fit_dict)
+    plot_fit_offsets(smpplot[plot_num + 1], freq, [channel for channel in channels if
+                                                   channel[0] == 'I'], colour_dictionary,
+                     linear_fit_dict)
+
+    if combined_main_prefix:
+        smpplot[plot_num].plot(freq, linear_fit_dict[combined_main_prefix][
+            'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
+                               label='Combined Main, delay={} ns'.format(round(linear_fit_dict[
+                                                                                   combined_main_prefix][
+                                                                                   'time_delay_ns'],
+                                                                               1)))  # plot last
+    if combined_intf_prefix:
+        smpplot[plot_num + 1].plot(freq, linear_fit_dict[combined_intf_prefix][
+            'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
+                                   label='Combined Intf, delay={} ns'.format(round(linear_fit_dict[
+                                                                                       combined_intf_prefix][
+                                                                                       'time_delay_ns'],
+                                                                                   1)))  # plot last
+
+    box = smpplot[plot_num].get_position()
+    smpplot[plot_num].set_position([box.x0, box.y0 + box.height * 0.37,
+                                    box.width, box.height * 0.63])
+    smpplot[plot_num].legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                             fancybox=True, shadow=True, ncol=5, fontsize=9)
+    box = smpplot[plot_num + 1].get_position()
+    smpplot[plot_num + 1].set_position([box.x0, box.y0 + box.height * 0.15,
+                                        box.width, box.height * 0.85])
+    smpplot[plot_num + 1].legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                                 fancybox=True, shadow=True, ncol=5, fontsize=9)
+
+    smpplot[plot_num].set_ylabel('Main Array Offsets\nfrom Fit ['
+                                 'degrees]', size=10.0)
+    smpplot[plot_num + 1].set_ylabel('Intf Array Offsets\n from Fit [degrees]', size=10.0)
+    plot_num += 2
+
+    if combined_main_prefix:
+        # PLOT: combined arrays dB and phase.
+        smpplot[plot_num].plot(freq, working_dataframe.loc[:, combined_main_prefix + 'phase_deg'],
+                               color='#2942a8', label='Main Array')
+
+    if combined_intf_prefix:
+        smpplot[plot_num].plot(freq, working_dataframe.loc[:, combined_intf_prefix + 'phase_deg'],
+                               color='#8ba1fa', label='Intf Array')
+
+    db_smpplot = smpplot[plot_num].twinx()
+
+    if combined_main_prefix:
+        db_smpplot.plot(freq, working_dataframe.loc[:, combined_main_prefix + 'magnitude'],
+                        color='#bd3f3f', label='Main Array')
+
+    if combined_intf_prefix:
+        db_smpplot.plot(freq, working_dataframe.loc[:, combined_intf_prefix + 'magnitude'],
+                        color='#f99191', label='Intf Array')
+
+    smpplot[plot_num].set_ylabel('Array Phase\n[degrees]', color='#3352cd',
+                                 size=10.0)
+    # blue
+    smpplot[plot_num].tick_params(axis='y', labelcolor='#3352cd')
+
+    # from antenna to feedline end at building.
+    db_smpplot.set_ylabel('Combined\nArray [dB]', color='#de4b4b', size=10.0)  # red
+    db_smpplot.tick_params(axis='y', labelcolor='#de4b4b')
+    # referenced to power at a single antenna
+    plot_num += 1
+
+    if array_diff_column:
+        # PLOT: Time difference between arrays single direction TODO this is not 1 direction
+        smpplot[plot_num].plot(freq, working_dataframe.loc[:, array_diff_column], )
+    smpplot[plot_num].set_ylabel('Time Delay\nBetween Arrays [ns]', size=10.0)
+    plot_num += 1
+
+    if verbose:
+        if missing_data:  # not empty
+            missing_data_statement = "***MISSING DATA FROM CHANNEL(S) "
+            for element in missing_data:
+                missing_data_statement = missing_data_statement + element + " "
+            print(missing_data_statement)
+
+        if data_description:
+            print(data_description)
+
+    for plot in range(0, numplots):
+        smpplot[plot].grid()
+
+    save_figure(fig, figure_filename)
+    if return_figure:
+        return fig
+
+
+def plot_transmitter_path(working_dataframe, channels, plot_title, colour_dictionary,
+                          linear_fit_dict, missing_data, data_description,
+                          figure_filename=None, verbose=True, return_figure=False):
+    """
+    Plot the phase of all channels, the combined arrays, the time difference between
+    arrays and each channel's offset from its line of best fit, for transmitter path
+    data with both arrays.
+    :param working_dataframe: dataframe from site_analysis.analyse_site.
+    :param channels: list of channel names.
+    :param plot_title: title of the figure.
+    :param colour_dictionary: dictionary of channel to colour, and 'other'.
+    :param linear_fit_dict: linear fit dictionary of each channel and combined array.
+    :param missing_data: list of channels with no data.
+    :param data_description: description of the data.
+    :param figure_filename: if given, save the figure to this path and close it.
+    :param verbose: print the missing data and data description.
+    :param return_figure: return the figure. It is not returned by default so that a
+    notebook cell ending with this call does not show the figure twice.
+    :return: the figure if return_figure, otherwise None.
+    """
+    import matplotlib.pyplot as plt
+
+    # PLOTTING
+    numplots = 6
+    plot_num = 0
+    fig, smpplot = plt.subplots(numplots, 1, sharex='all', figsize=(12, 12),
+                                gridspec_kw={'height_ratios': [1, 1, 1, 2, 1.5, 1]})
+    xmin, xmax, ymin, ymax = smpplot[0].axis(xmin=8e6, xmax=20e6)
+    smpplot[numplots - 1].set_xlabel('Frequency (Hz)', size=20.0)
+    if verbose:
+        print("plotting")
+    smpplot[plot_num].set_title(plot_title, size=24.0)
+    freq = working_dataframe.loc[:, 'freq']
+    phase_block = get_channel_block(working_dataframe, channels, 'phase_deg')
+    channel_colours = [colour_dictionary[channel] for channel in channels]
+
+    # PLOT: Phase wrapped of all data
+    plot_channel_lines(smpplot[plot_num], freq, phase_block, channel_colours, channels)
+    smpplot[plot_num].set_ylabel('Phase All\nChannels [degrees]', size=10.0)
+    plot_num += 1
+
+    # PLOT: combined arrays dB and phase.
+    smpplot[plot_num].plot(freq, working_dataframe.loc[:, 'M_all_phase_deg'],
+                           color='#2942a8', label='Main Array')
+
+    smpplot[plot_num].plot(freq, working_dataframe.loc[:, 'I_all_phase_deg'],
+                           color='#8ba1fa', label='Intf Array')
+
+    db_smpplot = smpplot[plot_num].twinx()
+
+    db_smpplot.plot(freq, working_dataframe.loc[:, 'M_all_magnitude'],
+                    color='#bd3f3f', label='Main Array')
+    db_smpplot.plot(freq, working_dataframe.loc[:, 'I_all_magnitude'],
+                    color='#f99191', label='Intf Array')
+
+    smpplot[plot_num].set_ylabel('Array Phase\n[degrees]', color='#3352cd',
+                                 size=10.0)
+    # blue
+    smpplot[plot_num].tick_params(axis='y', labelcolor='#3352cd')
+
+    # from antenna to feedline end at building.
+    db_smpplot.set_ylabel('Combined\nArray [dB]', color='#de4b4b', size=10.0)  # red
+    db_smpplot.tick_params(axis='y', labelcolor='#de4b4b')
+    # referenced to power at a single antenna
+    plot_num += 1
+
+    # PLOT: Time difference between arrays single direction TODO this is not 1 direction
+    smpplot[plot_num].set_ylabel('Time Delay\nBetween Arrays [ns]', size=10.0)
+    smpplot[plot_num].plot(freq, working_dataframe.loc[:, 'array_diff_time_ns'], )
+    plot_num += 1
+
+    # PLOT: Main Array Offset from their Best Fit Lines, and Intf Array
+    plot_fit_offsets(smpplot[plot_num], freq, [channel for channel in channels if
+                                               channel[0] == 'M'], colour_dictionary,
+                     linear_fit_dict)
+    plot_fit_offsets(smpplot[plot_num + 1], freq, [channel for channel in channels if
+                                                   channel[0] == 'I'], colour_dictionary,
+                     linear_fit_dict)
+
+    smpplot[plot_num].plot(freq, linear_fit_dict['M_all_'][
+        'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
+                           label='Combined Main, delay={} ns'.format(round(linear_fit_dict[
+                                                                               'M_all_'][
+                                                                               'time_delay_ns'],
+                                                                           1)))  # plot last
+    smpplot[plot_num + 1].plot(freq, linear_fit_dict['I_all_'][
+        'offset_of_best_fit_rads'] * 180.0 / math.pi, color=colour_dictionary['other'],
+                               label='Combined Intf, delay={} ns'.format(round(linear_fit_dict[
+                                                                                   'I_all_'][
+                                                                                   'time_delay_ns'],
+                                                                               1)))  # plot last
+
+    box = smpplot[plot_num].get_position()
+    smpplot[plot_num].set_position([box.x0, box.y0 + box.height * 0.37,
+                                    box.width, box.height * 0.63])
+    smpplot[plot_num].legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                             fancybox=True, shadow=True, ncol=5, fontsize=9)
+    box = smpplot[plot_num + 1].get_position()
+    smpplot[plot_num + 1].set_position([box.x0, box.y0 + box.height * 0.15,
+                                        box.width, box.height * 0.85])
+    smpplot[plot_num + 1].legend(loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                                 fancybox=True, shadow=True, ncol=5, fontsize=9)
+
+    smpplot[plot_num].set_ylabel('Main Array Offsets\nfrom Fit ['
+                                 'degrees]', size=10.0)
+    smpplot[plot_num + 1].set_ylabel('Intf Array Offsets\n from Fit [degrees]', size=10.0)
+    plot_num += 2
+
+    # PLOT: Phase wrapped of all data
+    plot_channel_lines(smpplot[plot_num], freq, phase_block, channel_colours, channels)
+    smpplot[plot_num].set_ylabel('S12 Phase All Antennas', fontsize=10.0)
+
+    if missing_data:  # not empty
+        missing_data_statement = "***MISSING DATA FROM CHANNEL(S) "
+        for element in missing_data:
+            missing_data_statement = missing_data_statement + element + " "
+        if verbose:
+            print(missing_data_statement)
+        fig.text(0.3, 0.02, missing_data_statement, fontsize=7)
+
+    if data_description:
+        if verbose:
+            print(data_description)
+        fig.text(0.3, 0.05, data_description, fontsize=7)
+
+    for plot in range(0, numplots):
+        smpplot[plot].grid()
+
+    save_figure(fig, figure_filename)
+    if return_figure:
+        return fig
+
+
+def render_site_figure(results, plot_title, figure_filename, colour_dictionary=None,
+                       plot_function=plot_data):
+    """
+    Draw and save the figure of a site visit analysis.
+    :param results: dictionary returned by site_analysis.analyse_site.
+    :param plot_title: title of the figure.
+    :param figure_filename: path to save the figure to.
+    :param colour_dictionary: dictionary of channel to colour, by default
+    rendering.get_channel_colours of the channels.
+    :param plot_function: plot_data or plot_transmitter_path.
+    :return: figure_filename.
+    """
+    if colour_dictionary is None:
+        colour_dictionary = get_channel_colours(results['channels'])
+    plot_function(results['working_dataframe'], results['channels'], plot_title,
+                  colour_dictionary, results['linear_fit_dict'], results['missing_data'],
+                  results['data_description'], figure_filename=figure_filename,
+                  verbose=False)
+    return figure_filename
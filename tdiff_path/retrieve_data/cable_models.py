@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+# cable_models.py
+# Registry of cable loss models used to estimate feedline losses across frequency.
+# Models are described by datasheet values in cable_models.json, and more can be added
+# with load_cable_models or register_cable_model without changing any code.
+
+import os
+import json
+import numpy as np
+
+FEET_PER_METRE = 3.2808
+
+default_models_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'cable_models.json')
+cable_models = {}
+
+
+def register_cable_model(cable_type, model):
+    """
+    Add a cable model to the registry, replacing any model with the same cable_type.
+    :param cable_type: name of the cable, e.g. 'Belden8237'.
+    :param model: dictionary describing the model, see cable_models.json.
+    """
+    if model.get('model') not in cable_loss_functions:
+        raise Exception('Cable model {} has unknown model type {}'.format(
+            cable_type, model.get('model')))
+    cable_models[cable_type] = model
+
+
+def load_cable_models(models_file):
+    """
+    Register all cable models in a json file. Keys starting with '_' are comments.
+    :param models_file: path to a json file of cable_type : model.
+    """
+    with open(models_file) as f:
+        models = json.load(f)
+    for cable_type, model in models.items():
+        if cable_type.startswith('_'):
+            continue
+        register_cable_model(cable_type, model)
+
+
+def log_log_loss(model, freq_mhz):
+    """
+    Get the loss per loss_per_length of cable from a log-log fit to datasheet values.
+
+    log(y) = slope * log(x) + intercept, where the slope of each segment is between
+    neighbouring datasheet points. As in the original datasheet fits, every segment uses
+    the intercept of the first segment.
+
+    :param model: log-log model dictionary.
+    :param freq_mhz: numpy array of frequencies in MHz.
+    :return: numpy array of loss in dB per loss_per_length.
+    """
+    log_freq = np.log10(np.asarray(model['freq_mhz'], dtype=float))
+    log_loss = np.log10(np.asarray(model['loss_db'], dtype=float) -
+                        model.get('adjustment_db', 0.0))
+    slopes = np.diff(log_loss) / np.diff(log_freq)
+    intercept = log_loss[0] - slopes[0] * log_freq[0]
+
+    segments = np.searchsorted(np.asarray(model.get('breakpoints_mhz', []), dtype=float),
+                               freq_mhz, side='left')
+    return 10.0 ** (slopes[segments] * np.log10(freq_mhz) + intercept)
+
+
+def sqrt_linear_loss(model, freq_mhz):
+    """
+    Get the loss per loss_per_length of cable from a closed-form datasheet formula,
+    loss = sqrt_coefficient * sqrt(f) + linear_coefficient * f.
+    :param model: sqrt-linear model dictionary.
+    :param freq_mhz: numpy array of frequencies in MHz.
+    :return: numpy array of loss in dB per loss_per_length.
+    """
+    return model['sqrt_coefficient'] * np.sqrt(freq_mhz) + \
+        model['linear_coefficient'] * freq_mhz
+
+
+cable_loss_functions = {'log-log': log_log_loss, 'sqrt-linear': sqrt_linear_loss}
+
+
+def get_cable_loss(ref_freq_list, cable_length, cable_type):
+    """
+    Get the cable loss for every frequency at once.
+    :param ref_freq_list: list or array of frequencies, given in Hz.
+    :param cable_length: given in ft.
+    :param cable_type: the type of cable, a key of the cable model registry.
+    :return: numpy array of loss in dB for each frequency.
+    """
+    try:
+        model = cable_models[cable_type]
+    except KeyError:
+        raise Exception('No cable model set up for that cable type.')
+
+    if model.get('length_unit', 'ft') == 'm':
+        cable_length = cable_length / FEET_PER_METRE
+    freq_mhz = np.asarray(ref_freq_list, dtype=float) * 1.0e-6
+    loss_per_length = cable_loss_functions[model['model']](model, freq_mhz)
+    return cable_length / model.get('loss_per_length', 100.0) * loss_per_length
+
+
+load_cable_models(default_models_file)
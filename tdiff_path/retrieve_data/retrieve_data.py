@@ -1,9 +1,16 @@
+import os
 import json
 import fnmatch
 import sys
-import csv
 import math
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
+import pandas as pd
+
+import retrieve_data.sweep_cache as sweep_cache
+import retrieve_data.cable_models as cable_models
 
 #
 #
@@ -13,6 +20,19 @@ hex_colors = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900',
               '#5500ff', '#a366ff', '#ff00ff', '#e6005c', '#ffaa80', '#999999']
 colour_dictionary = {'other': '#000000'}
 
+# Cable loss arrays already computed, keyed on cable type, length and frequency grid.
+cable_loss_cache = OrderedDict()
+cable_loss_cache_size = 128
+
+# Archive of sweeps to read from before parsing csv files, see sweep_archive.py.
+sweep_archive_directory = os.environ.get('TDIFF_SWEEP_ARCHIVE')
+sweep_archive = None
+
+# fnmatch patterns of the frequency column that starts each sweep in a csv file produced
+# by ZVHView, which is named differently by different versions of ZVHView. The header line
+# of the data starts with this column.
+csv_header_patterns = ['Freq. [Hz*', 'Freq [Hz*', 'Frequency [Hz*']
+
 
 def retrieve_data_from_csv(map_to_files, data_location, header_names):
     """
@@ -40,6 +60,82 @@ def retrieve_data_from_csv(map_to_files, data_location, header_names):
     :return: colour_dictionary: dictionary of antenna to colour. 
     """
 
+    vswr_files = load_file_mapping(map_to_files, header_names)
+
+    channel_files, missing_data, data_description = split_file_mapping(vswr_files)
+    all_data = {}
+    for k, v in channel_files.items():
+        all_data[k] = read_sweep_from_csv(data_location + v, header_names)
+
+    assign_colours(all_data.keys())
+
+    return all_data, colour_dictionary, missing_data, data_description
+
+
+def retrieve_data_from_csv_concurrently(map_to_files, data_location, header_names,
+                                        max_workers=None, use_processes=True):
+    """
+    Get the data from the csv files (filenames given in the json file provided), parsing
+    all files concurrently in a pool of workers. This returns the same results as
+    retrieve_data_from_csv.
+
+    Colours are assigned in the order of the json file once all files are parsed, so
+    they do not depend on the order the workers finish in.
+
+    :param: map_to_files: json file location with map of antenna : file with dataset in
+    csv format.
+    :param: data_location: location of the data files specified in the map_to_files file.
+    :param: header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :param: max_workers: number of workers in the pool, defaults to the number of cpus.
+    :param: use_processes: if True use a process pool, otherwise use a thread pool.
+    :return: all_data: dictionary of antenna to dataset
+    :return: missing_data: list of any antennas with 'dne' values in map_to_files
+    :return: colour_dictionary: dictionary of antenna to colour.
+    """
+
+    vswr_files = load_file_mapping(map_to_files, header_names)
+
+    channel_files, missing_data, data_description = split_file_mapping(vswr_files)
+    all_data = read_sweeps_concurrently(channel_files, data_location, header_names,
+                                        max_workers, use_processes)
+
+    assign_colours(all_data.keys())
+
+    return all_data, colour_dictionary, missing_data, data_description
+
+
+def read_sweeps_concurrently(channel_files, data_location, header_names, max_workers=None,
+                             use_processes=True):
+    """
+    Read the first sweep of many csv files concurrently in a pool of workers, see
+    read_sweep_from_csv. This is for scripts that sort their own file mappings.
+
+    :param: channel_files: dictionary of channel : filename of the csv files to read.
+    :param: data_location: location of the data files.
+    :param: header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :param: max_workers: number of workers in the pool, defaults to the number of cpus.
+    :param: use_processes: if True use a process pool, otherwise use a thread pool.
+    :return: all_data: dictionary of channel to dataset, in the order of channel_files.
+    """
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {k: executor.submit(read_sweep_from_csv, data_location + v,
+                                      header_names) for k, v in channel_files.items()}
+        return {k: future.result() for k, future in futures.items()}
+
+
+def load_file_mapping(map_to_files, header_names):
+    """
+    Load the json file mapping antennas to data files. header_names is modified so that a
+    'phase' dtype is renamed to 'phase_deg'.
+    :param: map_to_files: json file location with map of antenna : file with dataset in
+    csv format.
+    :param: header_names: Dictionary with dtype key and string value to search for in
+    the csv file.
+    :return: vswr_files: dictionary of the json file contents.
+    """
     with open(map_to_files) as f:
         vswr_files = json.load(f)
 
@@ -47,24 +143,23 @@ def retrieve_data_from_csv(map_to_files, data_location, header_names):
     if 'phase' in header_names:
         header_names['phase_deg'] = header_names.pop('phase')
 
-    dtypes = []  # List of dtype names only
-    array_dtypes = []  # List of tuples (name, type) for array creation.
-    for dtype in header_names.keys():
-        dtypes.append(dtype)
-        if dtype == 'freq':
-            value_type = 'i4'
-        else:
-            value_type = 'f4'
-        array_dtypes.append((dtype, value_type))
-        if dtype == 'phase_deg':
-            dtypes.append('phase_rad')
-            array_dtypes.append(('phase_rad', 'f4'))
+    print(get_array_dtypes(header_names))
 
-    print(array_dtypes)
+    return vswr_files
 
+
+def split_file_mapping(vswr_files):
+    """
+    Sort the entries of a json file mapping into the data files to read, the antennas
+    that have no data ('dne'), and the data description ('_comment').
+    :param vswr_files: dictionary of antenna : filename, from the json file.
+    :return: channel_files: dictionary of antenna : filename for files to read.
+    :return: missing_data: list of any antennas with 'dne' values.
+    :return: data_description: the '_comment' value, or an empty list if none.
+    """
     data_description = []
     missing_data = []
-    all_data = {}
+    channel_files = {}
     for k, v in vswr_files.items():
         if k == '_comment':
             data_description = v
@@ -72,48 +167,239 @@ def retrieve_data_from_csv(map_to_files, data_location, header_names):
         if v == 'dne':
             missing_data.append(k)
             continue
-        with open(data_location + v, 'r') as csvfile:
-            for line in csvfile:
-                if fnmatch.fnmatch(line, 'Freq. [Hz*'):  # skip to header
-                    break
-            else:  # no break
-                sys.exit('No Data in file {}'.format(v))
-            row = line.split(',')
-            dtype_to_column = {}
-            for dtype, dtype_string in header_names.items():
-                try:
-                    matching_columns = [i for i in range(len(row)) if
-                                    fnmatch.fnmatch(row[i], dtype_string)]
-                    first_column = matching_columns[0]
-                    dtype_to_column[dtype] = first_column
-                except:
-                    sys.exit('Cannot find {dtype} data.'.format(dtype=dtype))
-            # Only data is remaining.
-            csv_reader = csv.reader(csvfile)
-
-            rawdata = []
-            for row in csv_reader:
-                values = []  # order of data determined by dtypes list.
-                for dtype in dtypes:
-                    if dtype == 'phase_rad':
-                        value = degrees_to_radians(float(row[dtype_to_column[
-                            'phase_deg']]))
-                    else:
-                        value = float(row[dtype_to_column[dtype]])
-                    values.append(value)
-                rawdata.append((tuple(values)))
-            rawdata = np.array(rawdata, dtype=array_dtypes)
-
-            # All keys should start with M or I to indicate which array they are from.
-            if k[0] == 'M' or k[0] == 'I':
-                all_data[k] = rawdata
-            else:
-                sys.exit('There is an invalid key {}'.format(k))
-
-            colour_dictionary[k] = hex_colors[0]
-            hex_colors.remove(colour_dictionary[k])
+        # All keys should start with M or I to indicate which array they are from.
+        if k[0] == 'M' or k[0] == 'I':
+            channel_files[k] = v
+        else:
+            sys.exit('There is an invalid key {}'.format(k))
+    return channel_files, missing_data, data_description
+
+
+def assign_colours(antennas):
+    """
+    Assign the next available colour to each antenna, in the order given.
+    :param antennas: iterable of antenna names.
+    :return: colour_dictionary: dictionary of antenna to colour.
+    """
+    for k in antennas:
+        colour_dictionary[k] = hex_colors[0]
+        hex_colors.remove(colour_dictionary[k])
+    return colour_dictionary
 
-    return all_data, colour_dictionary, missing_data, data_description
+
+def get_array_dtypes(header_names):
+    """
+    Get the structured array dtypes for the data retrieved with the given header_names.
+    A phase_rad dtype is added after phase_deg if phase_deg is retrieved.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :return: array_dtypes: list of tuples (name, type) for array creation.
+    """
+    array_dtypes = []
+    for dtype in header_names.keys():
+        if dtype == 'freq':
+            value_type = 'i4'
+        else:
+            value_type = 'f4'
+        array_dtypes.append((dtype, value_type))
+        if dtype == 'phase_deg':
+            array_dtypes.append(('phase_rad', 'f4'))
+    return array_dtypes
+
+
+def is_frequency_header(column_name):
+    """
+    :param column_name: a csv column name, or a whole line of a csv file.
+    :return: True if it starts with the frequency column that starts each sweep in a csv
+    file produced by ZVHView, see csv_header_patterns.
+    """
+    return any(fnmatch.fnmatch(column_name.strip(), header_pattern) for header_pattern in
+               csv_header_patterns)
+
+
+def find_csv_header(csvfile):
+    """
+    Skip an open csv file forward to the header line, past the setup information that
+    is at the top of a csv produced by ZVHView.
+    :param csvfile: open csv file object, which will be left positioned at the first
+    line of data after the header.
+    :return: header_row: list of the column names in the header.
+    """
+    for line in csvfile:
+        if is_frequency_header(line):  # skip to header
+            return line.rstrip('\r\n').split(',')
+    sys.exit('No Data in file {}'.format(csvfile.name))
+
+
+def split_sweeps(header_row):
+    """
+    Split the columns of a csv header into the sweeps recorded side by side. Each sweep
+    starts with a frequency column, see is_frequency_header.
+
+    Freq. [Hz], VSWR, Phase [],,Freq. [Hz],Phase[],VSWR,, ...
+
+    :param header_row: list of the column names in the header.
+    :return: list of (first column, end column) of each sweep, where the end column is
+    the first column of the next sweep.
+    """
+    sweep_starts = [i for i in range(len(header_row)) if
+                    is_frequency_header(header_row[i])]
+    return list(zip(sweep_starts, sweep_starts[1:] + [len(header_row)]))
+
+
+def find_sweep_columns(header_row, header_names):
+    """
+    Find the columns of every sweep in a csv header that has all of the header names.
+    :param header_row: list of the column names in the header.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :return: list of dictionaries of dtype to column number, one per sweep.
+    """
+    sweep_columns = []
+    for sweep_start, sweep_end in split_sweeps(header_row):
+        dtype_to_column = {}
+        for dtype, dtype_string in header_names.items():
+            matching_columns = [i for i in range(sweep_start, sweep_end) if
+                                fnmatch.fnmatch(header_row[i].strip(), dtype_string)]
+            if matching_columns:
+                dtype_to_column[dtype] = matching_columns[0]
+        if len(dtype_to_column) == len(header_names):  # skip incomplete sweeps.
+            sweep_columns.append(dtype_to_column)
+    return sweep_columns
+
+
+def set_sweep_archive(archive_directory):
+    """
+    Set the sweep archive that the readers in this module read from before parsing csv
+    files, for this process.
+    :param archive_directory: path to an archive made with sweep_archive.py, or None to
+    always read the csv files.
+    """
+    global sweep_archive_directory, sweep_archive
+    sweep_archive_directory = archive_directory
+    sweep_archive = None
+
+
+def get_sweep_archive():
+    """
+    :return: the SweepArchive set with set_sweep_archive or the TDIFF_SWEEP_ARCHIVE
+    environment variable, opened on first use, or None if there is none.
+    """
+    global sweep_archive
+    if sweep_archive is None and sweep_archive_directory:
+        from retrieve_data.sweep_archive import SweepArchive
+        sweep_archive = SweepArchive(sweep_archive_directory)
+    return sweep_archive
+
+
+def lookup_archived_sweep(csv_path):
+    """
+    :param csv_path: path to a csv file.
+    :return: the index record of the first sweep of the csv file in the sweep archive,
+    or None if there is no archive or the file is not archived.
+    """
+    archive = get_sweep_archive()
+    if archive is None:
+        return None
+    return archive.lookup_path(csv_path)
+
+
+def read_sweep_from_csv(csv_path, header_names):
+    """
+    Read the first sweep with all of the header names from a single csv file produced by
+    ZVHView into a structured numpy array. The sweep is read from the sweep archive if
+    the file is archived, or taken from the sweep cache if the file has been parsed
+    before.
+    :param csv_path: path to the csv file.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :return: rawdata: structured numpy array with the dtypes from get_array_dtypes.
+    """
+    record = lookup_archived_sweep(csv_path)
+    if record is not None:
+        archive = get_sweep_archive()
+        for sweep_record in archive.get_file_sweeps(record):
+            if archive.has_columns(sweep_record, header_names):
+                return archive.read_sweep(sweep_record, header_names)
+        sys.exit('Cannot find a sweep with {} data in {}.'.format(
+            list(header_names.keys()), csv_path))
+    return sweep_cache.cached_sweep(csv_path, header_names, parse_sweep_from_csv)
+
+
+def read_columns_from_csv(csv_path, column_names):
+    """
+    Read the named columns of the first sweep from a single csv file produced by ZVHView
+    into a dataframe. The columns are read from the sweep archive if the file is
+    archived, or taken from the sweep cache if the file has been parsed before.
+    :param csv_path: path to the csv file.
+    :param column_names: list of exact header names of the columns to read, e.g.
+    ['Freq. [Hz]', 'VSWR [(VSWR)]', 'Phase []']
+    :return: dataframe with the given columns.
+    """
+    record = lookup_archived_sweep(csv_path)
+    if record is not None:
+        return pd.DataFrame(get_sweep_archive().read_columns(record, column_names))
+    return pd.DataFrame(sweep_cache.cached_sweep(csv_path, column_names,
+                                                 parse_columns_from_csv))
+
+
+def parse_columns_from_csv(csv_path, column_names):
+    """
+    Parse the named columns of the first sweep from a single csv file produced by
+    ZVHView. Where a column name is repeated for multiple sweeps, the first is used.
+    :param csv_path: path to the csv file.
+    :param column_names: list of exact header names of the columns to read.
+    :return: structured numpy array with a float dtype for each column name.
+    """
+    with open(csv_path, 'r') as csvfile:
+        row = find_csv_header(csvfile)
+        try:
+            columns = [row.index(column_name) for column_name in column_names]
+        except ValueError:
+            sys.exit('Cannot find columns {} in {}.'.format(column_names, csv_path))
+        sweep = pd.read_csv(csvfile, header=None, names=list(range(len(row))),
+                            usecols=sorted(set(columns)), engine='c')
+
+    sweep = sweep.apply(pd.to_numeric, errors='coerce').dropna()
+
+    rawdata = np.empty(len(sweep), dtype=[(column_name, 'f8') for column_name in
+                                          column_names])
+    for column_name, column in zip(column_names, columns):
+        rawdata[column_name] = sweep[column].to_numpy()
+    return rawdata
+
+
+def parse_sweep_from_csv(csv_path, header_names):
+    """
+    Parse the first sweep with all of the header names from a single csv file produced by
+    ZVHView into a structured numpy array, so every column is from the same sweep. Only
+    the columns required are parsed, all at once.
+    :param csv_path: path to the csv file.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :return: rawdata: structured numpy array with the dtypes from get_array_dtypes.
+    """
+    with open(csv_path, 'r') as csvfile:
+        row = find_csv_header(csvfile)
+        sweep_columns = find_sweep_columns(row, header_names)
+        if not sweep_columns:
+            sys.exit('Cannot find a sweep with {} data in {}.'.format(
+                list(header_names.keys()), csv_path))
+        dtype_to_column = sweep_columns[0]
+        # Only data is remaining.
+        sweep = pd.read_csv(csvfile, header=None, names=list(range(len(row))),
+                            usecols=sorted(set(dtype_to_column.values())), engine='c')
+
+    # Drop any rows that are not complete numeric data, such as trailing lines.
+    sweep = sweep.apply(pd.to_numeric, errors='coerce').dropna()
+
+    rawdata = np.empty(len(sweep), dtype=get_array_dtypes(header_names))
+    for dtype, column in dtype_to_column.items():
+        rawdata[dtype] = sweep[column].to_numpy()
+    if 'phase_deg' in dtype_to_column:
+        rawdata['phase_rad'] = sweep[dtype_to_column['phase_deg']].to_numpy() * \
+            math.pi / 180.0
+    return rawdata
 
 
 def degrees_to_radians(phase):
@@ -124,34 +410,35 @@ def degrees_to_radians(phase):
 
 def get_cable_loss_array(ref_freq_list, cable_length, cable_type):
     """
-    Call the corresponding function depending on the cable type provided, then return 
-    the dataset with cable loss.
+    Get the cable loss dataset for the cable type provided from the cable model
+    registry in cable_models. Cable types can be added to cable_models.json.
+
+    Results are memoized on cable type, cable length and frequency grid, keeping the
+    cable_loss_cache_size most recently used. The returned array is read-only because
+    it is shared between all callers asking for the same cable loss.
+
     :param ref_freq_list:  list of frequencies to generate a numpy array for, given in Hz.
     :param cable_length: given in ft. 
     :param cable_type: the type of cable to create the cable loss dataset for. 
     :return: cable_loss_dataset, an array with dtypes freq (in Hz) and loss (in dB) 
     """
-    if cable_type == 'Belden8237':
-        cable_loss_dataset = create_belden_8237_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    elif cable_type == 'Belden8214':
-        cable_loss_dataset = create_belden_8214_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    elif cable_type == 'Belden9913':
-        cable_loss_dataset = create_belden_9913_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    elif cable_type == 'LMR400':
-        cable_loss_dataset = create_lmr400_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    elif cable_type == 'C1180':
-        cable_loss_dataset = create_carol_c1180_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    elif cable_type == 'EC400':
-        cable_loss_dataset = create_eupen_ec400_cable_loss_array(ref_freq_list,
-                                                                 cable_length)
-    else:
-        raise Exception('No cable model set up for that cable type.')
-
+    ref_freq_array = np.ascontiguousarray(ref_freq_list, dtype=float)
+    cache_key = (cable_type, float(cable_length),
+                 hashlib.sha1(ref_freq_array.tobytes()).hexdigest())
+    if cache_key in cable_loss_cache:
+        cable_loss_cache.move_to_end(cache_key)
+        return cable_loss_cache[cache_key]
+
+    cable_loss = cable_models.get_cable_loss(ref_freq_array, cable_length, cable_type)
+
+    cable_loss_dataset = np.empty(len(cable_loss), dtype=[('freq', 'i4'), ('loss', 'f4')])
+    cable_loss_dataset['freq'] = ref_freq_array
+    cable_loss_dataset['loss'] = cable_loss
+    cable_loss_dataset.flags.writeable = False
+
+    cable_loss_cache[cache_key] = cable_loss_dataset
+    if len(cable_loss_cache) > cable_loss_cache_size:
+        cable_loss_cache.popitem(last=False)
     return cable_loss_dataset
 
 
@@ -163,16 +450,7 @@ def create_lmr400_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft. 
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # using the formula provided by the datasheet, implemented below.
-    cable_loss = [cable_length/100.0 * (0.122290 * math.sqrt(freq * 1.0e-6) + 0.000260 *
-                                      freq * 1.0e-6) for freq in ref_freq_list]
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'LMR400')
 
 
 def create_belden_8214_cable_loss_array(ref_freq_list, cable_length):
@@ -183,29 +461,7 @@ def create_belden_8214_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft. 
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # do a log-log fit with given values from datasheet:
-    # 1 MHz: 0.1 dB/100ft
-    # 10 MHz: 0.5 dB/100ft
-    # 50 MHz: 1.2 dB/100ft
-    # log(y) = slope * log(x) + intercept
-    slope_1 = math.log(0.5/0.1, 10.0) / math.log(10.0/1.0, 10.0)
-    slope_2 = math.log(1.2/0.5, 10.0) / math.log(50.0/10.0, 10.0)
-    intercept = math.log(0.1, 10.0) - slope_1 * math.log(1.0, 10.0)
-
-    #print('Slopes: {slope_1}, {slope_2}'.format(slope_1=slope_1, slope_2=slope_2))
-
-    cable_loss = [cable_length/100.0 * 10.0 ** (slope_1 * math.log(freq * 1.0e-6, 10.0) +
-                  intercept) for freq in ref_freq_list if freq <= 10000000]
-    cable_loss_2 = [cable_length/100.0 * 10.0**(slope_2 * math.log(freq * 1.0e-6, 10.0) +
-                    intercept) for freq in ref_freq_list if freq > 10000000]
-    cable_loss.extend(cable_loss_2)
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'Belden8214')
 
 
 def create_belden_9913_cable_loss_array(ref_freq_list, cable_length):
@@ -216,32 +472,7 @@ def create_belden_9913_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft. 
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # do a log-log fit with given values from datasheet:
-    # 5 MHz: 1.312 dB/100m
-    # 10 MHz: 1.641 dB/100m
-    # 50 MHz: 3.281 dB/100m
-    # log(y) = slope * log(x) + intercept
-    slope_1 = math.log(1.641/1.312, 10.0) / math.log(10.0/5.0, 10.0)
-    slope_2 = math.log(3.281/1.641, 10.0) / math.log(50.0/10.0, 10.0)
-    intercept = math.log(1.312, 10.0) - slope_1 * math.log(5.0, 10.0)
-
-    #print('Slopes: {slope_1}, {slope_2}'.format(slope_1=slope_1, slope_2=slope_2))
-
-    cable_length = cable_length/3.2808  # convert to metres because these attenuation
-    # values are in metres.
-
-    cable_loss = [cable_length/100.0 * 10.0 ** (slope_1 * math.log(freq * 1.0e-6, 10.0) +
-                  intercept) for freq in ref_freq_list if freq <= 10000000]
-    cable_loss_2 = [cable_length/100.0 * 10.0 **(slope_2 * math.log(freq * 1.0e-6, 10.0) +
-                    intercept) for freq in ref_freq_list if freq > 10000000]
-    cable_loss.extend(cable_loss_2)
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'Belden9913')
 
 
 def create_belden_8237_cable_loss_array(ref_freq_list, cable_length):
@@ -252,28 +483,7 @@ def create_belden_8237_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft. 
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # do a log-log fit with given values from datasheet:
-    # 1 MHz: 0.2 dB/100ft
-    # 10 MHz: 0.6 dB/100ft
-    # 50 MHz: 1.3 dB/100ft
-    # log(y) = slope * log(x) + intercept
-    slope_1 = math.log(0.6/0.2, 10.0) / math.log(10.0/1.0, 10.0)
-    slope_2 = math.log(1.3/0.6, 10.0) / math.log(50.0/10.0, 10.0)
-    intercept = math.log(0.2, 10.0) - slope_1 * math.log(1.0, 10.0)
-
-    #print('Slopes: {slope_1}, {slope_2}'.format(slope_1=slope_1, slope_2=slope_2))
-    cable_loss = [cable_length/100.0 * (10.0**(slope_1 * math.log(freq * 1.0e-6, 10.0) +
-                  intercept)) for freq in ref_freq_list if freq <= 10000000]
-    cable_loss_2 = [cable_length/100.0*(10.0**(slope_2 * math.log(freq * 1.0e-6, 10.0) +
-                    intercept)) for freq in ref_freq_list if freq > 10000000]
-    cable_loss.extend(cable_loss_2)
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'Belden8237')
 
 
 def create_carol_c1180_cable_loss_array(ref_freq_list, cable_length):
@@ -284,34 +494,7 @@ def create_carol_c1180_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft. 
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # do a log-log fit with given values from datasheet:
-    # 1 MHz: 0.13 dB/100ft
-    # 10 MHz: 0.4 dB/100ft
-    # 50 MHz: 0.9 dB/100ft
-    # log(y) = slope * log(x) + intercept
-
-    adjustment_factor = 0.02
-    ref_1_mhz = 0.13 - adjustment_factor
-    ref_10_mhz = 0.4 - adjustment_factor
-    ref_50_mhz = 0.9 - adjustment_factor
-
-    slope_1 = math.log(ref_10_mhz/ref_1_mhz, 10.0) / math.log(10.0/1.0, 10.0)
-    slope_2 = math.log(ref_50_mhz/ref_10_mhz, 10.0) / math.log(50.0/10.0, 10.0)
-    intercept = math.log(ref_1_mhz, 10.0) - slope_1 * math.log(1.0, 10.0)
-
-    #print('Slopes: {slope_1}, {slope_2}'.format(slope_1=slope_1, slope_2=slope_2))
-    cable_loss = [cable_length/100.0 * (10.0 ** (slope_1 * math.log(freq * 1.0e-6, 10.0) +
-                  intercept)) for freq in ref_freq_list if freq <= 10000000]
-    cable_loss_2 = [cable_length/100.0*(10.0**(slope_2 * math.log(freq * 1.0e-6, 10.0) +
-                    intercept)) for freq in ref_freq_list if freq > 10000000]
-    cable_loss.extend(cable_loss_2)
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'C1180')
 
 
 def create_eupen_ec400_cable_loss_array(ref_freq_list, cable_length):
@@ -322,31 +505,4 @@ def create_eupen_ec400_cable_loss_array(ref_freq_list, cable_length):
     :param cable_length: given in ft.
     :return: cable_loss_array, an array with dtypes freq (in Hz) and loss (in dB)
     """
-
-    # do a log-log fit with given values from datasheet:
-    # 10 MHz: 1.3 dB/100m = 0.39624 dB/100ft
-    # 20 MHz: 1.8 dB/100m = 0.54864 dB/100ft
-    # 30 MHz: 2.2 dB/100m = 0.67056 dB/100ft
-    # log(y) = slope * log(x) + intercept
-
-    adjustment_factor = 0.00
-    ref_10_mhz = 0.39624 - adjustment_factor
-    ref_20_mhz = 0.54864 - adjustment_factor
-    ref_30_mhz = 0.67056 - adjustment_factor
-
-    slope_1 = math.log(ref_20_mhz/ref_10_mhz, 10.0) / math.log(20.0/10.0, 10.0)
-    slope_2 = math.log(ref_30_mhz/ref_20_mhz, 10.0) / math.log(30.0/20.0, 10.0)
-    intercept = math.log(ref_10_mhz, 10.0) - slope_1 * math.log(10.0, 10.0)
-
-    #print('Slopes: {slope_1}, {slope_2}'.format(slope_1=slope_1, slope_2=slope_2))
-    cable_loss = [cable_length/100.0 * (10.0 ** (slope_1 * math.log(freq * 1.0e-6, 10.0) +
-                  intercept)) for freq in ref_freq_list if freq <= 10000000]
-    cable_loss_2 = [cable_length/100.0*(10.0**(slope_2 * math.log(freq * 1.0e-6, 10.0) +
-                    intercept)) for freq in ref_freq_list if freq > 10000000]
-    cable_loss.extend(cable_loss_2)
-
-    cable_loss_array = []
-    for freq, loss in zip(ref_freq_list, cable_loss):
-        cable_loss_array.append((freq, loss))
-    cable_loss_array = np.array(cable_loss_array, dtype=[('freq', 'i4'), ('loss', 'f4')])
-    return cable_loss_array
+    return get_cable_loss_array(ref_freq_list, cable_length, 'EC400')
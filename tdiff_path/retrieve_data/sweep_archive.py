@@ -0,0 +1,368 @@
+#!/usr/bin/python3
+
+# sweep_archive.py
+# An append-only archive of every sweep in the csv files named by the site visit file
+# mappings, so historical data can be read without finding and parsing the csv files.
+#
+# The archive is a directory of:
+#     column_<id>.f8 - one file per csv column name (eg. 'VSWR [(VSWR)]') holding the
+#                      values of that column for every archived sweep, one after another,
+#                      as float64. These are read with numpy memory maps, so reading a
+#                      sweep only touches the pages it is in.
+#     index.jsonl    - one line per archived sweep, with its site, date, data type,
+#                      channel, sweep number within the csv file, source csv file, and
+#                      the offset of its values in each column file.
+# Column values are written before their index line, so an interrupted build never
+# leaves an index line pointing at missing data. Only one process should build an
+# archive at a time.
+#
+# Use 'python3 -m retrieve_data.sweep_archive ARCHIVE MANIFEST' from the tdiff_path
+# directory to add every dataset in a manifest (like site_file_metadata.csv) to an
+# archive. Set the environment variable TDIFF_SWEEP_ARCHIVE to an archive directory, or
+# call retrieve_data.set_sweep_archive, for the retrieve_data readers to read from it.
+# Sweeps are found by the path of their csv file, by the file's contents if the Sync
+# tree has moved, or by site, date, data type and channel without the csv files at all.
+
+import os
+import sys
+import json
+import fnmatch
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+import retrieve_data.sweep_cache as sweep_cache
+import site_analysis.site_analysis as site_analysis
+from retrieve_data.retrieve_data import get_array_dtypes, split_sweeps
+from retrieve_data.sweep_stream import find_csv_data_offset
+
+index_filename = 'index.jsonl'
+column_dtype = np.dtype('f8')
+
+# index record fields that archived sweeps can be found by.
+indexed_fields = ['site', 'date', 'data_type', 'channel', 'sweep']
+
+
+def get_column_filename(column_name):
+    """
+    :param column_name: a csv column name, eg. 'VSWR [(VSWR)]'.
+    :return: name of the file in the archive holding this column.
+    """
+    return 'column_{}.f8'.format(hashlib.sha1(column_name.encode()).hexdigest()[:16])
+
+
+def parse_all_sweeps_from_csv(csv_path):
+    """
+    Parse every column of every sweep in a csv file produced by ZVHView. Sweeps are
+    side by side in the file, split as in retrieve_data.split_sweeps.
+    :param csv_path: path to the csv file.
+    :return: list of sweeps, each a list of (column name, float array), in the order of
+    the columns in the file.
+    """
+    header_row, data_offset = find_csv_data_offset(csv_path)
+    with open(csv_path, 'r') as csvfile:
+        csvfile.seek(data_offset)
+        data = pd.read_csv(csvfile, header=None, names=list(range(len(header_row))),
+                           engine='c')
+    data = data.apply(pd.to_numeric, errors='coerce')
+
+    sweeps = []
+    for sweep_start, sweep_end in split_sweeps(header_row):
+        columns = [i for i in range(sweep_start, sweep_end) if header_row[i].strip()]
+        # Drop any rows that are not complete numeric data, such as trailing lines.
+        sweep = data[columns].dropna()
+        if sweep.empty:
+            continue
+        sweeps.append([(header_row[i], sweep[i].to_numpy(dtype=column_dtype)) for i in
+                       columns])
+    return sweeps
+
+
+class SweepArchive(object):
+    """
+    An archive of sweeps, see the top of this file. Sweeps can be found by site, date,
+    data type and channel, or by the path of the csv file they were read from.
+    """
+
+    def __init__(self, archive_directory):
+        """
+        Open an archive. An archive that does not exist yet is empty, and its directory
+        is created when the first file is added.
+        :param archive_directory: the archive directory.
+        """
+        self.archive_directory = archive_directory
+        self.records = []
+        self.indexes = {field: {} for field in indexed_fields}
+        self._source_index = {}  # source path: first sweep of the newest version.
+        self._hash_index = {}  # file hash: first sweep.
+        self._archived_sizes = set()  # sizes of the archived csv files.
+        self._channel_index = {}  # (site, date, data_type, channel): newest first sweep.
+        self._file_sweeps = {}
+        self._memory_maps = {}
+        index_path = os.path.join(archive_directory, index_filename)
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as index_file:
+                for line in index_file:
+                    if line.strip():
+                        self._add_record(json.loads(line))
+
+    def _add_record(self, record):
+        record['date'] = int(record['date'])  # archives from before dates were ints.
+        position = len(self.records)
+        self.records.append(record)
+        for field in indexed_fields:
+            self.indexes[field].setdefault(record[field], []).append(position)
+        self._file_sweeps.setdefault((record['source'], record['hash']), []).append(record)
+        if record['sweep'] == 0:  # the readers start from the first sweep.
+            self._source_index[record['source']] = record
+            self._hash_index.setdefault(record['hash'], record)
+            self._archived_sizes.add(record['size'])
+            self._channel_index[(record['site'], record['date'], record['data_type'],
+                                 record['channel'])] = record
+
+    def __len__(self):
+        return len(self.records)
+
+    def find(self, site=None, date=None, data_type=None, channel=None, sweep=0):
+        """
+        Find archived sweeps. Arguments that are None match anything.
+        :param site: eg. 'SAS'.
+        :param date: eg. 20170627.
+        :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+        :param channel: eg. 'M0'.
+        :param sweep: sweep number within the csv file, 0 for the first.
+        :return: list of matching index records, oldest first.
+        """
+        query = {'site': site, 'date': None if date is None else int(date),
+                 'data_type': data_type, 'channel': channel, 'sweep': sweep}
+        candidate_lists = [self.indexes[field].get(value, []) for field, value in
+                           query.items() if value is not None]
+        if not candidate_lists:
+            return list(self.records)
+        candidate_lists.sort(key=len)  # intersect starting with the smallest.
+        positions = set(candidate_lists[0]).intersection(*candidate_lists[1:])
+        return [self.records[position] for position in sorted(positions)]
+
+    def lookup(self, site, date, data_type, channel):
+        """
+        Find the first sweep of a channel's csv file in the archive, without the csv file.
+        :param site: eg. 'SAS'.
+        :param date: eg. 20170627.
+        :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+        :param channel: eg. 'M0'.
+        :return: the index record of the newest version archived, or None.
+        """
+        return self._channel_index.get((site, int(date), data_type, channel))
+
+    def lookup_path(self, csv_path):
+        """
+        Find the first sweep of a csv file in the archive. If the csv file still exists
+        and has changed since it was archived, it is not served from the archive. A file
+        that is not at the path it was archived from, eg. because the Sync tree has moved,
+        is found by its contents.
+        :param csv_path: path to the csv file.
+        :return: the index record, or None.
+        """
+        record = self._source_index.get(os.path.abspath(csv_path))
+        try:
+            file_stat = os.stat(csv_path)
+        except FileNotFoundError:
+            return record  # only the archived copy is left, if there is one.
+        if record is not None and file_stat.st_size == record['size'] and \
+                file_stat.st_mtime_ns == record['mtime_ns']:
+            return record
+        if file_stat.st_size not in self._archived_sizes:
+            return None  # not archived, no need to hash it.
+        return self._hash_index.get(sweep_cache.get_file_hash(csv_path))
+
+    def get_file_sweeps(self, record):
+        """
+        :param record: the index record of a sweep.
+        :return: index records of every sweep archived from the same version of the same
+        csv file, in the order of the sweeps in the file.
+        """
+        return self._file_sweeps[(record['source'], record['hash'])]
+
+    def has_columns(self, record, header_names):
+        """
+        :param record: an index record.
+        :param header_names: Dictionary with dtype key and string value to search for in
+        the column names.
+        :return: True if the sweep has a column matching every header name.
+        """
+        return all(any(fnmatch.fnmatch(column_name.strip(), dtype_string) for
+                       column_name, _ in record['columns']) for dtype_string in
+                   header_names.values())
+
+    def _get_memory_map(self, column_filename, end):
+        memory_map = self._memory_maps.get(column_filename)
+        if memory_map is None or len(memory_map) < end:  # the file has been appended to.
+            memory_map = np.memmap(os.path.join(self.archive_directory, column_filename),
+                                   dtype=column_dtype, mode='r')
+            self._memory_maps[column_filename] = memory_map
+        return memory_map
+
+    def get_columns(self, record):
+        """
+        Get the columns of an archived sweep without copying them.
+        :param record: an index record.
+        :return: dictionary of csv column name to a read-only array, in the order of the
+        columns in the csv file.
+        """
+        columns = {}
+        num_points = record['num_points']
+        for column_name, offset in record['columns']:
+            memory_map = self._get_memory_map(get_column_filename(column_name),
+                                              offset + num_points)
+            columns[column_name] = memory_map[offset:offset + num_points]
+        return columns
+
+    def read_columns(self, record, column_names):
+        """
+        Read named columns of an archived sweep, as retrieve_data.parse_columns_from_csv.
+        :param record: an index record.
+        :param column_names: list of exact csv column names.
+        :return: structured numpy array with a float dtype for each column name.
+        """
+        columns = self.get_columns(record)
+        missing_columns = [column_name for column_name in column_names if column_name
+                           not in columns]
+        if missing_columns:
+            sys.exit('Cannot find columns {} in {}.'.format(missing_columns,
+                                                            record['source']))
+        rawdata = np.empty(record['num_points'], dtype=[(column_name, 'f8') for
+                                                        column_name in column_names])
+        for column_name in column_names:
+            rawdata[column_name] = columns[column_name]
+        return rawdata
+
+    def read_sweep(self, record, header_names):
+        """
+        Read an archived sweep, as retrieve_data.parse_sweep_from_csv.
+        :param record: an index record.
+        :param header_names: Dictionary with dtype key and string value to search for in
+        the column names. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+        :return: rawdata: structured numpy array with the dtypes from get_array_dtypes.
+        """
+        columns = self.get_columns(record)
+        rawdata = np.empty(record['num_points'], dtype=get_array_dtypes(header_names))
+        for dtype, dtype_string in header_names.items():
+            matching_columns = [column_name for column_name in columns if
+                                fnmatch.fnmatch(column_name.strip(), dtype_string)]
+            if not matching_columns:
+                sys.exit('Cannot find {dtype} data.'.format(dtype=dtype))
+            rawdata[dtype] = columns[matching_columns[0]]
+            if dtype == 'phase_deg':
+                rawdata['phase_rad'] = np.radians(columns[matching_columns[0]])
+        return rawdata
+
+    def contains_file(self, csv_path, file_hash):
+        """
+        :param csv_path: path to a csv file.
+        :param file_hash: hash of the file contents, see sweep_cache.get_file_hash.
+        :return: True if this version of the file is already archived.
+        """
+        record = self._source_index.get(os.path.abspath(csv_path))
+        return record is not None and record['hash'] == file_hash
+
+    def add_file(self, csv_path, site, date, data_type, channel):
+        """
+        Append every sweep in a csv file to the archive, unless this version of the file
+        is archived already. A changed file is archived again, and the newer copy is
+        served from then on.
+        :param csv_path: path to the csv file.
+        :param site: eg. 'SAS'.
+        :param date: eg. 20170627.
+        :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+        :param channel: eg. 'M0'.
+        :return: number of sweeps added.
+        """
+        file_hash = sweep_cache.get_file_hash(csv_path)
+        if self.contains_file(csv_path, file_hash):
+            return 0
+        file_stat = os.stat(csv_path)
+        os.makedirs(self.archive_directory, exist_ok=True)
+        new_records = []
+        for sweep_number, sweep in enumerate(parse_all_sweeps_from_csv(csv_path)):
+            columns = []
+            for column_name, values in sweep:
+                column_path = os.path.join(self.archive_directory,
+                                           get_column_filename(column_name))
+                with open(column_path, 'ab') as column_file:
+                    offset = column_file.tell() // column_dtype.itemsize
+                    column_file.write(values.tobytes())
+                columns.append([column_name, offset])
+            new_records.append({'site': site, 'date': int(date), 'data_type': data_type,
+                                'channel': channel, 'sweep': sweep_number,
+                                'source': os.path.abspath(csv_path), 'hash': file_hash,
+                                'size': file_stat.st_size,
+                                'mtime_ns': file_stat.st_mtime_ns,
+                                'num_points': len(sweep[0][1]), 'columns': columns})
+
+        with open(os.path.join(self.archive_directory, index_filename), 'a') as index_file:
+            for record in new_records:
+                index_file.write(json.dumps(record) + '\n')
+                self._add_record(record)
+        return len(new_records)
+
+    def add_dataset(self, mapping_dict, data_location, site, date, data_type):
+        """
+        Append every csv file named in a site visit file mapping.
+        :param mapping_dict: dictionary of channel name to csv filename, as in the mapping
+        json files.
+        :param data_location: path to the csv files, prepended to each filename.
+        :param site: eg. 'SAS'.
+        :param date: eg. 20170627.
+        :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+        :return: number of sweeps added.
+        """
+        channel_files = site_analysis.parse_mapping(mapping_dict, verbose=False)[0]
+        num_sweeps = 0
+        for channel, channel_file in channel_files.items():
+            num_sweeps += self.add_file(data_location + channel_file, site, date,
+                                        data_type, channel)
+        return num_sweeps
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add the sweeps of site visit datasets '
+                                                 'to an archive.')
+    parser.add_argument('archive', help='Path to the archive directory.')
+    parser.add_argument('manifests', nargs='*',
+                        help='Manifest csvs of datasets, with columns site, date, '
+                             'data_type, mapping_filename and data_location. Relative '
+                             'mapping filenames are relative to the manifest.')
+    args = parser.parse_args()
+
+    archive = SweepArchive(args.archive)
+    for manifest_path in args.manifests:
+        manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+        for metadata in pd.read_csv(manifest_path).to_dict('records'):
+            mapping_filename = str(metadata['mapping_filename'])
+            if not os.path.isabs(mapping_filename):
+                mapping_filename = os.path.join(manifest_directory, mapping_filename)
+            try:
+                with open(mapping_filename) as f:
+                    mapping_dict = json.load(f)
+                num_sweeps = archive.add_dataset(mapping_dict,
+                                                 str(metadata['data_location']),
+                                                 metadata['site'], metadata['date'],
+                                                 metadata['data_type'])
+            except (OSError, ValueError, SystemExit) as e:
+                print('{} {} {}: not archived, {}'.format(
+                    metadata['site'], metadata['date'], metadata['data_type'], e))
+                continue
+            print('{} {} {}: {} sweeps added'.format(metadata['site'], metadata['date'],
+                                                     metadata['data_type'], num_sweeps))
+
+    archive_size = 0
+    if os.path.isdir(args.archive):  # nothing has been archived yet otherwise.
+        archive_size = sum(entry.stat().st_size for entry in os.scandir(args.archive) if
+                           entry.is_file())
+    print('Sweep archive at {}: {} sweeps, {:.1f} MB'.format(args.archive, len(archive),
+                                                             archive_size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+# sweep_cache.py
+# On-disk cache of sweeps parsed from csv files so that re-running the scripts on the
+# same data does not re-parse the text. Each parsed sweep is stored as a .npy file.
+#
+# The cache key is made from the csv file path, modification time, size and content
+# hash, along with the columns that were read and the reader used, so a cached sweep is
+# only reused if it would be parsed the same way from the same file.
+#
+# Use 'python3 -m retrieve_data.sweep_cache --clear' from the tdiff_path directory to
+# empty the cache, or set the environment variable TDIFF_SWEEP_CACHE=off to bypass it.
+
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+
+cache_directory = os.environ.get('TDIFF_SWEEP_CACHE_DIR',
+                                 os.path.join(os.path.expanduser('~'), '.cache',
+                                              'radar-test-plots', 'sweeps'))
+cache_enabled = os.environ.get('TDIFF_SWEEP_CACHE', 'on').lower() not in ('off', '0',
+                                                                         'false')
+max_cache_bytes = 512 * 1024 * 1024  # 512 MB
+# Change when a reader parses the same file differently, so sweeps cached before are not
+# used.
+cache_version = '2'
+
+
+def set_cache_enabled(enabled):
+    """
+    Turn the sweep cache on or off for this process.
+    :param enabled: True to read and write cached sweeps, False to always parse.
+    """
+    global cache_enabled
+    cache_enabled = enabled
+
+
+def get_file_hash(csv_path):
+    """
+    Get the sha1 hash of a file's contents.
+    :param csv_path: path to the file.
+    :return: hex digest of the file contents.
+    """
+    file_hash = hashlib.sha1()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_cache_key(csv_path, header_names, reader_name):
+    """
+    Get the key of a parsed sweep in the cache.
+    :param csv_path: path to the csv file.
+    :param header_names: the columns or header patterns read from the csv file, a dict
+    or a list.
+    :param reader_name: name of the function that parsed the csv file.
+    :return: hex digest identifying the parsed sweep.
+    """
+    file_stat = os.stat(csv_path)
+    key_parts = [os.path.abspath(csv_path), str(file_stat.st_mtime_ns),
+                 str(file_stat.st_size), get_file_hash(csv_path),
+                 json.dumps(header_names), reader_name, cache_version]
+    return hashlib.sha1('\n'.join(key_parts).encode()).hexdigest()
+
+
+def load_sweep(cache_key):
+    """
+    Load a sweep from the cache.
+    :param cache_key: key from get_cache_key.
+    :return: the structured numpy array of the sweep, or None if it is not cached.
+    """
+    cache_file = os.path.join(cache_directory, cache_key + '.npy')
+    try:
+        sweep = np.load(cache_file, allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    os.utime(cache_file)  # mark as recently used.
+    return sweep
+
+
+def save_sweep(cache_key, sweep):
+    """
+    Save a sweep to the cache, then evict the least recently used sweeps if the cache
+    is larger than max_cache_bytes.
+    :param cache_key: key from get_cache_key.
+    :param sweep: structured numpy array of the sweep.
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    cache_file = os.path.join(cache_directory, cache_key + '.npy')
+    # Write to a temporary file first so other processes never load a partial file.
+    temporary_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+    with open(temporary_file, 'wb') as f:
+        np.save(f, sweep, allow_pickle=False)
+    os.replace(temporary_file, cache_file)
+    evict_sweeps(max_cache_bytes)
+
+
+def evict_sweeps(max_bytes):
+    """
+    Remove the least recently used sweeps until the cache is at most max_bytes.
+    :param max_bytes: size limit of the cache in bytes.
+    """
+    cache_files = []
+    for entry in os.scandir(cache_directory):
+        if entry.name.endswith('.npy'):
+            entry_stat = entry.stat()
+            cache_files.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+    cache_size = sum(size for _, size, _ in cache_files)
+    for _, size, path in sorted(cache_files):
+        if cache_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # another process evicted it already.
+        cache_size -= size
+
+
+def clear_cache():
+    """
+    Remove all sweeps from the cache.
+    """
+    if os.path.isdir(cache_directory):
+        evict_sweeps(0)
+
+
+def cached_sweep(csv_path, header_names, reader):
+    """
+    Get a parsed sweep from the cache, parsing the csv file with reader and caching the
+    result if it is not cached yet.
+    :param csv_path: path to the csv file.
+    :param header_names: the columns or header patterns to read, passed on to reader.
+    :param reader: function reader(csv_path, header_names) returning a structured numpy
+    array.
+    :return: the structured numpy array of the sweep.
+    """
+    if not cache_enabled:
+        return reader(csv_path, header_names)
+
+    cache_key = get_cache_key(csv_path, header_names, reader.__name__)
+    sweep = load_sweep(cache_key)
+    if sweep is None:
+        sweep = reader(csv_path, header_names)
+        save_sweep(cache_key, sweep)
+    return sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the cache of parsed sweeps.')
+    parser.add_argument('--clear', action='store_true', help='Remove all cached sweeps.')
+    args = parser.parse_args()
+
+    if args.clear:
+        clear_cache()
+        print('Cleared sweep cache at {}'.format(cache_directory))
+    else:
+        num_files = 0
+        cache_size = 0
+        if os.path.isdir(cache_directory):
+            for entry in os.scandir(cache_directory):
+                if entry.name.endswith('.npy'):
+                    num_files += 1
+                    cache_size += entry.stat().st_size
+        print('Sweep cache at {}: {} sweeps, {:.1f} MB'.format(cache_directory, num_files,
+                                                               cache_size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
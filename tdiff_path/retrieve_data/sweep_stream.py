@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+
+# sweep_stream.py
+# Read every sweep in a csv file produced by ZVHView, not only the first. The ZVH records
+# repeated sweeps side by side in the same file:
+#
+#     Freq. [Hz], VSWR, Phase [],,Freq. [Hz],Phase[],VSWR,, ...
+#
+# Sweeps are read one at a time, parsing only that sweep's columns, so a long capture
+# of many sweeps is never held in memory all at once. The sweeps can be averaged with a
+# running mean and variance to reduce noise and estimate it, using memory for only one
+# sweep however many sweeps there are.
+#
+# Use 'python3 -m retrieve_data.sweep_stream file.csv' from the tdiff_path directory to
+# print the number of sweeps in a file and the noise on each column.
+
+import sys
+import math
+import argparse
+import numpy as np
+import pandas as pd
+
+from retrieve_data.retrieve_data import get_array_dtypes, get_sweep_archive, \
+    lookup_archived_sweep, is_frequency_header, find_sweep_columns
+
+# Period of each phase dtype, used to average phase across sweeps without errors where
+# the phase wraps.
+phase_periods = {'phase_deg': 360.0, 'phase_rad': 2.0 * math.pi, 'phase': 360.0}
+
+
+def find_csv_data_offset(csv_path):
+    """
+    Find the header line of a csv file produced by ZVHView, past the setup information
+    at the top of the file.
+    :param csv_path: path to the csv file.
+    :return: header_row: list of the column names in the header.
+    :return: data_offset: position in the file of the first line of data, for seek.
+    """
+    with open(csv_path, 'r') as csvfile:
+        line = csvfile.readline()
+        while line:
+            if is_frequency_header(line):
+                return line.rstrip('\r\n').split(','), csvfile.tell()
+            line = csvfile.readline()
+    sys.exit('No Data in file {}'.format(csv_path))
+
+
+def iter_sweeps_from_csv(csv_path, header_names):
+    """
+    Read every sweep in a csv file produced by ZVHView, one at a time. Only the columns of
+    the sweep being read are parsed on each pass through the file. If the file is in the
+    sweep archive the sweeps are read from there instead.
+    :param csv_path: path to the csv file.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :return: generator of structured numpy arrays with the dtypes from get_array_dtypes,
+    one per sweep, in the order of the columns in the file.
+    """
+    record = lookup_archived_sweep(csv_path)
+    if record is not None:
+        archive = get_sweep_archive()
+        for sweep_record in archive.get_file_sweeps(record):
+            if archive.has_columns(sweep_record, header_names):
+                yield archive.read_sweep(sweep_record, header_names)
+        return
+
+    header_row, data_offset = find_csv_data_offset(csv_path)
+    sweep_columns = find_sweep_columns(header_row, header_names)
+    if not sweep_columns:
+        sys.exit('Cannot find a sweep with {} data in {}.'.format(
+            list(header_names.keys()), csv_path))
+
+    for dtype_to_column in sweep_columns:
+        with open(csv_path, 'r') as csvfile:
+            csvfile.seek(data_offset)
+            sweep = pd.read_csv(csvfile, header=None, names=list(range(len(header_row))),
+                                usecols=sorted(set(dtype_to_column.values())),
+                                engine='c')
+        # Drop any rows that are not complete numeric data, such as trailing lines.
+        sweep = sweep.apply(pd.to_numeric, errors='coerce').dropna()
+
+        rawdata = np.empty(len(sweep), dtype=get_array_dtypes(header_names))
+        for dtype, column in dtype_to_column.items():
+            rawdata[dtype] = sweep[column].to_numpy()
+        if 'phase_deg' in dtype_to_column:
+            rawdata['phase_rad'] = np.radians(sweep[dtype_to_column['phase_deg']].to_numpy())
+        yield rawdata
+
+
+class SweepAccumulator(object):
+    """
+    Running mean and variance of repeated sweeps over the same frequencies, using
+    Welford's method so memory is that of one sweep however many sweeps are added.
+
+    Phase is averaged about the first sweep added: each sweep's phase is moved by whole
+    periods to within half a period of the first sweep, so a phase that wraps between
+    sweeps (eg. 179 and -179 degrees) is averaged to 180 and not 0.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.dtype = None
+        self.freq = None
+        self._reference_phase = {}
+        self._mean = {}
+        self._sum_of_squares = {}
+
+    def add(self, sweep):
+        """
+        Add a sweep to the running statistics.
+        :param sweep: structured numpy array with a 'freq' dtype, with the same dtypes
+        and frequencies as the sweeps added before.
+        """
+        if self.count == 0:
+            self.dtype = sweep.dtype
+            self.freq = np.array(sweep['freq'])
+            for name in self.field_names:
+                self._mean[name] = np.zeros(len(sweep))
+                self._sum_of_squares[name] = np.zeros(len(sweep))
+                if name in phase_periods:
+                    self._reference_phase[name] = np.array(sweep[name], dtype=float)
+        elif sweep.dtype != self.dtype or not np.array_equal(sweep['freq'], self.freq):
+            raise Exception('Sweeps must have the same dtypes and frequencies to be '
+                            'averaged.')
+
+        self.count += 1
+        for name in self.field_names:
+            values = np.asarray(sweep[name], dtype=float)
+            if name in phase_periods:
+                values = self._align_phase(name, values)
+            delta = values - self._mean[name]
+            self._mean[name] += delta / self.count
+            self._sum_of_squares[name] += delta * (values - self._mean[name])
+
+    def _align_phase(self, name, values):
+        period = phase_periods[name]
+        reference = self._reference_phase[name]
+        return reference + (values - reference + period / 2.0) % period - period / 2.0
+
+    @property
+    def field_names(self):
+        return [name for name in self.dtype.names if name != 'freq']
+
+    def _to_structured_array(self, fields):
+        array = np.empty(len(self.freq), dtype=self.dtype)
+        array['freq'] = self.freq
+        for name, values in fields.items():
+            array[name] = values
+        return array
+
+    def mean(self):
+        """
+        :return: structured array of the mean of each dtype across the sweeps added, with
+        phase wrapped to within half a period of 0.
+        """
+        if self.count == 0:
+            raise Exception('No sweeps have been added.')
+        mean = {}
+        for name, values in self._mean.items():
+            if name in phase_periods:
+                period = phase_periods[name]
+                values = (values + period / 2.0) % period - period / 2.0
+            mean[name] = values
+        return self._to_structured_array(mean)
+
+    def variance(self, ddof=1):
+        """
+        :param ddof: delta degrees of freedom, 1 for the sample variance.
+        :return: structured array of the variance of each dtype across the sweeps added.
+        """
+        if self.count <= ddof:
+            raise Exception('At least {} sweeps are needed for the variance.'.format(
+                ddof + 1))
+        return self._to_structured_array({name: values / (self.count - ddof) for
+                                          name, values in self._sum_of_squares.items()})
+
+    def std(self, ddof=1):
+        """
+        :param ddof: delta degrees of freedom, 1 for the sample standard deviation.
+        :return: structured array of the standard deviation of each dtype across the
+        sweeps added.
+        """
+        variance = self.variance(ddof)
+        for name in self.field_names:
+            variance[name] = np.sqrt(variance[name])
+        return variance
+
+
+def median_of_sweeps(sweeps):
+    """
+    Get the median of each dtype across sweeps. Unlike the mean, this needs every sweep
+    in memory at once. Phase is aligned to the first sweep as in SweepAccumulator.
+    :param sweeps: iterable of structured arrays with the same dtypes and frequencies.
+    :return: structured array of the median of each dtype.
+    """
+    sweeps = list(sweeps)
+    if not sweeps:
+        raise Exception('No sweeps to take the median of.')
+    median = np.empty(len(sweeps[0]), dtype=sweeps[0].dtype)
+    median['freq'] = sweeps[0]['freq']
+    for sweep in sweeps[1:]:
+        if sweep.dtype != median.dtype or not np.array_equal(sweep['freq'], median['freq']):
+            raise Exception('Sweeps must have the same dtypes and frequencies to take '
+                            'the median.')
+    for name in median.dtype.names:
+        if name == 'freq':
+            continue
+        block = np.vstack([np.asarray(sweep[name], dtype=float) for sweep in sweeps])
+        if name in phase_periods:
+            period = phase_periods[name]
+            block = block[0] + (block - block[0] + period / 2.0) % period - period / 2.0
+            median[name] = (np.median(block, axis=0) + period / 2.0) % period - period / 2.0
+        else:
+            median[name] = np.median(block, axis=0)
+    return median
+
+
+def average_sweeps_from_csv(csv_path, header_names, method='mean'):
+    """
+    Average all sweeps in a csv file produced by ZVHView to reduce noise.
+    :param csv_path: path to the csv file.
+    :param header_names: Dictionary with dtype key and string value to search for in
+    the csv file. e.g. { 'freq': 'Freq*', 'vswr': 'VSWR*', 'phase_deg': 'Phase*'}
+    :param method: 'mean', using memory for one sweep, or 'median', which reads all
+    sweeps into memory.
+    :return: average: structured array of the mean or median sweep.
+    :return: accumulator: the SweepAccumulator of all sweeps, for the standard
+    deviation (noise) and number of sweeps.
+    """
+    if method not in ('mean', 'median'):
+        raise Exception('Unknown averaging method {}.'.format(method))
+    accumulator = SweepAccumulator()
+    sweeps = []
+    for sweep in iter_sweeps_from_csv(csv_path, header_names):
+        accumulator.add(sweep)
+        if method == 'median':
+            sweeps.append(sweep)
+    if method == 'median':
+        return median_of_sweeps(sweeps), accumulator
+    return accumulator.mean(), accumulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the number of sweeps in ZVHView '
+                                                 'csv files and the noise on each '
+                                                 'column across the sweeps.')
+    parser.add_argument('csv_files', nargs='+', help='Paths to the csv files.')
+    parser.add_argument('--columns', default='freq=Freq*,vswr=VSWR*,phase_deg=Phase*',
+                        help='dtype=header pattern of each column to read, separated by '
+                             'commas. Default freq=Freq*,vswr=VSWR*,phase_deg=Phase*')
+    args = parser.parse_args()
+
+    header_names = dict(column.split('=', 1) for column in args.columns.split(','))
+    for csv_path in args.csv_files:
+        average, accumulator = average_sweeps_from_csv(csv_path, dict(header_names))
+        print('{}: {} sweeps of {} points'.format(csv_path, accumulator.count,
+                                                  len(average)))
+        if accumulator.count > 1:
+            std = accumulator.std()
+            for name in accumulator.field_names:
+                print('    {}: mean std {:.4g}, max std {:.4g}'.format(
+                    name, np.mean(std[name]), np.max(std[name])))
+
+
+if __name__ == '__main__':
+    main()
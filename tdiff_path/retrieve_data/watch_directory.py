@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+# watch_directory.py
+# Watch a data directory for csv files exported from the ZVH during a site visit. The
+# directory is polled: each poll only lists the directory and stats the files, so it is
+# cheap, and it works the same on Linux and on the Windows laptops used with ZVHView.
+# A file is only reported once its size and modification time are the same on two polls
+# in a row, so files that are still being written are not read half finished.
+
+import os
+import time
+import fnmatch
+
+
+class DirectoryWatcher(object):
+    """
+    Report files in a directory that are new, changed or removed since the last poll.
+    """
+
+    def __init__(self, directory, patterns=('*.csv',), extra_files=()):
+        """
+        :param directory: the directory to watch.
+        :param patterns: fnmatch patterns of the filenames to watch in the directory.
+        :param extra_files: paths of other files to watch, eg. the file mapping json.
+        """
+        self.directory = directory
+        self.patterns = list(patterns)
+        self.extra_files = list(extra_files)
+        self._reported = {}  # path: (mtime_ns, size) when last reported.
+        self._pending = {}  # path: (mtime_ns, size) of files changing since last poll.
+
+    def snapshot(self):
+        """
+        :return: dictionary of the path of every watched file that exists to its
+        (mtime_ns, size).
+        """
+        paths = [os.path.join(self.directory, filename) for filename in
+                 os.listdir(self.directory) if any(fnmatch.fnmatch(filename, pattern) for
+                                                   pattern in self.patterns)]
+        file_states = {}
+        for path in paths + self.extra_files:
+            try:
+                file_stat = os.stat(path)
+            except OSError:  # removed since listing, or an extra file not there yet.
+                continue
+            if os.path.isfile(path):
+                file_states[path] = (file_stat.st_mtime_ns, file_stat.st_size)
+        return file_states
+
+    def poll(self, settle=True):
+        """
+        Check the watched files.
+        :param settle: only report a new or changed file once it has not changed since
+        the previous poll. If False, report every change at once, eg. for the files that
+        are already there when watching starts.
+        :return: changed: list of paths of files that are new or changed.
+        :return: removed: list of paths of files that were removed.
+        """
+        file_states = self.snapshot()
+        changed = []
+        for path, file_state in sorted(file_states.items()):
+            if self._reported.get(path) == file_state:
+                self._pending.pop(path, None)
+                continue
+            if settle and self._pending.get(path) != file_state:
+                self._pending[path] = file_state  # report it if the same next poll.
+                continue
+            self._pending.pop(path, None)
+            self._reported[path] = file_state
+            changed.append(path)
+        removed = sorted(path for path in self._reported if path not in file_states)
+        for path in removed:
+            del self._reported[path]
+        for path in [path for path in self._pending if path not in file_states]:
+            del self._pending[path]
+        return changed, removed
+
+    def watch(self, callback, interval=2.0):
+        """
+        Call callback with the files already there, then every time files are added,
+        changed or removed, until interrupted with Ctrl-C.
+        :param callback: function callback(changed, removed) of two lists of paths.
+        :param interval: seconds between polls.
+        """
+        changed, removed = self.poll(settle=False)
+        callback(changed, removed)
+        try:
+            while True:
+                time.sleep(interval)
+                changed, removed = self.poll()
+                if changed or removed:
+                    callback(changed, removed)
+        except KeyboardInterrupt:
+            print('\nStopped watching {}'.format(self.directory))
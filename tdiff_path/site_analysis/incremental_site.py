@@ -0,0 +1,316 @@
+#!/usr/bin/python3
+
+# incremental_site.py
+# The analysis of a site visit dataset as in site_analysis.analyse_site, kept up to date
+# as channel files change without redoing the whole analysis. Each channel's inputs (the
+# hash of its csv file) and derived products (single direction path, unwrapped phase,
+# linear fit and phasor) are kept, and when a file's hash changes only that channel is
+# read and derived again. The combined arrays are running phasor sums, updated by
+# subtracting the channel's old phasor and adding its new one, so re-measuring M7 does not
+# re-read or re-derive the other 19 channels.
+#
+#     site = IncrementalSiteAnalysis(mapping_dict, data_location, 'feedline-VSWR', 'SAS',
+#                                    feedline_metadata)
+#     site.update()      # reads every channel the first time.
+#     ...                # M7 is measured again.
+#     site.update()      # returns ['M7'], only M7, M_all_ and the array difference change.
+#     results = site.results
+
+import os
+import numpy as np
+import pandas as pd
+
+import dataset_operations.dataset_operations as do
+import retrieve_data.sweep_cache as sweep_cache
+import site_analysis.site_analysis as site_analysis
+from sweep_set.sweep_set import SweepSet
+
+# the combined arrays, in the order of their columns in the working dataframe.
+array_prefixes = ['M_all_', 'I_all_']
+
+
+class IncrementalSiteAnalysis(object):
+    """
+    A site visit analysis that only recomputes what depends on the channel files that
+    changed. See the top of this file.
+    """
+
+    def __init__(self, mapping_dict, data_location, data_type, site=None,
+                 feedline_metadata=None, verbose=True):
+        """
+        :param mapping_dict: dictionary of channel name to csv filename, see
+        site_analysis.parse_mapping.
+        :param data_location: path to the csv files.
+        :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+        :param site: the site, needed with feedline_metadata for feedline-VSWR data.
+        :param feedline_metadata: dataframe of site_feedline_metadata.csv, needed for
+        feedline-VSWR data to get the cable loss models.
+        :param verbose: print information about the file mapping.
+        """
+        if data_type not in site_analysis.data_type_columns:
+            raise Exception('Working data type {} is not recognized.'.format(data_type))
+        if data_type == 'feedline-VSWR' and feedline_metadata is None:
+            raise Exception('Feedline metadata is needed to get the cable loss for '
+                            'feedline-VSWR data.')
+        self.data_location = data_location
+        self.data_type = data_type
+        self.site = site
+        self.feedline_metadata = feedline_metadata
+        self.verbose = verbose
+        self.mapping_dict = {}
+        self.channel_files = {}
+        self.missing_data = []
+        self.data_description = ''
+        self.attenuation = None
+
+        self.freq = None
+        self.cable_loss_dataset_dict = {}
+        self.working_channel_data = {}  # read data of each channel, at freq.
+        self.last_update = {'channels': [], 'arrays': [], 'rebuilt': False}
+        self._file_states = {}  # channel: ((mtime_ns, size), sha1 hash) of its csv file.
+        self._raw_channel_data = {}  # read data of each channel, before aligning freq.
+        self._channel_sweeps = {}  # channel: SweepSet of its single direction path.
+        self._linear_fits = {}  # channel: linear fit dictionary.
+        self._phasors = {}  # channel: complex voltage, for channels in an array.
+        self._array_sums = {}  # array prefix: sum of its channels' phasors.
+        self._combined_columns = {}  # array prefix: its working dataframe columns.
+        self._combined_fits = {}  # array prefix: its linear fit dictionary.
+        self._array_diff_columns = {}
+        self._sweeps = None
+        self._results = None
+        self.set_mapping(mapping_dict)
+
+    @property
+    def channels(self):
+        """
+        :return: the channels with data read, in the order of the file mapping.
+        """
+        return [channel for channel in self.channel_files if channel in
+                self._channel_sweeps]
+
+    def get_channel_path(self, channel):
+        return self.data_location + self.channel_files[channel]
+
+    def set_mapping(self, mapping_dict):
+        """
+        Use a new file mapping, eg. after the mapping json was edited. Channels that are
+        no longer in the mapping are removed, and a changed attenuation recomputes every
+        channel. Call update to read new or changed channel files.
+        :param mapping_dict: dictionary of channel name to csv filename.
+        """
+        channel_files, self.missing_data, self.data_description, attenuation = \
+            site_analysis.parse_mapping(mapping_dict, self.verbose)
+        self.mapping_dict = dict(mapping_dict)
+        removed_channels = [channel for channel in self.channel_files if
+                            channel_files.get(channel) != self.channel_files[channel]]
+        self.channel_files = channel_files
+        for channel in removed_channels:
+            self._forget_channel(channel)
+        if attenuation != self.attenuation:
+            self.attenuation = attenuation
+            if self._raw_channel_data:
+                self._rebuild()
+        elif removed_channels:
+            self._recompute(removed_channels)
+
+    def _forget_channel(self, channel):
+        self._file_states.pop(channel, None)
+        self._raw_channel_data.pop(channel, None)
+        self.working_channel_data.pop(channel, None)
+
+    def check_channel_file(self, channel):
+        """
+        Read a channel's csv file if it has changed since it was last read. The file's
+        size and modification time are checked first, so the file is only hashed if they
+        changed.
+        :param channel: a channel name in the file mapping.
+        :return: True if the channel's data changed, was added or was removed.
+        """
+        csv_path = self.get_channel_path(channel)
+        if not os.path.exists(csv_path):
+            if channel not in self._file_states:
+                return False
+            self._forget_channel(channel)
+            return True
+
+        file_stat = os.stat(csv_path)
+        stat_key = (file_stat.st_mtime_ns, file_stat.st_size)
+        file_state = self._file_states.get(channel)
+        if file_state is not None and file_state[0] == stat_key:
+            return False
+        file_hash = sweep_cache.get_file_hash(csv_path)
+        self._file_states[channel] = (stat_key, file_hash)
+        if file_state is not None and file_state[1] == file_hash:
+            return False  # touched but not changed.
+        self._raw_channel_data[channel] = site_analysis.read_channel_file(csv_path,
+                                                                          self.data_type)
+        return True
+
+    def update(self, channels=None):
+        """
+        Check the channel files for changes and recompute what depends on the channels
+        that changed.
+        :param channels: the channels to check, all channels in the file mapping by
+        default.
+        :return: list of the channels that changed, were added or were removed.
+        """
+        if channels is None:
+            channels = list(self.channel_files)
+        changed_channels = [channel for channel in channels if
+                            self.check_channel_file(channel)]
+        if changed_channels:
+            self._recompute(changed_channels)
+        else:
+            self.last_update = {'channels': [], 'arrays': [], 'rebuilt': False}
+        return changed_channels
+
+    def _recompute(self, changed_channels):
+        self._results = None
+        raw_lengths = [len(data) for data in self._raw_channel_data.values()]
+        if self.freq is None or not raw_lengths or min(raw_lengths) != len(self.freq):
+            # the frequencies all channels are aligned to may have changed.
+            self._rebuild()
+            return
+
+        changed_arrays = set()
+        for channel in changed_channels:
+            if channel in self._raw_channel_data:
+                self.working_channel_data[channel] = do.reduce_frequency_array(
+                    {'reference': pd.DataFrame({'freq': self.freq}),
+                     channel: self._raw_channel_data[channel]}, freqs=self.freq)[channel]
+            prefix = self._update_channel(channel)
+            if prefix is not None:
+                changed_arrays.add(prefix)
+        changed_arrays = [prefix for prefix in array_prefixes if prefix in changed_arrays]
+        for prefix in changed_arrays:
+            self._update_array(prefix)
+        self._update_array_difference()
+        self.last_update = {'channels': list(changed_channels), 'arrays': changed_arrays,
+                            'rebuilt': False}
+
+    def _rebuild(self):
+        """
+        Derive every channel and re-sum the arrays from scratch, as analyse_site does.
+        """
+        channels = [channel for channel in self.channel_files if channel in
+                    self._raw_channel_data]
+        self.working_channel_data = {}
+        self._channel_sweeps, self._linear_fits, self._phasors = {}, {}, {}
+        self._array_sums, self._combined_columns, self._combined_fits = {}, {}, {}
+        self.freq = None
+        self.cable_loss_dataset_dict = {}
+        if channels:
+            self.working_channel_data = do.reduce_frequency_array(
+                {channel: self._raw_channel_data[channel] for channel in channels})
+            self.freq = np.asarray(self.working_channel_data[channels[0]]['freq'])
+            if self.data_type == 'feedline-VSWR':
+                self.cable_loss_dataset_dict = site_analysis.get_feedline_cable_losses(
+                    self.feedline_metadata, self.site,
+                    pd.Series(self.freq.astype(int), name='freq'))
+            for channel in channels:
+                self._update_channel(channel)
+        for prefix in array_prefixes:
+            self._update_array(prefix)
+        self._update_array_difference()
+        self.last_update = {'channels': channels, 'arrays': list(array_prefixes),
+                            'rebuilt': True}
+
+    def _update_channel(self, channel):
+        """
+        Derive one channel's single direction path, linear fit and phasor again, and
+        update its array's phasor sum.
+        :param channel: a channel name.
+        :return: the prefix of the array the channel is in, or None.
+        """
+        if channel in self.working_channel_data:
+            channel_sweep = SweepSet.from_dict({channel: self.working_channel_data[
+                channel]})
+            if self.data_type == 'pm-path' and self.attenuation is not None:
+                channel_sweep['magnitude'] = channel_sweep['magnitude'] - self.attenuation
+            site_analysis.get_single_direction_paths(channel_sweep, self.data_type,
+                                                     self.cable_loss_dataset_dict)
+            self._channel_sweeps[channel] = channel_sweep
+            self._linear_fits.update(do.create_linear_fit_dictionaries(
+                dict(channel_sweep.items())))
+        else:  # removed.
+            self._channel_sweeps.pop(channel, None)
+            self._linear_fits.pop(channel, None)
+
+        main_channels, intf_channels = site_analysis.get_array_channels([channel])
+        if not main_channels and not intf_channels:
+            return None
+        prefix = 'M_all_' if main_channels else 'I_all_'
+        if channel in self._phasors:
+            self._array_sums[prefix] = self._array_sums[prefix] - self._phasors.pop(channel)
+        if channel in self._channel_sweeps:
+            phasor = do.get_phasors(channel_sweep['magnitude'],
+                                    channel_sweep['phase_rad'])[0]
+            self._phasors[channel] = phasor
+            self._array_sums[prefix] = self._array_sums.get(prefix, 0) + phasor
+        return prefix
+
+    def _update_array(self, prefix):
+        """
+        Get a combined array's columns and linear fit from its phasor sum.
+        :param prefix: 'M_all_' or 'I_all_'.
+        """
+        array_channels = [channel for channel in self._phasors if channel.startswith(
+            prefix[0])]
+        if not array_channels:
+            self._array_sums.pop(prefix, None)
+            self._combined_columns.pop(prefix, None)
+            self._combined_fits.pop(prefix, None)
+            return
+        combined_magnitude, combined_phase_rad = do.get_phasor_sum_magnitude_phase(
+            self._array_sums[prefix])
+        self._combined_columns[prefix] = site_analysis.get_combined_columns(
+            prefix, combined_magnitude, combined_phase_rad)
+        self._combined_fits[prefix] = do.create_linear_fit_dictionaries(
+            {prefix: {'freq': self.freq, 'phase_rad': combined_phase_rad}})[prefix]
+
+    def _get_combined_columns(self):
+        combined_columns = {}
+        for prefix in array_prefixes:
+            combined_columns.update(self._combined_columns.get(prefix, {}))
+        return combined_columns
+
+    def _update_array_difference(self):
+        channels = self.channels
+        if channels:
+            self._sweeps = SweepSet(self.freq, channels, {
+                name: np.vstack([self._channel_sweeps[channel][name] for channel in
+                                 channels]) for name in
+                self._channel_sweeps[channels[0]].fields})
+        else:
+            self._sweeps = None
+        self._array_diff_columns = {} if self._sweeps is None else \
+            site_analysis.get_array_diff_columns(self._sweeps,
+                                                 self._get_combined_columns())
+
+    @property
+    def results(self):
+        """
+        :return: dictionary of results with the same keys as site_analysis.analyse_site,
+        so it can be used with summarize_site and the site plots.
+        """
+        if self._sweeps is None:
+            raise Exception('No channel data has been read, call update first.')
+        if self._results is None:
+            channels = self.channels
+            main_channels, intf_channels = site_analysis.get_array_channels(channels)
+            linear_fit_dict = {channel: self._linear_fits[channel] for channel in channels}
+            for prefix in array_prefixes:
+                if prefix in self._combined_fits:
+                    linear_fit_dict[prefix] = self._combined_fits[prefix]
+            self._results = {
+                'sweeps': self._sweeps, 'channels': channels,
+                'working_channel_data': {channel: self.working_channel_data[channel] for
+                                         channel in channels},
+                'missing_data': self.missing_data,
+                'data_description': self.data_description,
+                'cable_loss_dataset_dict': self.cable_loss_dataset_dict,
+                'main_channels': main_channels, 'intf_channels': intf_channels,
+                'linear_fit_dict': linear_fit_dict,
+                'working_dataframe': site_analysis.get_working_dataframe(
+                    self._sweeps, self._get_combined_columns(), self._array_diff_columns)}
+        return self._results
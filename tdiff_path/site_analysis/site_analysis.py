@@ -0,0 +1,406 @@
+#!/usr/bin/python3
+
+# site_analysis.py
+# The analysis of one site visit's dataset (a file mapping of channel to csv file, for one
+# data type). All channels are read, aligned to the same frequencies, and the single
+# direction paths, combined arrays, linear fits and array difference (tdiff) are found.
+# This is used by presentation/load_data.py and by the batch_process.py driver.
+
+import time
+import numpy as np
+import pandas as pd
+
+import dataset_operations.dataset_operations as do
+import retrieve_data.retrieve_data as retrieve
+from sweep_set.sweep_set import SweepSet
+
+# data we care about from each data type - there are multiple sweeps in the files and
+# some empty columns.
+data_type_columns = {
+    'feedline-VSWR': {'Freq. [Hz]': 'freq', 'VSWR [(VSWR)]': 'vswr',
+                      'Phase []': 'phase_deg'},
+    'transmitter-path': {'Freq. [Hz]': 'freq', 'Magnitude [dB]': 'magnitude',
+                         'Phase []': 'phase_deg'},
+    'pm-path': {'Freq. [Hz]': 'freq', 'Magnitude [dB]': 'magnitude',
+                'Phase []': 'phase_deg'}
+}
+
+
+def print_stage_time(stage_name, stage_start, verbose=True):
+    """
+    Print the time taken for a stage of loading the data.
+    :param stage_name: description of the stage.
+    :param stage_start: time.perf_counter() at the start of the stage.
+    :param verbose: if False, do not print.
+    :return: time.perf_counter() now, for the start of the next stage.
+    """
+    stage_end = time.perf_counter()
+    if verbose:
+        print('{}: {:.3f} s'.format(stage_name, stage_end - stage_start))
+    return stage_end
+
+
+def parse_mapping(mapping_dict, verbose=True):
+    """
+    Find the channels with data in a file mapping.
+    :param mapping_dict: dictionary of channel name to csv filename, as in the mapping
+    json files. '_comment' gives a data description, 'dne' marks missing data, and 'atten'
+    gives a phasing matrix attenuation in dB.
+    :param verbose: print the missing data and data description.
+    :return: channel_files: dictionary of channel name to csv filename, in the order of
+    the mapping.
+    :return: missing_data: list of channels with no data.
+    :return: data_description: the description of the data, or ''.
+    :return: attenuation: attenuation in dB given for the phasing matrix, or None.
+    """
+    channel_files = {}
+    data_description = ''
+    missing_data = []
+    attenuation = None
+    for channel_name, channel_file in mapping_dict.items():
+        if channel_name == '_comment':
+            data_description = channel_file
+            continue
+        if channel_file == 'dne':
+            missing_data.append(channel_name)
+            continue
+        if channel_name == 'atten':  # used for phasing matrix value of attenuators
+            attenuation = float(channel_file)
+            continue
+        if channel_name == 'atten_file':  # used for phasing matrix transmission through attenuators
+            continue
+        if channel_file == 'estimate_intf':
+            if verbose:
+                print('\nEstimation required for interferometer channel {}'.format(
+                    channel_name))
+            continue  # TODO create an estimate for this data.
+        channel_files[channel_name] = channel_file
+
+    if verbose:
+        if missing_data:
+            print('\nThere is missing data from the following channel(s): {}'.format(
+                missing_data))
+        if data_description != '':
+            print('\nThere is a data description associated with this data:')
+            print(data_description)
+
+    return channel_files, missing_data, data_description, attenuation
+
+
+def read_channel_file(csv_path, data_type):
+    """
+    Read the first sweep of the columns we want from one channel's csv file, from the
+    sweep cache if parsed before.
+    :param csv_path: path to the csv file.
+    :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+    :return: dataframe of the columns for the data type, renamed as in data_type_columns.
+    """
+    try:
+        good_columns = data_type_columns[data_type]
+    except KeyError:
+        raise Exception('Working data type {} is not recognized.'.format(data_type))
+    return retrieve.read_columns_from_csv(csv_path, list(good_columns.keys())).rename(
+        good_columns, axis='columns')
+
+
+def read_site_channels(mapping_dict, data_location, data_type, verbose=True):
+    """
+    Read the first sweep of every channel in a file mapping.
+    :param mapping_dict: dictionary of channel name to csv filename, see parse_mapping.
+    :param data_location: path to the csv files, prepended to each filename.
+    :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+    :param verbose: print the missing data and data description.
+    :return: working_channel_data: dictionary of channel name to dataframe of the columns
+    for the data type.
+    :return: missing_data: list of channels with no data.
+    :return: data_description: the description of the data, or ''.
+    :return: attenuation: attenuation in dB given for the phasing matrix, or None.
+    """
+    if data_type not in data_type_columns:
+        raise Exception('Working data type {} is not recognized.'.format(data_type))
+    channel_files, missing_data, data_description, attenuation = parse_mapping(
+        mapping_dict, verbose)
+    working_channel_data = {channel_name: read_channel_file(data_location + channel_file,
+                                                            data_type) for
+                            channel_name, channel_file in channel_files.items()}
+    return working_channel_data, missing_data, data_description, attenuation
+
+
+def get_feedline_cable_losses(feedline_metadata, site, reference_frequency):
+    """
+    Get the cable loss of every feedline at a site.
+    :param feedline_metadata: dataframe of site_feedline_metadata.csv, with columns site,
+    array, feedline_number, cable_length_ft and cable_type.
+    :param site: the site, eg. 'SAS'.
+    :param reference_frequency: the frequencies to get the loss at.
+    :return: dictionary of channel name (eg. 'M0') to cable loss array.
+    """
+    cable_loss_dataset_dict = {}
+    working_feedline_metadata = feedline_metadata[feedline_metadata['site'] == site]
+    for index, row in working_feedline_metadata.iterrows():
+        dict_key = row['array'] + str(row['feedline_number'])
+        cable_loss_dataset_dict[dict_key] = retrieve.get_cable_loss_array(
+            reference_frequency, row['cable_length_ft'], row['cable_type'])
+    return cable_loss_dataset_dict
+
+
+def get_single_direction_paths(sweeps, data_type, cable_loss_dataset_dict=None):
+    """
+    Get the single direction path of every channel of a SweepSet, in place. For
+    feedline-VSWR data the magnitude is the estimated single direction receive magnitude
+    and the reflected phase is halved. Then phase_deg is wrapped, and the unwrapped phase
+    is added as phase_deg_unwrap and phase_rad. Each channel is done independently, so
+    a SweepSet of one channel gives the same as that channel's row of all channels.
+    :param sweeps: SweepSet of the channels.
+    :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+    :param cable_loss_dataset_dict: cable loss of each channel's feedline, needed for
+    feedline-VSWR data.
+    """
+    channels = sweeps.channels
+    if data_type == 'feedline-VSWR':
+        # get estimated magnitude (dB loss) of single direction signal incident on the
+        # balun when it reaches the end of the feedline, for all channels at once.
+        cable_loss_block = np.vstack([cable_loss_dataset_dict[channel]['loss'] for
+                                      channel in channels])
+        sweeps['magnitude'] = do.get_single_receive_direction_magnitudes(
+            channels, sweeps.freq, sweeps['vswr'], cable_loss_block)
+        # convert the reflected phase to single direction, halving the unwrapped phase.
+        sweeps['phase_deg'] = do.unwrap_degrees_block(sweeps['phase_deg']) / 2.0
+
+    # Wrapping then unwrapping ensures there is no 360 degree offset.
+    sweeps['phase_deg'] = do.wrap_degrees_block(sweeps['phase_deg'])
+    # Also store data that is not phase wrapped for other calculations.
+    sweeps['phase_deg_unwrap'] = do.unwrap_degrees_block(sweeps['phase_deg'])
+    sweeps['phase_rad'] = np.radians(sweeps['phase_deg_unwrap'])
+
+
+def get_array_channels(channels):
+    """
+    :param channels: list of channel names.
+    :return: main_channels, intf_channels: the channels that are combined into the main
+    and interferometer arrays, leaving out measurements of the combined arrays.
+    """
+    main_channels = [channel for channel in channels if channel[0] == 'M' and
+                     'combined' not in channel]
+    intf_channels = [channel for channel in channels if channel[0] == 'I' and
+                     'combined' not in channel]
+    return main_channels, intf_channels
+
+
+def get_combined_columns(prefix, combined_magnitude, combined_phase_rad):
+    """
+    :param prefix: 'M_all_' or 'I_all_'.
+    :param combined_magnitude: combined array magnitude in dB, see do.combine_phasors.
+    :param combined_phase_rad: combined array phase in rads, unwrapped.
+    :return: dictionary of the combined array's columns of the working dataframe.
+    """
+    combined_columns = {prefix + 'phase_deg_unwrap': np.degrees(combined_phase_rad),
+                        prefix + 'phase_rad': combined_phase_rad}
+    # Wrapping after unwrapping ensures the first values in array are within -pi to pi.
+    combined_columns[prefix + 'phase_deg'] = do.wrap_degrees_block(
+        np.degrees(combined_phase_rad))
+    combined_columns[prefix + 'magnitude'] = combined_magnitude
+    return combined_columns
+
+
+def get_array_diff_columns(sweeps, combined_columns):
+    """
+    :param sweeps: SweepSet of the channels, with phase_deg_unwrap.
+    :param combined_columns: dictionary of the combined arrays' columns, see
+    get_combined_columns.
+    :return: dictionary of the array difference columns of the working dataframe.
+    """
+    # This is the time difference between the signal incident on the main array
+    # antennas reaching the end of the feedlines and the interferometer array signal
+    # reaching the end of the feedlines. This is a portion of the entire path from
+    # antennas to receiver. The entire path's time difference is a calibrated value
+    # used in SuperDARN data analysis, and is assumed to be constant across the
+    # frequency spectrum, as would be expected if the path was completely linear (such
+    # as a cable).
+    array_diff_columns = {}
+    if 'M_all_phase_deg_unwrap' in combined_columns and \
+            'I_all_phase_deg_unwrap' in combined_columns:
+        array_diff_columns['array_diff_phase_deg'], \
+            array_diff_columns['array_diff_time_ns'] = do.get_tdiff(
+                sweeps.freq, combined_columns['M_all_phase_deg_unwrap'],
+                combined_columns['I_all_phase_deg_unwrap'])
+
+    if 'M_combined' in sweeps.channels and 'I_combined' in sweeps.channels:
+        # the array difference from measurements of the combined arrays.
+        array_diff_columns['tested_array_diff_phase_deg'], \
+            array_diff_columns['tested_array_diff_time_ns'] = do.get_tdiff(
+                sweeps.freq, sweeps['phase_deg_unwrap'][sweeps.channel_index('M_combined')],
+                sweeps['phase_deg_unwrap'][sweeps.channel_index('I_combined')])
+    return array_diff_columns
+
+
+def get_working_dataframe(sweeps, combined_columns, array_diff_columns):
+    """
+    :param sweeps: SweepSet of the channels.
+    :param combined_columns: dictionary of the combined arrays' columns.
+    :param array_diff_columns: dictionary of the array difference columns.
+    :return: a single dataframe with a column for each channel and field, eg.
+    'M0phase_deg', and for the combined arrays and array difference.
+    """
+    reference_frequency = pd.Series(sweeps.freq.astype(int), name='freq')
+    return pd.concat([reference_frequency,
+                      sweeps.to_wide_dataframe().drop(columns=['freq']),
+                      pd.DataFrame(combined_columns),
+                      pd.DataFrame(array_diff_columns)], axis='columns')
+
+
+def analyse_site(mapping_dict, data_location, data_type, site=None, feedline_metadata=None,
+                 verbose=True):
+    """
+    Load and analyse all channels of a site visit dataset, building all derived data for
+    all channels at once.
+
+    :param mapping_dict: dictionary of channel name to csv filename, see
+    read_site_channels.
+    :param data_location: path to the csv files.
+    :param data_type: 'feedline-VSWR', 'transmitter-path' or 'pm-path'.
+    :param site: the site, needed with feedline_metadata for feedline-VSWR data.
+    :param feedline_metadata: dataframe of site_feedline_metadata.csv, needed for
+    feedline-VSWR data to get the cable loss models.
+    :param verbose: print information and the time taken by each stage.
+    :return: dictionary of results:
+        sweeps: SweepSet of all channels.
+        channels: list of channel names.
+        working_channel_data: dictionary of the dataframes read for each channel.
+        missing_data, data_description: from the file mapping.
+        cable_loss_dataset_dict: cable loss of each feedline, for feedline-VSWR data.
+        main_channels, intf_channels: channels that are combined into each array.
+        linear_fit_dict: linear fit dictionary of each channel and of the combined
+        arrays, 'M_all_' and 'I_all_'.
+        working_dataframe: a single dataframe with a column for each channel and field,
+        eg. 'M0phase_deg', and for the combined arrays and array difference.
+    """
+    stage_start = time.perf_counter()
+    working_channel_data, missing_data, data_description, attenuation = \
+        read_site_channels(mapping_dict, data_location, data_type, verbose)
+    stage_start = print_stage_time('Read channel files', stage_start, verbose)
+
+    # ensure all channels have the same frequency array, and hold all channels as channel
+    # x frequency arrays for each column.
+    sweeps = SweepSet.from_dict(working_channel_data)
+    channels = sweeps.channels
+    reference_frequency = pd.Series(sweeps.freq.astype(int), name='freq')
+    stage_start = print_stage_time('Align frequencies', stage_start, verbose)
+
+    cable_loss_dataset_dict = {}
+    if data_type == 'feedline-VSWR':
+        # Feedline metadata is necessary to get a cable loss model.
+        if feedline_metadata is None:
+            raise Exception('Feedline metadata is needed to get the cable loss for '
+                            'feedline-VSWR data.')
+        cable_loss_dataset_dict = get_feedline_cable_losses(feedline_metadata, site,
+                                                            reference_frequency)
+        stage_start = print_stage_time('Cable loss models', stage_start, verbose)
+
+    if data_type == 'pm-path':
+        if 'atten_file' in channels:
+            atten_row = sweeps.channel_index('atten_file')
+            channels = [channel for channel in channels if channel != 'atten_file']
+            sweeps['phase_deg'] = sweeps['phase_deg'] - sweeps['phase_deg'][atten_row]
+            sweeps['magnitude'] = sweeps['magnitude'] - sweeps['magnitude'][atten_row]
+            sweeps = sweeps.subset(channels)
+            del working_channel_data['atten_file']
+        elif attenuation is not None:  # float attenuation
+            sweeps['magnitude'] = sweeps['magnitude'] - attenuation
+            # phase will not change, but phase difference between channels should still
+            # be accurate because all channels had the same attenuation.
+
+    get_single_direction_paths(sweeps, data_type, cable_loss_dataset_dict)
+    stage_start = print_stage_time('Single direction and phase unwrapping', stage_start,
+                                   verbose)
+
+    # combining arrays
+    main_channels, intf_channels = get_array_channels(sweeps.channels)
+
+    combined_columns = {}
+    fit_data = dict(sweeps.items())
+    for prefix, array_channels, array_name in [
+            ('M_all_', main_channels, 'main array'),
+            ('I_all_', intf_channels, 'interferometer array')]:
+        if not array_channels:  # empty
+            if verbose:
+                print('\nNo combined {} data was calculated because there is no '
+                      'individual channel data.'.format(array_name))
+            continue
+        rows = [sweeps.channel_index(channel) for channel in array_channels]
+        # combine_phasors returns unwrapped phase.
+        combined_columns.update(get_combined_columns(prefix, *do.combine_phasors(
+            sweeps['magnitude'][rows], sweeps['phase_rad'][rows])))
+        fit_data[prefix] = {'freq': sweeps.freq,
+                            'phase_rad': combined_columns[prefix + 'phase_rad']}
+    stage_start = print_stage_time('Combine arrays', stage_start, verbose)
+
+    # Getting the line of best fit for each antenna and the combined arrays,
+    # and the offset from the line of best fit for each antenna and array.
+    linear_fit_dict = do.create_linear_fit_dictionaries(fit_data)
+    stage_start = print_stage_time('Linear fits', stage_start, verbose)
+
+    array_diff_columns = get_array_diff_columns(sweeps, combined_columns)
+    stage_start = print_stage_time('Array differences', stage_start, verbose)
+
+    # create a single dataframe with all data.
+    working_dataframe = get_working_dataframe(sweeps, combined_columns,
+                                              array_diff_columns)
+    print_stage_time('Build working dataframe', stage_start, verbose)
+
+    return {'sweeps': sweeps, 'channels': channels,
+            'working_channel_data': working_channel_data, 'missing_data': missing_data,
+            'data_description': data_description,
+            'cable_loss_dataset_dict': cable_loss_dataset_dict,
+            'main_channels': main_channels, 'intf_channels': intf_channels,
+            'linear_fit_dict': linear_fit_dict, 'working_dataframe': working_dataframe}
+
+
+def summarize_site(results):
+    """
+    Get the numbers we need from a site visit analysis: the delay of each channel and
+    combined array from its linear fit, and the time difference between the arrays.
+    :param results: dictionary returned by analyse_site.
+    :return: dictionary of summary values. tdiff_ns_* are statistics of the array
+    difference across frequency, and fit_tdiff_ns is the difference between the
+    combined interferometer and main array delays from their linear fits.
+    """
+    linear_fit_dict = results['linear_fit_dict']
+    working_dataframe = results['working_dataframe']
+    summary = {'num_channels': len(results['channels']),
+               'missing_data': ' '.join(results['missing_data'])}
+
+    for prefix, name in [('M_all_', 'main'), ('I_all_', 'intf')]:
+        summary[name + '_delay_ns'] = linear_fit_dict[prefix]['time_delay_ns'] if \
+            prefix in linear_fit_dict else np.nan
+
+    for column, name in [('array_diff_time_ns', 'tdiff_ns'),
+                         ('tested_array_diff_time_ns', 'tested_tdiff_ns')]:
+        if column in working_dataframe.columns:
+            summary[name + '_mean'] = working_dataframe[column].mean()
+            summary[name + '_median'] = working_dataframe[column].median()
+            summary[name + '_std'] = working_dataframe[column].std()
+    summary['fit_tdiff_ns'] = summary['intf_delay_ns'] - summary['main_delay_ns']
+
+    for channel in results['channels']:
+        summary[channel + '_delay_ns'] = linear_fit_dict[channel]['time_delay_ns']
+    for channel, statistics in get_vswr_statistics(results['sweeps']).items():
+        summary[channel + '_vswr_mean'] = statistics['vswr_mean']
+        summary[channel + '_vswr_max'] = statistics['vswr_max']
+    return summary
+
+
+def get_vswr_statistics(sweeps):
+    """
+    Get VSWR statistics across frequency for every channel at once.
+    :param sweeps: SweepSet of the channels.
+    :return: dictionary of channel name to dictionary of vswr_mean, vswr_median and
+    vswr_max, or an empty dictionary if the sweeps have no VSWR data.
+    """
+    if 'vswr' not in sweeps:
+        return {}
+    vswr = sweeps['vswr']
+    return {channel: {'vswr_mean': mean, 'vswr_median': median, 'vswr_max': maximum} for
+            channel, mean, median, maximum in zip(
+                sweeps.channels, vswr.mean(axis=1), np.median(vswr, axis=1),
+                vswr.max(axis=1))}
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+# site_trends.py
+# Analyse every visit of a site listed in a metadata csv (like
+# presentation/site_file_metadata.csv) and follow the delay and VSWR of each channel
+# across the visits, flagging the channels whose delay drifted by more than a threshold.
+# See trend_analysis/trend_analysis.py.
+
+import sys
+import time
+import argparse
+
+import metadata_catalog.metadata_catalog as metadata_catalog
+import trend_analysis.trend_analysis as trend_analysis
+
+
+def usage_msg():
+    """
+    Return the usage message for this script.
+
+    This is used if a -h flag or invalid arguments are provided.
+
+    :return: the usage message
+    """
+
+    usage_message = """ site_trends.py [-h] [-o OUTPUT] [--visits VISITS] [-w WORKERS]
+    [--site SITE] [--data-type DATA_TYPE] [--after DATE] [--before DATE]
+    [--threshold THRESHOLD] [--reference {first,previous,median}]
+    [--feedline-metadata FILE] [--no-cache] [--archive ARCHIVE] metadata
+
+    Run the site analysis for every visit of the sites in a metadata csv (like
+    site_file_metadata.csv), write a csv of the delay and VSWR of every channel at every
+    visit, and print the channels whose delay drifted by more than the threshold.
+    """
+
+    return usage_message
+
+
+def script_parser():
+    """
+    Creates the parser to retrieve the arguments.
+
+    :return: parser, the argument parser for this script.
+    """
+
+    parser = argparse.ArgumentParser(usage=usage_msg())
+    parser.add_argument("metadata", help="Path to the metadata csv of datasets, with "
+                                         "columns site, date, data_type, "
+                                         "mapping_filename and data_location.")
+    parser.add_argument("-o", "--output", default='site_trends.csv',
+                        help="Path of the csv of every channel at every visit to write. "
+                             "Default site_trends.csv")
+    parser.add_argument("--visits", default=None,
+                        help="Also write the summary of every visit to this csv.")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of worker processes. Default is the number of CPUs.")
+    parser.add_argument("--site", action='append',
+                        help="Only analyse this site. Can be given more than once.")
+    parser.add_argument("--data-type", action='append', dest='data_type',
+                        help="Only analyse this data type. Can be given more than once.")
+    parser.add_argument("--after", type=int, default=None,
+                        help="Only analyse visits after this date (YYYYMMDD) or year "
+                             "(YYYY).")
+    parser.add_argument("--before", type=int, default=None,
+                        help="Only analyse visits before this date (YYYYMMDD) or year "
+                             "(YYYY).")
+    parser.add_argument("--threshold", type=float, default=1.0,
+                        help="Flag channels whose delay drifted by more than this many "
+                             "ns. Default 1.0")
+    parser.add_argument("--reference", choices=trend_analysis.drift_references,
+                        default='first',
+                        help="Compare each visit's delay to the channel's first visit, "
+                             "previous visit or median of all visits. Default first")
+    parser.add_argument("--feedline-metadata", dest='feedline_metadata', default=None,
+                        help="Path to the feedline metadata csv used for cable losses. "
+                             "Default is site_feedline_metadata.csv beside the metadata "
+                             "csv.")
+    parser.add_argument("--no-cache", action='store_true',
+                        help="Parse all csv files again instead of using the sweep cache.")
+    parser.add_argument("--archive", default=None,
+                        help="Read sweeps from this sweep archive where they are archived, "
+                             "see retrieve_data/sweep_archive.py.")
+    return parser
+
+
+def main():
+    parser = script_parser()
+    args = parser.parse_args()
+
+    catalog = metadata_catalog.MetadataCatalog.from_csv(args.metadata,
+                                                        args.feedline_metadata)
+    datasets = catalog.query(site=args.site, data_type=args.data_type, after=args.after,
+                             before=args.before)
+    if not datasets:
+        sys.exit('No visits in the metadata to analyse.')
+
+    start_time = time.perf_counter()
+    visit_table, channel_table = trend_analysis.analyse_visits(
+        datasets, args.workers, not args.no_cache, args.archive)
+    for visit in visit_table.to_dict('records'):
+        if visit['error']:
+            print('{} {} {}: {}'.format(visit['site'], visit['date'], visit['data_type'],
+                                        visit['error']))
+
+    channel_table, drifting_channels = trend_analysis.flag_drifting_channels(
+        channel_table, args.threshold, args.reference)
+    channel_table.to_csv(args.output, index=False)
+    if args.visits is not None:
+        visit_table.to_csv(args.visits, index=False)
+
+    if drifting_channels.empty:
+        print('No channel delay drifted by more than {} ns.'.format(args.threshold))
+    for channel in drifting_channels.to_dict('records'):
+        print('{} {} {}: delay drifted up to {:.3f} ns on {} of {} visits ({})'.format(
+            channel['site'], channel['data_type'], channel['channel'],
+            channel['max_abs_drift_ns'], channel['num_drifted'], channel['num_visits'],
+            channel['drifted_dates']))
+    print('Analysed {} visits in {:.1f} s, trends written to {}'.format(
+        len(visit_table), time.perf_counter() - start_time, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+
+# sweep_set.py
+# A container for sweeps of many channels recorded over the same frequencies. Instead of
+# a dictionary of per-channel arrays, a SweepSet holds one frequency vector and one
+# contiguous channel x frequency array per field (magnitude, phase_deg, vswr, ...), so
+# operations can be done on all channels at once.
+
+import numpy as np
+import pandas as pd
+
+import dataset_operations.dataset_operations as do
+
+
+class SweepSet(object):
+    """
+    Sweeps of many channels over a shared frequency vector.
+
+    Each field is a 2D float array of channel x frequency, with rows in the order of
+    channels. Channel names follow the file mapping convention where main array
+    channels start with 'M' and interferometer array channels start with 'I'.
+    """
+
+    def __init__(self, freq, channels, fields):
+        """
+        :param freq: 1D array of frequencies in Hz shared by all channels.
+        :param channels: list of channel names, one per row of each field.
+        :param fields: dictionary of field name to 2D array of channel x frequency.
+        """
+        self.freq = np.asarray(freq)
+        self.channels = list(channels)
+        self._channel_index = {channel: num for num, channel in enumerate(self.channels)}
+        if len(self._channel_index) != len(self.channels):
+            raise Exception('Channel names must be unique: {}'.format(self.channels))
+        self.fields = {}
+        for name, block in fields.items():
+            self.add_field(name, block)
+
+    @classmethod
+    def from_dict(cls, dict_of_arrays, field_names=None):
+        """
+        Make a SweepSet from a dictionary of per-channel structured arrays or dataframes.
+        Datasets recorded with a different number of points are reduced to the same
+        frequencies first, see reduce_frequency_array.
+        :param dict_of_arrays: dictionary of channel name to a structured numpy array or
+        dataframe with a 'freq' column.
+        :param field_names: the columns to keep, by default all columns other than 'freq'
+        found in every dataset.
+        :return: a SweepSet with the channels in the order of the dictionary.
+        """
+        dict_of_arrays = do.reduce_frequency_array(dict(dict_of_arrays))
+        channels = list(dict_of_arrays.keys())
+        if field_names is None:
+            field_names = [column for column in do.get_column_names(
+                dict_of_arrays[channels[0]]) if column != 'freq' and all(
+                column in do.get_column_names(dataset) for dataset in
+                dict_of_arrays.values())]
+        freq = np.asarray(dict_of_arrays[channels[0]]['freq'])
+        fields = {name: np.vstack([np.asarray(dict_of_arrays[channel][name], dtype=float)
+                                   for channel in channels]) for name in field_names}
+        return cls(freq, channels, fields)
+
+    @classmethod
+    def from_wide_dataframe(cls, dataframe, channels, field_names):
+        """
+        Make a SweepSet from a dataframe with a 'freq' column and a column for each
+        channel and field named channel + field, eg. 'M0phase_deg'.
+        :param dataframe: the wide dataframe.
+        :param channels: list of channel names.
+        :param field_names: list of field names.
+        :return: a SweepSet.
+        """
+        fields = {name: dataframe[[channel + name for channel in channels]].to_numpy(
+            dtype=float).T for name in field_names}
+        return cls(dataframe['freq'].to_numpy(), channels, fields)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, field_name):
+        return field_name in self.fields
+
+    def __getitem__(self, field_name):
+        """
+        :param field_name: name of a field, or 'freq'.
+        :return: the 2D channel x frequency array of the field, or the frequency vector.
+        """
+        if field_name == 'freq':
+            return self.freq
+        return self.fields[field_name]
+
+    def __setitem__(self, field_name, block):
+        self.add_field(field_name, block)
+
+    def add_field(self, field_name, block):
+        """
+        Add or replace a field.
+        :param field_name: name of the field.
+        :param block: 2D array of channel x frequency, or a 1D array to use for every
+        channel.
+        """
+        block = np.ascontiguousarray(np.broadcast_to(block, (len(self.channels),
+                                                             len(self.freq))), dtype=float)
+        self.fields[field_name] = block
+
+    @property
+    def num_points(self):
+        return len(self.freq)
+
+    @property
+    def main_channels(self):
+        return [channel for channel in self.channels if channel[0] == 'M']
+
+    @property
+    def intf_channels(self):
+        return [channel for channel in self.channels if channel[0] == 'I']
+
+    def channel_index(self, channel):
+        """
+        :param channel: a channel name.
+        :return: the row of the channel in every field.
+        """
+        try:
+            return self._channel_index[channel]
+        except KeyError:
+            raise Exception('There is no channel {} in this SweepSet.'.format(channel))
+
+    def channel(self, channel):
+        """
+        Get the data of one channel without copying it.
+        :param channel: a channel name.
+        :return: dictionary of 'freq' and each field name to 1D arrays that are views of
+        this SweepSet's data, so can be indexed the same way as a structured array.
+        """
+        row = self.channel_index(channel)
+        channel_data = {'freq': self.freq}
+        for name, block in self.fields.items():
+            channel_data[name] = block[row]
+        return channel_data
+
+    def items(self):
+        """
+        :return: iterator of (channel name, channel data) as given by channel().
+        """
+        return ((channel, self.channel(channel)) for channel in self.channels)
+
+    def subset(self, channels):
+        """
+        Get a new SweepSet with only some of the channels. Field data is copied.
+        :param channels: list of channel names.
+        :return: a SweepSet with the given channels in the given order.
+        """
+        rows = [self.channel_index(channel) for channel in channels]
+        return SweepSet(self.freq, channels, {name: block[rows] for name, block in
+                                              self.fields.items()})
+
+    def main_array(self):
+        return self.subset(self.main_channels)
+
+    def intf_array(self):
+        return self.subset(self.intf_channels)
+
+    def combine(self, channels=None, weights=None):
+        """
+        Sum channels as phasors, see combine_phasors. Needs magnitude and phase_rad
+        fields.
+        :param channels: list of channel names to combine, all channels by default.
+        :param weights: optional weight for each channel.
+        :return: structured array with dtypes 'freq', 'magnitude', 'phase_deg' and
+        'phase_rad', with unwrapped phase.
+        """
+        if channels is None:
+            channels = self.channels
+        if not channels:
+            raise Exception('No channels to combine.')
+        rows = [self.channel_index(channel) for channel in channels]
+        combined_magnitude, combined_phase_rad = do.combine_phasors(
+            self.fields['magnitude'][rows], self.fields['phase_rad'][rows], weights)
+        combined_data = np.zeros(self.num_points, dtype=[
+            ('freq', 'i4'), ('magnitude', 'f4'), ('phase_deg', 'f4'), ('phase_rad', 'f4')])
+        combined_data['freq'] = self.freq
+        combined_data['magnitude'] = combined_magnitude
+        combined_data['phase_rad'] = combined_phase_rad
+        combined_data['phase_deg'] = np.degrees(combined_phase_rad)
+        return combined_data
+
+    def linear_fits(self, field_name='phase_rad'):
+        """
+        Fit a line to a field of every channel at once, see get_linear_fits.
+        :param field_name: the field to fit across frequency, in rads.
+        :return: dictionary of channel name to linear fit dictionary.
+        """
+        return do.split_linear_fits(self.channels, do.get_linear_fits(
+            self.freq, do.unwrap_phase(self.fields[field_name], units='rad')))
+
+    def to_structured_array(self, channel, dtype='f4'):
+        """
+        Copy one channel into a structured numpy array like the per-channel arrays used
+        in the scripts.
+        :param channel: a channel name.
+        :param dtype: the dtype of each field, freq is always 'i4'.
+        :return: structured array with 'freq' and each field as dtypes.
+        """
+        row = self.channel_index(channel)
+        array = np.zeros(self.num_points, dtype=[('freq', 'i4')] + [
+            (name, dtype) for name in self.fields])
+        array['freq'] = self.freq
+        for name, block in self.fields.items():
+            array[name] = block[row]
+        return array
+
+    def to_dict(self):
+        """
+        :return: dictionary of channel name to structured array, see
+        to_structured_array.
+        """
+        return {channel: self.to_structured_array(channel) for channel in self.channels}
+
+    def to_wide_dataframe(self):
+        """
+        Get a single dataframe with a 'freq' column and a column for each channel and
+        field named channel + field, eg. 'M0phase_deg', as used in presentation.
+        :return: the wide dataframe.
+        """
+        columns = {'freq': self.freq}
+        for name, block in self.fields.items():
+            for row, channel in enumerate(self.channels):
+                columns[channel + name] = block[row]
+        return pd.DataFrame(columns)
@@ -5,18 +5,19 @@
 # from the length of cable that is there on the interferometer array.
 
 import sys
-import time
-import fnmatch
-import random
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats
 import json
-import csv
 
 from dataset_operations.dataset_operations import reduce_frequency_array, \
-    combine_arrays, unwrap_phase
+    combine_arrays, unwrap_phase, get_linear_fits, split_linear_fits, get_array_difference
+from retrieve_data.retrieve_data import read_sweeps_concurrently
+from rendering.rendering import get_pyplot, plot_channel_lines
+
+# Pass --no-plot to only compute and write the time files.
+no_plot = '--no-plot' in sys.argv
+if no_plot:
+    sys.argv.remove('--no-plot')
 
 # General variables to change depending on data being used
 radar_name = sys.argv[1]
@@ -43,6 +44,9 @@ hex_colors = ['#ff1a1a', '#993300', '#ffff1a', '#666600', '#ff531a', '#cc9900',
               '#5500ff', '#a366ff', '#ff00ff', '#e6005c', '#ffaa80', '#999999']
 hex_dictionary = {'other': '#000000'}
 
+# The columns to read from the first sweep of each csv file.
+header_names = {'freq': '*Freq*', 'magnitude': '*Magnit*', 'phase_deg': '*Phase*'}
+
 
 def main():
     data_description = []
@@ -50,6 +54,7 @@ def main():
     estimate_data = []
     main_data = {}
     intf_data = {}
+    channel_files = {}
     for k, v in path_files.items():
         if k == '_comment':
             data_description = v
@@ -60,85 +65,32 @@ def main():
         if v == 'estimate_intf':
             estimate_data.append(k) # TODO estimate with a given slope
             continue
-        with open(data_location + v, 'r') as csvfile:
-            for line in csvfile:
-                if fnmatch.fnmatch(line, 'Freq. [Hz*'):  # skip to header
-                    break
-            else:  # no break
-                sys.exit('No Data in file {}'.format(v))
-            row = line.split(',')
-            try:
-                freq_header = '*Freq*'
-                freq_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], freq_header)]
-                magnitude_header = '*Magnit*'
-                magnitude_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], magnitude_header)]
-                freq_column = freq_columns[0]
-                magnitude_column = magnitude_columns[0]
-                phase_header = '*Phase*'
-                phase_columns = [i for i in range(len(row)) if
-                                fnmatch.fnmatch(row[i], phase_header)]
-                phase_column = phase_columns[0]
-            except:
-                sys.exit('Cannot find data {}.'.format(v))
-            i = 0
-            while (abs(magnitude_column - freq_column) > 2) or (abs(phase_column - freq_column) > 2):
-                i += 1
-                try:
-                    freq_column = freq_columns[i]
-                    if magnitude_column > phase_column:
-                        phase_column = phase_columns[i]
-                    if phase_column > magnitude_column:
-                        magnitude_column = magnitude_columns[i]
-                except:
-                    sys.exit('Data Phase and Magnitude are given from different sweeps.')
-            next(csvfile)  # skip over header
-            csv_reader = csv.reader(csvfile)
+        # All keys should start with M or I to indicate which array they are from.
+        if k[0] != 'M' and k[0] != 'I':
+            sys.exit('There is an invalid key {}'.format(k))
+        channel_files[k] = v
 
-            data = []
-            for row in csv_reader:
-                try:
-                    freq = float(row[freq_column])
-                    mag = float(row[magnitude_column])
-                    phase = float(row[phase_column])
-                except:
-                    continue
-                phase_rad = float(phase) * math.pi / 180.0
-                data.append((freq, mag, float(phase), phase_rad))
-            data = np.array(data, dtype=[('freq', 'i4'), ('magnitude', 'f4'),
-                                         ('phase_deg', 'f4'), ('phase_rad', 'f4')])
-
-            data = unwrap_phase(data)
-
-            if k[0] == 'M':  # in main files.
-                main_data[k] = data
-            elif k[0] == 'I':  # in intf files
-                intf_data[k] = data
-            else:
-                sys.exit('There is an invalid key {}'.format(k))
-
-            hex_dictionary[k] = hex_colors[0]
-            hex_colors.remove(hex_dictionary[k])
+    for k, data in read_sweeps_concurrently(channel_files, data_location,
+                                            header_names).items():
+        data = unwrap_phase(data)
+
+        if k[0] == 'M':  # in main files.
+            main_data[k] = data
+        else:  # in intf files
+            intf_data[k] = data
+
+        hex_dictionary[k] = hex_colors[0]
+        hex_colors.remove(hex_dictionary[k])
 
     main_data = reduce_frequency_array(main_data)
 
-    one_array_key = random.choice(list(main_data.keys()))
-    main_dataset_length = main_data[one_array_key].shape[0]
+    main_dataset_length = next(iter(main_data.values())).shape[0]
     combined_main_array = combine_arrays(main_data)
 
-    linear_fit_dict = {}
     # combined main array slope
-    slope, intercept, rvalue, pvalue, stderr = stats.linregress(combined_main_array['freq'],
-                                                                combined_main_array['phase_rad'])
-    offset_of_best_fit = []
-    for entry in combined_main_array:
-        best_fit_value = slope * entry['freq'] + intercept
-        offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-    linear_fit_dict['M_all'] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                'pvalue': pvalue, 'stderr': stderr,
-                                'offset_of_best_fit': np.array(offset_of_best_fit),
-                                'time_delay_ns': round(slope / (2 * math.pi), 11) * -10 ** 9}
+    main_fit = get_linear_fits(combined_main_array['freq'], combined_main_array['phase_rad'])
+    slope = main_fit['slope'][0]
+    intercept = main_fit['intercept'][0]
 
     # TODO if intf_data is empty!
     if not intf_data:  # if empty
@@ -168,46 +120,16 @@ def main():
     all_data = main_data.copy()
     all_data.update(intf_data)
 
-    # for each antenna, get the linear fit and plot the offset from linear fit.
-
-    for ant, dataset in all_data.items():
-        slope, intercept, rvalue, pvalue, stderr = stats.linregress(dataset['freq'],
-                                                                    dataset['phase_rad'])
-        linear_fit_dict[ant] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                'pvalue': pvalue, 'stderr': stderr}
-        offset_of_best_fit = []
-        for entry in dataset:
-            best_fit_value = slope * entry['freq'] + intercept
-            offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-        linear_fit_dict[ant]['offset_of_best_fit'] = np.array(offset_of_best_fit)
-        linear_fit_dict[ant]['time_delay_ns'] = round(slope / (2 * math.pi), 11) * -10 ** 9
-
     combined_intf_array = combine_arrays(intf_data)
 
-    # combined intf array slope
-    slope, intercept, rvalue, pvalue, stderr = stats.linregress(combined_intf_array['freq'],
-                                                                combined_intf_array['phase_rad'])
-    offset_of_best_fit = []
-    for entry in combined_intf_array:
-        best_fit_value = slope * entry['freq'] + intercept
-        offset_of_best_fit.append(entry['phase_rad'] - best_fit_value)
-    linear_fit_dict['I_all'] = {'slope': slope, 'intercept': intercept, 'rvalue': rvalue,
-                                'pvalue': pvalue, 'stderr': stderr,
-                                'offset_of_best_fit': np.array(offset_of_best_fit),
-                                'time_delay_ns': round(slope / (2 * math.pi), 11) * -10 ** 9}
-
-    array_diff = []
-    for m, i in zip(combined_main_array, combined_intf_array):
-        freq = i['freq']
-        phase = ((m['phase_deg'] - i['phase_deg']) % 360)
-        if phase > 180:
-            phase = -360 + phase
-        time_ns = phase * 10**9 / (freq * 360.0)
-        array_diff.append((freq, phase, time_ns))
-    array_diff = np.array(array_diff, dtype=[('freq', 'i4'), ('phase_deg', 'f4'),
-                                             ('time_ns', 'f4')])
-
-    array_diff = unwrap_phase(array_diff)
+    # for each antenna and the combined arrays, get the linear fit and plot the offset
+    # from linear fit.
+    fit_data = dict(all_data, M_all=combined_main_array, I_all=combined_intf_array)
+    linear_fit_dict = split_linear_fits(list(fit_data.keys()), get_linear_fits(
+        combined_main_array['freq'], [dataset['phase_rad'] for dataset in
+                                      fit_data.values()]))
+
+    array_diff = unwrap_phase(get_array_difference(combined_main_array, combined_intf_array))
 
     if time_file_str != 'None':
         array_diff.tofile(plot_location + path_type + time_file_str, sep="\n")
@@ -216,7 +138,11 @@ def main():
             array.tofile(plot_location + time_file_loc + path_type + ant + '.txt', sep="\n")
         combined_main_array.tofile(plot_location + time_file_loc + path_type + 'main_array_combined.txt', sep="\n")
         combined_intf_array.tofile(plot_location + time_file_loc + path_type + 'intf_array_combined.txt', sep="\n")
+    if no_plot:
+        return
+
     # PLOTTING
+    plt = get_pyplot()
 
     numplots = 6
     fig, smpplot = plt.subplots(numplots, sharex=True, figsize=(18, 24))
@@ -241,17 +167,13 @@ def main():
     smpplot[2].plot(array_diff['freq'], array_diff['phase_deg'])
     smpplot[2].set_ylabel('Transmitter Path\nDifference Between\nArrays [degrees]')
 
-    for ant, dataset in all_data.items():
-        if ant[0] == 'M': # plot with main array
-            smpplot[3].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi,
-                            label='{}, delay={} ns'.format(ant,
-                                                           linear_fit_dict[ant]['time_delay_ns']),
-                            color=hex_dictionary[ant])
-        elif ant[0] == 'I':
-            smpplot[4].plot(dataset['freq'], linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi,
-                            label='{}, delay={} ns'.format(ant,
-                                                           linear_fit_dict[ant]['time_delay_ns']),
-                            color=hex_dictionary[ant])
+    for array_plot, array_data in [(smpplot[3], main_data), (smpplot[4], intf_data)]:
+        plot_channel_lines(array_plot, all_data['M0']['freq'],
+                           [linear_fit_dict[ant]['offset_of_best_fit'] * 180.0 / math.pi for
+                            ant in array_data],
+                           [hex_dictionary[ant] for ant in array_data],
+                           ['{}, delay={} ns'.format(ant, linear_fit_dict[ant][
+                               'time_delay_ns']) for ant in array_data])
 
     smpplot[3].plot(all_data['M0']['freq'], linear_fit_dict['M_all']['offset_of_best_fit'] * 180.0 / math.pi,
                     color=hex_dictionary['other'], label='Combined Main, delay={} ns'.format(linear_fit_dict['M_all']['time_delay_ns']))  # plot last
@@ -271,20 +193,20 @@ def main():
         for element in missing_data:
             missing_data_statement = missing_data_statement + element + " "
         print(missing_data_statement)
-        plt.figtext(0.65, 0.05, missing_data_statement, fontsize=15)
+        fig.text(0.65, 0.05, missing_data_statement, fontsize=15)
 
     if estimate_data:  # not empty
         estimate_data_statement = "***ESTIMATED INTF DATA BECAUSE MISSING MEASUREMENT"
         print(estimate_data_statement)
-        plt.figtext(0.55, 0.05, estimate_data_statement, fontsize=15)
+        fig.text(0.55, 0.05, estimate_data_statement, fontsize=15)
 
     if data_description:
         print(data_description)
-        plt.figtext(0.65, 0.10, data_description, fontsize=15)
+        fig.text(0.65, 0.10, data_description, fontsize=15)
 
     fig.savefig(plot_location + plot_filename)
     plt.close(fig)
 
 
-if __name__ == main():
+if __name__ == '__main__':
     main()
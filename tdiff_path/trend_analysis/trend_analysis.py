@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+# trend_analysis.py
+# Follow a site's feedlines and paths across every visit, instead of comparing one
+# hard-coded before and after pair of files as in compare_reflection.py or
+# archive/total_path_phase_diff.py. Every visit of a site found in a MetadataCatalog is
+# analysed (reading the file mapping json of each visit), giving a table of one row per
+# visit and channel with the delay of the channel's linear fit and its VSWR statistics.
+# The combined arrays are included as channels M_all_ and I_all_, and the array time
+# difference (tdiff) as channel tdiff. Channels whose delay moved by more than a threshold
+# from one visit to another are then flagged.
+#
+# Visits are analysed in a process pool, and the parsed sweeps come from the sweep cache
+# (and sweep archive if set), so dozens of visits only parse csv files that changed.
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+import retrieve_data.sweep_cache as sweep_cache
+import retrieve_data.retrieve_data as retrieve
+import site_analysis.site_analysis as site_analysis
+
+# columns identifying one visit of a site for one data type.
+visit_columns = ['site', 'date', 'data_type', 'mapping_filename']
+
+# references that each visit's delay can be compared to, see get_delay_drift.
+drift_references = ['first', 'previous', 'median']
+
+
+def initialize_worker(use_cache, archive_directory=None):
+    """
+    Set up a worker process: use the sweep cache or not, and read from the sweep archive
+    if given.
+    :param use_cache: use the sweep cache.
+    :param archive_directory: path to a sweep archive, or None.
+    """
+    sweep_cache.set_cache_enabled(use_cache)
+    if archive_directory is not None:
+        retrieve.set_sweep_archive(archive_directory)
+
+
+def get_channel_records(results):
+    """
+    Get the numbers we follow across visits for each channel of one visit.
+    :param results: dictionary returned by site_analysis.analyse_site.
+    :return: list of dictionaries with channel, delay_ns, and vswr_mean, vswr_median and
+    vswr_max if the data has VSWR. The combined arrays are channels M_all_ and I_all_, and
+    the median array time difference is the delay_ns of channel tdiff.
+    """
+    linear_fit_dict = results['linear_fit_dict']
+    vswr_statistics = site_analysis.get_vswr_statistics(results['sweeps'])
+    records = []
+    for channel in results['channels'] + ['M_all_', 'I_all_']:
+        if channel not in linear_fit_dict:
+            continue
+        record = {'channel': channel,
+                  'delay_ns': linear_fit_dict[channel]['time_delay_ns']}
+        record.update(vswr_statistics.get(channel, {}))
+        records.append(record)
+    working_dataframe = results['working_dataframe']
+    if 'array_diff_time_ns' in working_dataframe.columns:
+        records.append({'channel': 'tdiff',
+                        'delay_ns': working_dataframe['array_diff_time_ns'].median()})
+    return records
+
+
+def analyse_visit(dataset):
+    """
+    Analyse one visit in a worker process.
+    :param dataset: a metadata_catalog.DatasetHandle.
+    :return: visit: dictionary of the visit metadata, site_analysis.summarize_site values,
+    error and processing_time_s.
+    :return: channel_records: list of dictionaries from get_channel_records, each with the
+    visit metadata added.
+    """
+    visit = {column: dataset.metadata[column] for column in visit_columns}
+    channel_records = []
+    start_time = time.perf_counter()
+    try:
+        results = dataset.analyse(verbose=False)
+        visit.update(site_analysis.summarize_site(results))
+        for record in get_channel_records(results):
+            record.update({column: dataset.metadata[column] for column in visit_columns})
+            channel_records.append(record)
+        visit['error'] = ''
+    except Exception as e:  # record the failure and continue with the other visits.
+        visit['error'] = '{}: {}'.format(type(e).__name__, e)
+    visit['processing_time_s'] = round(time.perf_counter() - start_time, 3)
+    return visit, channel_records
+
+
+def analyse_visits(datasets, max_workers=None, use_cache=True, archive_directory=None):
+    """
+    Analyse every visit in a process pool.
+    :param datasets: list of metadata_catalog.DatasetHandles, eg. from
+    catalog.query(site='RKN', data_type='feedline-VSWR').
+    :param max_workers: number of worker processes, the number of CPUs by default.
+    :param use_cache: use the sweep cache.
+    :param archive_directory: path to a sweep archive to read sweeps from, or None.
+    :return: visit_table: dataframe of one row per visit, sorted by site, data type and
+    date.
+    :return: channel_table: dataframe of one row per visit and channel, sorted by site,
+    data type, channel and date.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initialize_worker,
+                             initargs=(use_cache, archive_directory)) as executor:
+        outputs = list(executor.map(analyse_visit, datasets))
+
+    visit_table = pd.DataFrame([visit for visit, _ in outputs])
+    channel_table = pd.DataFrame([record for _, channel_records in outputs for record in
+                                  channel_records])
+    if channel_table.empty:
+        channel_table = pd.DataFrame(columns=visit_columns + ['channel', 'delay_ns'])
+    if not visit_table.empty:
+        visit_table = visit_table.sort_values(['site', 'data_type', 'date'],
+                                              kind='stable').reset_index(drop=True)
+    channel_table = channel_table[visit_columns + ['channel'] + [
+        column for column in channel_table.columns if column not in visit_columns +
+        ['channel']]]
+    channel_table = channel_table.sort_values(['site', 'data_type', 'channel', 'date'],
+                                              kind='stable').reset_index(drop=True)
+    return visit_table, channel_table
+
+
+def get_delay_drift(channel_table, reference='first'):
+    """
+    Get how far each channel's delay has moved at each visit, for all channels at once.
+    :param channel_table: dataframe from analyse_visits, sorted by site, data type,
+    channel and date.
+    :param reference: what each visit's delay is compared to: 'first', the channel's
+    first visit, 'previous', the channel's visit before, or 'median', the median of all
+    the channel's visits.
+    :return: series of the drift in ns of each row, NaN where there is nothing to compare
+    to.
+    """
+    if reference not in drift_references:
+        raise Exception('Unknown drift reference {}, use one of {}.'.format(
+            reference, drift_references))
+    delays = channel_table.groupby(['site', 'data_type', 'channel'], sort=False)['delay_ns']
+    if reference == 'first':
+        reference_delay = delays.transform('first')
+    elif reference == 'previous':
+        reference_delay = delays.shift(1)
+    else:
+        reference_delay = delays.transform('median')
+    return channel_table['delay_ns'] - reference_delay
+
+
+def flag_drifting_channels(channel_table, threshold_ns, reference='first'):
+    """
+    Flag the channels whose delay drifted by more than a threshold.
+    :param channel_table: dataframe from analyse_visits.
+    :param threshold_ns: largest drift in ns that is not flagged.
+    :param reference: what each delay is compared to, see get_delay_drift.
+    :return: channel_table: a copy of channel_table with drift_ns and drifted columns.
+    :return: drifting_channels: dataframe of one row per flagged channel of a site and data
+    type, with the number of visits, the visits flagged, and the largest drift in ns.
+    """
+    channel_table = channel_table.copy()
+    channel_table['drift_ns'] = get_delay_drift(channel_table, reference)
+    channel_table['drifted'] = np.abs(channel_table['drift_ns']) > threshold_ns
+
+    channel_keys = ['site', 'data_type', 'channel']
+    channels = channel_table.groupby(channel_keys, sort=False)
+    drifting_channels = pd.DataFrame({
+        'num_visits': channels['date'].size(),
+        'num_drifted': channels['drifted'].sum(),
+        'max_abs_drift_ns': channels['drift_ns'].agg(lambda drift: drift.abs().max())})
+    drifting_channels = drifting_channels[drifting_channels['num_drifted'] > 0].copy()
+    drifting_channels['drifted_dates'] = channel_table[channel_table['drifted']].groupby(
+        channel_keys, sort=False)['date'].agg(lambda dates: ' '.join(str(date) for date
+                                                                     in dates))
+    return channel_table, drifting_channels.reset_index()
+
+
+def get_delay_trends(channel_table, value='delay_ns'):
+    """
+    :param channel_table: dataframe from analyse_visits or flag_drifting_channels.
+    :param value: the column to tabulate, eg. delay_ns, drift_ns or vswr_mean.
+    :return: dataframe of the value with a row per site, data type and channel and a
+    column per visit date.
+    """
+    return channel_table.pivot_table(index=['site', 'data_type', 'channel'],
+                                     columns='date', values=value, aggfunc='mean')